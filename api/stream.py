@@ -0,0 +1,175 @@
+"""Поток новых постов в формате server-sent events.
+
+    GET /api/v1/stream/?group=<slug>&author=<username>
+
+Каждый новый пост приходит событием с постом в data в том же виде,
+что и в ответах API. Раз в STREAM_HEARTBEAT секунд без событий
+отправляется комментарий-пинг, чтобы прокси не закрывали соединение.
+При переподключении браузер сам присылает Last-Event-ID, и пропущенные
+посты дочитываются из базы; если пропущено больше STREAM_BACKLOG,
+приходит событие ``reset`` - ленту стоит загрузить заново.
+
+Посты публикуются после фиксации в своих потоках и процессах, поэтому
+пост 10 может прийти после поста 11. id события - не id поста, а
+курсор StreamCursor: «всё до floor и ещё вот эти посты», так что
+опоздавший пост не отсеивается ни в потоке, ни при переподключении.
+
+Поток держит поток воркера до STREAM_MAX_SECONDS секунд, поэтому
+под нагрузкой сервер запускается с потоковыми или асинхронными
+воркерами (gunicorn --worker-class gthread или gevent)."""
+import json
+import time
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Max
+from django.http import StreamingHttpResponse
+from django.views.decorators.http import require_safe
+
+from posts.events import broker
+from posts.models import Group, Post, USER_MODEL
+
+from .views import POST_FIELDS, not_found, rows, serialize
+
+# Секунд между пингами в тишине
+STREAM_HEARTBEAT = getattr(settings, 'STREAM_HEARTBEAT', 15)
+# Сколько секунд живёт один поток, после чего клиент переподключается
+STREAM_MAX_SECONDS = getattr(settings, 'STREAM_MAX_SECONDS', 5 * 60)
+# Сколько пропущенных постов дочитывается по Last-Event-ID
+STREAM_BACKLOG = getattr(settings, 'STREAM_BACKLOG', 100)
+# На сколько id пост может опоздать относительно более нового
+# и всё равно прийти в поток
+STREAM_REORDER_WINDOW = getattr(settings, 'STREAM_REORDER_WINDOW', 20)
+# Через сколько миллисекунд браузеру переподключаться после обрыва
+STREAM_RETRY_MS = 3000
+
+
+def sse(event_id, data, event=None):
+    lines = [f'id: {event_id}']
+    if event:
+        lines.append(f'event: {event}')
+    lines.append('data: ' + json.dumps(
+        data, cls=DjangoJSONEncoder, ensure_ascii=False,
+        separators=(',', ':')))
+    return '\n'.join(lines) + '\n\n'
+
+
+class StreamCursor:
+    """Какие посты клиент уже получил: все с id не больше floor
+    и посты delivered выше него.
+
+    floor отстаёт от самого нового полученного поста на
+    STREAM_REORDER_WINDOW id, поэтому delivered не бывает больше окна.
+    В id события курсор записывается как «floor» или «floor:id,id»."""
+
+    def __init__(self, floor, delivered=()):
+        self.floor = floor
+        self.delivered = set()
+        for pk in delivered:
+            self.add(pk)
+
+    @classmethod
+    def parse(cls, value):
+        """Курсор из Last-Event-ID или None, если его не понять"""
+        if not value:
+            return None
+        floor, _, delivered = value.partition(':')
+        try:
+            return cls(int(floor), [int(pk) for pk in delivered.split(',')
+                                    if pk][-STREAM_REORDER_WINDOW:])
+        except ValueError:
+            return None
+
+    def __str__(self):
+        if not self.delivered:
+            return str(self.floor)
+        return '{}:{}'.format(
+            self.floor, ','.join(map(str, sorted(self.delivered))))
+
+    def seen(self, pk):
+        return pk <= self.floor or pk in self.delivered
+
+    def add(self, pk):
+        if self.seen(pk):
+            return
+        self.delivered.add(pk)
+        floor = max(self.delivered) - STREAM_REORDER_WINDOW
+        if floor > self.floor:
+            self.floor = floor
+            self.delivered = {pk for pk in self.delivered if pk > floor}
+
+
+def last_event_id(request):
+    return StreamCursor.parse(
+        request.META.get('HTTP_LAST_EVENT_ID')
+        or request.GET.get('last_event_id'))
+
+
+def missed_posts(cursor, filters):
+    """Не больше STREAM_BACKLOG последних постов, которых курсор
+    не видел, и признак, что пропущено больше"""
+    posts = rows(Post.objects.filter(pk__gt=cursor.floor, **filters).exclude(
+                 pk__in=cursor.delivered), POST_FIELDS, list(POST_FIELDS))
+    posts = list(posts.order_by('-pk')[:STREAM_BACKLOG + 1])
+    return posts[STREAM_BACKLOG - 1::-1], len(posts) > STREAM_BACKLOG
+
+
+def event_stream(filters, cursor):
+    def accepts(event):
+        return all(event[field] == pk for field, pk in filters.items())
+
+    # Подписка раньше запроса к базе: пост, созданный между ними,
+    # не потеряется, а повтор отсеется курсором. Подписка оформляется
+    # при первом чтении потока, так что неначатый поток (например,
+    # ответ на HEAD) ничего не оставляет после себя
+    subscription = broker.subscribe(accepts)
+    try:
+        yield f'retry: {STREAM_RETRY_MS}\n\n'
+        if cursor is None:
+            # Событие из одного id: если поток оборвётся раньше первого
+            # поста, браузер всё равно вернётся с Last-Event-ID
+            cursor = StreamCursor(
+                Post.objects.aggregate(top=Max('pk'))['top'] or 0)
+            yield f'id: {cursor}\n\n'
+        else:
+            backlog, reset = missed_posts(cursor, filters)
+            if reset:
+                # Клиент загрузит ленту заново: всё старше
+                # дочитанных постов у него будет
+                cursor = StreamCursor(backlog[0]['id'] - 1)
+                yield sse(cursor, {}, event='reset')
+            for row in backlog:
+                cursor.add(row['id'])
+                yield sse(cursor, serialize(row, POST_FIELDS, POST_FIELDS))
+        deadline = time.monotonic() + STREAM_MAX_SECONDS
+        while time.monotonic() < deadline and not subscription.overflowed:
+            event = subscription.get(timeout=STREAM_HEARTBEAT)
+            if event is None:
+                yield ': ping\n\n'
+            elif not cursor.seen(event['id']):
+                cursor.add(event['id'])
+                yield sse(cursor, event['data'])
+    finally:
+        subscription.close()
+
+
+@require_safe
+def stream(request):
+    """Поток новых постов, можно только сообщества или только автора"""
+    filters = {}
+    for param, model, lookup in (('group', Group, 'slug'),
+                                 ('author', USER_MODEL, 'username')):
+        if param in request.GET:
+            pk = model.objects.filter(
+                **{lookup: request.GET[param]}).values_list(
+                'pk', flat=True).first()
+            if pk is None:
+                return not_found()
+            filters[f'{param}_id'] = pk
+    response = StreamingHttpResponse(
+        event_stream(filters, last_event_id(request)),
+        content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # nginx не должен копить поток в буфере
+    response['X-Accel-Buffering'] = 'no'
+    return response
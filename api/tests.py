@@ -0,0 +1,259 @@
+import json
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from api.stream import StreamCursor
+from posts.events import publish_post
+from posts.models import Comment, Group, Post, USER_MODEL
+from posts.tests.utils import QueryBudgetMixin
+from posts.views import POSTS_PER_PAGE
+
+
+class ApiTests(QueryBudgetMixin, TestCase):
+    """JSON API лент, постов и комментариев"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = USER_MODEL.objects.create_user(username='masha')
+        cls.group = Group.objects.create(
+            title='Тестовый заголовок',
+            description='Описание',
+            slug='test-slug'
+        )
+        cls.posts = [
+            Post.objects.create(
+                text=f'Пост {i}', author=cls.user, group=cls.group)
+            for i in range(POSTS_PER_PAGE + 2)
+        ]
+        cls.post = cls.posts[-1]
+        cls.comment = Comment.objects.create(
+            post=cls.post, author=cls.user, text='Комментарий')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def test_feeds(self):
+        """Ленты отдают посты страницами по курсору"""
+        urls = {
+            reverse('api:index'): None,
+            reverse('api:group_posts', kwargs={'slug': self.group.slug}):
+                len(self.posts),
+            reverse('api:profile', kwargs={'username': self.user.username}):
+                len(self.posts),
+        }
+        expected = [post.id for post in reversed(self.posts)]
+        for url, count in urls.items():
+            with self.subTest(url=url):
+                with self.assertMaxQueries(3):
+                    data = self.client.get(url).json()
+                self.assertEqual(data.get('count'), count)
+                first = data['results']
+                self.assertEqual(first[0], {
+                    'id': self.post.id,
+                    'text': self.post.text,
+                    'pub_date': data['results'][0]['pub_date'],
+                    'author': self.user.username,
+                    'group': self.group.slug,
+                    'image': None,
+                    'comment_count': 1,
+                })
+                data = self.client.get(data['next']).json()
+                ids = [item['id'] for item in first + data['results']]
+                self.assertEqual(ids, expected)
+                self.assertIsNone(data['next'])
+                self.assertIsNotNone(data['previous'])
+
+    def test_fields_selection(self):
+        """?fields= оставляет в ответе только выбранные поля"""
+        data = self.client.get(
+            reverse('api:index'), {'fields': 'text,id'}).json()
+        self.assertEqual(
+            data['results'][0], {'id': self.post.id, 'text': self.post.text})
+        data = self.client.get(data['next']).json()
+        self.assertEqual(set(data['results'][0]), {'id', 'text'})
+
+    def test_unknown_field_is_bad_request(self):
+        response = self.client.get(reverse('api:index'), {'fields': 'oops'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('oops', response.json()['detail'])
+
+    def test_post_and_comments(self):
+        """Отдельный пост и его комментарии"""
+        data = self.client.get(
+            reverse('api:post', kwargs={'post_id': self.post.id}),
+            {'fields': 'id,author'}).json()
+        self.assertEqual(
+            data, {'id': self.post.id, 'author': self.user.username})
+        data = self.client.get(
+            reverse('api:comments', kwargs={'post_id': self.post.id})).json()
+        self.assertEqual(data['results'], [{
+            'id': self.comment.id,
+            'post': self.post.id,
+            'author': self.user.username,
+            'text': self.comment.text,
+            'created': data['results'][0]['created'],
+        }])
+
+    def test_profile_count_without_profile(self):
+        """Автор, созданный в обход сигналов, получает настоящий count"""
+        USER_MODEL.objects.bulk_create([USER_MODEL(username='bulk')])
+        author = USER_MODEL.objects.get(username='bulk')
+        Post.objects.bulk_create([Post(text='Пост', author=author)])
+        url = reverse('api:profile', kwargs={'username': 'bulk'})
+        self.assertEqual(self.client.get(url).json()['count'], 1)
+
+    def test_missing_objects_are_404(self):
+        urls = (
+            reverse('api:post', kwargs={'post_id': 0}),
+            reverse('api:comments', kwargs={'post_id': 0}),
+            reverse('api:group_posts', kwargs={'slug': 'nothing'}),
+            reverse('api:profile', kwargs={'username': 'nobody'}),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 404)
+                self.assertEqual(response['Content-Type'], 'application/json')
+
+    def test_not_modified(self):
+        """Неизменившиеся ленты отвечают 304, изменения сбрасывают ETag"""
+        url = reverse('api:profile', kwargs={'username': self.user.username})
+        response = self.client.get(url)
+        again = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(again.status_code, 304)
+        Post.objects.create(text='Новый', author=self.user)
+        again = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(again.status_code, 200)
+
+    def test_read_only(self):
+        response = self.client.post(reverse('api:index'))
+        self.assertEqual(response.status_code, 405)
+
+
+def parse_events(chunks):
+    """События потока SSE: словари полей, без пингов и retry"""
+    events = []
+    for chunk in chunks:
+        chunk = chunk.decode() if isinstance(chunk, bytes) else chunk
+        fields = dict(
+            line.split(': ', 1) for line in chunk.strip().split('\n')
+            if not line.startswith(':'))
+        if 'data' in fields:
+            fields['data'] = json.loads(fields['data'])
+            events.append(fields)
+    return events
+
+
+@mock.patch('api.stream.STREAM_HEARTBEAT', 0.01)
+@mock.patch('api.stream.STREAM_MAX_SECONDS', 0)
+class StreamTests(TestCase):
+    """Поток новых постов"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = USER_MODEL.objects.create_user(username='masha')
+        cls.group = Group.objects.create(
+            title='Тестовый заголовок',
+            description='Описание',
+            slug='test-slug'
+        )
+        cls.posts = [
+            Post.objects.create(text=f'Пост {i}', author=cls.user,
+                                group=cls.group if i % 2 else None)
+            for i in range(5)
+        ]
+
+    def test_resume_from_last_event_id(self):
+        """По Last-Event-ID дочитываются пропущенные посты ленты"""
+        response = self.client.get(
+            reverse('api:stream'), {'group': self.group.slug},
+            HTTP_LAST_EVENT_ID=str(self.posts[0].id))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        events = parse_events(response.streaming_content)
+        self.assertEqual(
+            [event['data']['id'] for event in events],
+            [post.id for post in self.posts[1::2]])
+        self.assertEqual(events[0]['data']['text'], self.posts[1].text)
+
+    def test_too_many_missed_posts_reset(self):
+        """Если пропущено больше STREAM_BACKLOG постов, приходит reset"""
+        with mock.patch('api.stream.STREAM_BACKLOG', 2):
+            response = self.client.get(
+                reverse('api:stream'), HTTP_LAST_EVENT_ID='0')
+            events = parse_events(response.streaming_content)
+        self.assertEqual(events[0]['event'], 'reset')
+        self.assertEqual(
+            [event['data']['id'] for event in events[1:]],
+            [post.id for post in self.posts[-2:]])
+
+    def test_live_posts_and_heartbeat(self):
+        """Новые посты приходят событиями, в тишине идут пинги"""
+        with mock.patch('api.stream.STREAM_MAX_SECONDS', 60):
+            response = self.client.get(
+                reverse('api:stream'), {'group': self.group.slug})
+            chunks = iter(response.streaming_content)
+            self.assertTrue(next(chunks).startswith(b'retry:'))
+            self.assertEqual(
+                next(chunks), f'id: {self.posts[-1].id}\n\n'.encode())
+            self.assertEqual(next(chunks), b': ping\n\n')
+            publish_post(Post.objects.create(
+                text='Без сообщества', author=self.user))
+            post = Post.objects.create(
+                text='Новый пост', author=self.user, group=self.group)
+            publish_post(post)
+            self.assertEqual(
+                parse_events([next(chunks)])[0]['data']['id'], post.id)
+            response.close()
+
+    def test_late_post_is_delivered(self):
+        """Посты публикуются после фиксации в разных потоках: пост,
+        опубликованный позже более нового, тоже приходит, а после
+        обрыва дочитывается из базы"""
+        with mock.patch('api.stream.STREAM_MAX_SECONDS', 60):
+            response = self.client.get(reverse('api:stream'))
+            chunks = iter(response.streaming_content)
+            next(chunks)
+            next(chunks)
+            older, newer, late, latest = [
+                Post.objects.create(text=f'Пост {i}', author=self.user)
+                for i in range(4)]
+            publish_post(newer)
+            publish_post(older)
+            publish_post(latest)
+            events = parse_events([next(chunks) for _ in range(3)])
+            # Поток оборвался раньше, чем опубликован late
+            response.close()
+        self.assertEqual([event['data']['id'] for event in events],
+                         [newer.id, older.id, latest.id])
+
+        response = self.client.get(
+            reverse('api:stream'), HTTP_LAST_EVENT_ID=events[-1]['id'])
+        events = parse_events(response.streaming_content)
+        self.assertEqual([event['data']['id'] for event in events],
+                         [late.id])
+
+    def test_unknown_filter_is_404(self):
+        response = self.client.get(
+            reverse('api:stream'), {'author': 'nobody'})
+        self.assertEqual(response.status_code, 404)
+
+
+class StreamCursorTests(TestCase):
+    @mock.patch('api.stream.STREAM_REORDER_WINDOW', 3)
+    def test_window(self):
+        """Выше floor помнится не больше окна постов"""
+        cursor = StreamCursor(10)
+        for pk in (12, 11, 15):
+            cursor.add(pk)
+        self.assertEqual(str(cursor), '12:15')
+        self.assertTrue(cursor.seen(11))
+        self.assertFalse(cursor.seen(13))
+        self.assertEqual(str(StreamCursor.parse('12:15')), '12:15')
+        self.assertEqual(str(StreamCursor.parse('7')), '7')
+        self.assertIsNone(StreamCursor.parse('x:1'))
@@ -0,0 +1,15 @@
+from django.urls import path
+from . import stream, views
+
+app_name = 'api'
+
+urlpatterns = [
+    path('v1/posts/', views.index, name='index'),
+    path('v1/posts/<int:post_id>/', views.post_detail, name='post'),
+    path('v1/posts/<int:post_id>/comments/', views.comments,
+         name='comments'),
+    path('v1/groups/<slug:slug>/posts/', views.group_posts,
+         name='group_posts'),
+    path('v1/users/<str:username>/posts/', views.profile, name='profile'),
+    path('v1/stream/', stream.stream, name='stream'),
+]
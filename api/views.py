@@ -0,0 +1,186 @@
+"""JSON API для чтения лент, постов и комментариев, версия 1.
+
+Записи выбираются через values() без создания объектов моделей
+и отдаются словарями с полями из POST_FIELDS и COMMENT_FIELDS.
+Параметр ``?fields=id,text`` оставляет только нужные поля, списки
+листаются курсором (``next``/``previous`` в ответе), а на условные
+запросы по неизменившимся лентам отвечается 304, как у HTML-страниц."""
+from functools import wraps
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse
+from django.utils.cache import get_conditional_response
+from django.views.decorators.http import require_safe
+
+from posts.conditional import feed_validators, set_validators
+from posts.models import Comment, Group, Post, USER_MODEL, profile_of
+from posts.paginator import CursorPaginator
+from posts.storage import post_image_storage
+from posts.views import (COMMENTS_PER_PAGE, POSTS_PER_PAGE, author_feeds,
+                         group_feeds, index_feeds)
+
+# Поле ответа -> поле запроса
+POST_FIELDS = {
+    'id': 'id',
+    'text': 'text',
+    'pub_date': 'pub_date',
+    'author': 'author__username',
+    'group': 'group__slug',
+    'image': 'image',
+    'comment_count': 'comment_count',
+}
+COMMENT_FIELDS = {
+    'id': 'id',
+    'post': 'post_id',
+    'author': 'author__username',
+    'text': 'text',
+    'created': 'created',
+}
+
+
+class BadRequest(Exception):
+    pass
+
+
+class RowPaginator(CursorPaginator):
+    """CursorPaginator для строк values(): ключ берётся из словаря"""
+
+    def key(self, obj):
+        return tuple(obj[field] for field in self.fields)
+
+
+def json_response(data, status=200):
+    return JsonResponse(
+        data, status=status, encoder=DjangoJSONEncoder,
+        json_dumps_params={'ensure_ascii': False, 'separators': (',', ':')})
+
+
+def not_found():
+    return json_response({'detail': 'Не найдено'}, status=404)
+
+
+def selected_fields(request, fields):
+    """Поля из ?fields= в порядке словаря fields"""
+    names = request.GET.get('fields')
+    if not names:
+        return list(fields)
+    names = set(names.split(','))
+    unknown = names - set(fields)
+    if unknown:
+        raise BadRequest(
+            'Неизвестные поля: ' + ', '.join(sorted(unknown)))
+    return [name for name in fields if name in names]
+
+
+def rows(queryset, fields, names, key=()):
+    """values() по выбранным полям; поля ключа курсора key
+    выбираются всегда под своими именами"""
+    paths = [fields[name] for name in names]
+    extra = [field for field in key if field not in paths]
+    return queryset.values(*paths, *extra)
+
+
+def serialize(row, fields, names):
+    item = {name: row[fields[name]] for name in names}
+    if 'image' in item:
+        item['image'] = (
+            post_image_storage.url(item['image']) if item['image'] else None)
+    return item
+
+
+def page_response(request, queryset, fields, per_page, key=('pub_date', 'id'),
+                  count=None):
+    names = selected_fields(request, fields)
+    paginator = RowPaginator(
+        rows(queryset, fields, names, key), per_page, fields=key)
+    page = paginator.get_page(request.GET)
+    data = {
+        'results': [serialize(row, fields, names) for row in page],
+        'next': request.path + page.next_link if page.next_link else None,
+        'previous': (request.path + page.previous_link
+                     if page.previous_link else None),
+    }
+    if count is not None:
+        data['count'] = count
+    return json_response(data)
+
+
+def api_view(feeds):
+    """Декоратор представлений API: только GET и HEAD, 404 в JSON, если
+    ленты feeds не нашлись, 304 по их версиям и 400 в JSON на ошибки
+    в параметрах.
+
+    В отличие от feed_condition ленты ищутся при каждом запросе:
+    без них API не отличит несуществующий адрес от пустого списка."""
+    def decorator(view):
+        @require_safe
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            page_feeds = feeds(request, *args, **kwargs)
+            if page_feeds is None:
+                return not_found()
+            validators = feed_validators(request, page_feeds)
+            etag, last_modified = validators
+            response = get_conditional_response(
+                request, etag=etag, last_modified=last_modified)
+            if response is not None:
+                return response
+            try:
+                response = view(request, *args, **kwargs)
+            except BadRequest as error:
+                return json_response({'detail': str(error)}, status=400)
+            return set_validators(response, validators)
+        return wrapper
+    return decorator
+
+
+def post_feeds(request, post_id):
+    """Лента автора поста: к ней привязаны изменения поста
+    и комментариев к нему"""
+    author_id = Post.objects.filter(pk=post_id).values_list(
+        'author_id', flat=True).first()
+    return None if author_id is None else [('profile', author_id)]
+
+
+@api_view(index_feeds)
+def index(request):
+    """Все посты, от новых к старым"""
+    return page_response(request, Post.objects.all(), POST_FIELDS,
+                         POSTS_PER_PAGE)
+
+
+@api_view(group_feeds)
+def group_posts(request, slug):
+    """Посты сообщества"""
+    group = Group.objects.values('pk', 'post_count').get(slug=slug)
+    return page_response(
+        request, Post.objects.filter(group_id=group['pk']), POST_FIELDS,
+        POSTS_PER_PAGE, count=group['post_count'])
+
+
+@api_view(author_feeds)
+def profile(request, username):
+    """Посты пользователя"""
+    user = USER_MODEL.objects.select_related('profile').get(
+        username=username)
+    return page_response(
+        request, Post.objects.filter(author=user), POST_FIELDS,
+        POSTS_PER_PAGE, count=profile_of(user).post_count)
+
+
+@api_view(post_feeds)
+def post_detail(request, post_id):
+    """Отдельный пост"""
+    names = selected_fields(request, POST_FIELDS)
+    row = rows(Post.objects.filter(pk=post_id), POST_FIELDS, names).first()
+    if row is None:
+        return not_found()
+    return json_response(serialize(row, POST_FIELDS, names))
+
+
+@api_view(post_feeds)
+def comments(request, post_id):
+    """Комментарии поста, от новых к старым"""
+    return page_response(
+        request, Comment.objects.filter(post_id=post_id), COMMENT_FIELDS,
+        COMMENTS_PER_PAGE, key=('created', 'id'))
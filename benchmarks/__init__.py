@@ -0,0 +1,26 @@
+"""Замеры производительности.
+
+Запускаются вручную из корня проекта: python -m benchmarks.<имя>"""
+import os
+
+
+def setup_django():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+    import django
+    django.setup()
+
+
+def create_file_db(path):
+    """Тестовая база Django в файле path вместо памяти: потоки замера
+    работают с ней через свои соединения, как потоки сервера"""
+    from django.db import connection
+
+    connection.settings_dict['TEST']['NAME'] = path
+    connection.creation.create_test_db(verbosity=0)
+
+
+def percentile(values, share):
+    if not values:
+        return 0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * share))]
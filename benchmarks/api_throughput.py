@@ -0,0 +1,85 @@
+"""Пропускная способность JSON API против HTML-страниц тех же лент.
+
+    python -m benchmarks.api_throughput [--posts 2000] [--requests 200]
+
+Во временной тестовой базе создаются посты с комментариями, затем
+каждая лента запрашивается тестовым клиентом Django подряд --requests
+раз: HTML-страница и её аналог из API. Перед каждым запросом кэш
+очищается, иначе HTML-страницы отдавались бы из кэша фрагментов
+и страниц (--warm оставляет кэш, и сравнивается повторный показ).
+Выводятся запросы в секунду и размер ответа."""
+import argparse
+import io
+import time
+
+from benchmarks import setup_django
+
+PAGES = {
+    'index': ('index', 'api:index', {}),
+    'group': ('group_posts', 'api:group_posts', {'slug': 'bench'}),
+    'profile': ('profile', 'api:profile', {'username': 'bench'}),
+}
+
+
+def seed(posts):
+    from django.core.management import call_command
+
+    from posts.models import Comment, Group, Post, USER_MODEL
+
+    user = USER_MODEL.objects.create_user(username='bench')
+    group = Group.objects.create(
+        title='Замеры', slug='bench', description='Посты для замеров')
+    Post.objects.bulk_create(
+        Post(text=f'Пост номер {i} ' * 10, author=user, group=group)
+        for i in range(posts))
+    Comment.objects.bulk_create(
+        Comment(post=post, author=user, text='Комментарий')
+        for post in Post.objects.all()[:posts // 10])
+    call_command('recount_counters', stdout=io.StringIO())
+
+
+def run(client, url, requests, warm):
+    from django.core.cache import cache
+
+    size = 0
+    started = time.perf_counter()
+    for _ in range(requests):
+        if not warm:
+            cache.clear()
+        response = client.get(url)
+        assert response.status_code == 200, (url, response.status_code)
+        size = len(response.content)
+    return requests / (time.perf_counter() - started), size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--posts', type=int, default=2000)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--warm', action='store_true')
+    args = parser.parse_args()
+
+    setup_django()
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import setup_test_environment
+    from django.urls import reverse
+
+    setup_test_environment()
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0)
+    try:
+        seed(args.posts)
+        client = Client()
+        print(f'{"лента":<8} {"вид":<5} {"запросов/с":>11} {"байт":>8}')
+        for name, (html, api, kwargs) in PAGES.items():
+            for kind, url_name in (('html', html), ('json', api)):
+                rate, size = run(client, reverse(url_name, kwargs=kwargs),
+                                 args.requests, args.warm)
+                print(f'{name:<8} {kind:<5} {rate:>11.0f} {size:>8}')
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
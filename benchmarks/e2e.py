@@ -0,0 +1,388 @@
+"""Сквозной замер публичных страниц через WSGI-приложение.
+
+    python -m benchmarks.e2e [--requests 500] [--output results.json]
+                             [--baseline benchmarks/e2e_baseline.json]
+                             [--save-baseline]
+
+Временная файловая база наполняется командой seed, затем каждый
+сценарий --requests раз вызывает приложение из yatube/wsgi.py в этом
+же процессе: запрос проходит все middleware, как от gunicorn, cookie
+сессии и CSRF передаются между запросами. Цели запросов (сообщество,
+автор, пост) выбираются случайно, но повторяемо при том же --seed.
+Кэш данных не очищается (--cold очищает его перед каждым запросом).
+Кэш целых страниц для гостей обходится: перед каждым запросом версия
+'pages' увеличивается, и замер идёт по представлению и шаблонам.
+Те же страницы из кэша меряются отдельными сценариями *_cached.
+
+Для каждого сценария выводятся 50, 95 и 99-й перцентили задержки,
+среднее число запросов к базе и медиана памяти, выделенной за запрос
+(отдельный проход под tracemalloc, чтобы трассировка не искажала
+задержку). Результаты записываются в JSON и сравниваются с базовым
+замером: метрика, выросшая сильнее порога, считается регрессией,
+и команда завершается с кодом 1. Так же завершается замер,
+в котором хоть один ответ пришёл с неожиданным кодом."""
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import ExitStack
+from datetime import datetime, timezone
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode
+
+from benchmarks import create_file_db, percentile, setup_django
+
+BASELINE = os.path.join(os.path.dirname(__file__), 'e2e_baseline.json')
+
+# Сценарии с записью выполняются от имени вошедшего пользователя
+WRITE_SCENARIOS = ('comment', 'new_post')
+# Страницы из кэша страниц для гостей: сценарий без суффикса идёт
+# мимо кэша, сценарий с суффиксом _cached - через него
+PAGE_CACHED_SCENARIOS = ('index', 'group', 'profile', 'post')
+# Метрики, которые сравниваются с базовым замером: опции
+# относительного порога и допустимого абсолютного роста
+COMPARED = {
+    'p95_ms': ('latency_threshold', 'latency_slack'),
+    'queries': ('queries_threshold', None),
+    'allocated_bytes': ('memory_threshold', None),
+}
+
+
+class WSGIClient:
+    """HTTP-клиент поверх WSGI-приложения, который хранит cookie
+    между запросами и подставляет CSRF-токен в POST"""
+
+    def __init__(self, application):
+        self.application = application
+        self.cookies = SimpleCookie()
+
+    def request(self, method, path, data=None):
+        path, _, query = path.partition('?')
+        body = urlencode(data or {}).encode()
+        environ = {
+            'REQUEST_METHOD': method,
+            'PATH_INFO': path,
+            'QUERY_STRING': query,
+            'SERVER_NAME': 'localhost',
+            'SERVER_PORT': '80',
+            'SERVER_PROTOCOL': 'HTTP/1.1',
+            'HTTP_HOST': 'localhost',
+            'REMOTE_ADDR': '127.0.0.1',
+            'CONTENT_TYPE': 'application/x-www-form-urlencoded',
+            'CONTENT_LENGTH': str(len(body)),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': 'http',
+            'wsgi.input': io.BytesIO(body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': True,
+            'wsgi.run_once': False,
+        }
+        if self.cookies:
+            environ['HTTP_COOKIE'] = '; '.join(
+                f'{name}={morsel.value}'
+                for name, morsel in self.cookies.items())
+        if method == 'POST' and 'csrftoken' in self.cookies:
+            environ['HTTP_X_CSRFTOKEN'] = self.cookies['csrftoken'].value
+
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            response['status'] = int(status.split()[0])
+            for name, value in headers:
+                if name.lower() == 'set-cookie':
+                    self.cookies.load(value)
+
+        result = self.application(environ, start_response)
+        try:
+            # Тело читается целиком, как его отправил бы сервер
+            for _ in result:
+                pass
+        finally:
+            # close() отправляет request_finished, как у сервера
+            if hasattr(result, 'close'):
+                result.close()
+        return response['status']
+
+    def login(self, username, password):
+        from django.urls import reverse
+
+        url = reverse('login')
+        self.request('GET', url)
+        status = self.request(
+            'POST', url, {'username': username, 'password': password})
+        if status != 302:
+            raise RuntimeError(f'Вход {username} не удался: {status}')
+
+
+class Workload:
+    """Сценарии: каждый возвращает (метод, путь, данные формы)
+    очередного запроса и ожидаемый код ответа"""
+
+    def __init__(self, seed):
+        from posts.models import Group, Post, USER_MODEL
+
+        self.rng = random.Random(seed)
+        self.groups = list(Group.objects.order_by('pk').values_list(
+            'pk', 'slug'))
+        self.authors = list(USER_MODEL.objects.filter(
+            profile__post_count__gt=0).order_by('pk').values_list(
+            'username', flat=True))
+        self.posts = list(Post.objects.order_by('pk').values_list(
+            'author__username', 'pk'))
+
+    def scenarios(self):
+        from django.urls import reverse
+
+        rng = self.rng
+        return {
+            'index': lambda: ('GET', reverse('index'), None, 200),
+            'group': lambda: (
+                'GET', reverse('group_posts', kwargs={
+                    'slug': rng.choice(self.groups)[1]}), None, 200),
+            'profile': lambda: (
+                'GET', reverse('profile', kwargs={
+                    'username': rng.choice(self.authors)}), None, 200),
+            'post': lambda: (
+                'GET', reverse('post', args=rng.choice(self.posts)),
+                None, 200),
+            'comment': lambda: (
+                'POST', reverse('add_comment', args=rng.choice(self.posts)),
+                {'text': 'Комментарий из замера'}, 302),
+            'new_post': lambda: (
+                'POST', reverse('new_post'),
+                {'text': 'Пост из замера', 'group': rng.choice(
+                    self.groups)[0]}, 302),
+            'about_author': lambda: (
+                'GET', reverse('about:author'), None, 200),
+            'about_tech': lambda: ('GET', reverse('about:tech'), None, 200),
+        }
+
+
+class QueryCounter:
+    """Считает запросы ко всем базам через execute_wrapper,
+    без отладочного курсора"""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        from django.db import connections
+
+        self.stack = ExitStack()
+        for connection in connections.all():
+            self.stack.enter_context(connection.execute_wrapper(self))
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stack.close()
+
+
+def run_scenario(client, next_request, requests, cold, fresh_pages=False,
+                 trace=False):
+    """Задержки в секундах, запросы к базе и выделенная память
+    по каждому запросу, а также число неожиданных ответов.
+    fresh_pages - обходить кэш страниц для гостей"""
+    from django.core.cache import cache
+
+    from posts.caching import bump_feed_version
+
+    latencies, queries, allocated, errors = [], [], [], 0
+    for _ in range(requests):
+        method, path, data, expected = next_request()
+        if cold:
+            cache.clear()
+        elif fresh_pages:
+            bump_feed_version('pages')
+        with QueryCounter() as counter:
+            if trace:
+                tracemalloc.reset_peak()
+                before = tracemalloc.get_traced_memory()[0]
+            started = time.perf_counter()
+            status = client.request(method, path, data)
+            latencies.append(time.perf_counter() - started)
+            if trace:
+                allocated.append(tracemalloc.get_traced_memory()[1] - before)
+        queries.append(counter.count)
+        errors += status != expected
+    return latencies, queries, allocated, errors
+
+
+def measure(clients, workload, args):
+    scenarios = []
+    for name, next_request in workload.scenarios().items():
+        scenarios.append((name, next_request, name in PAGE_CACHED_SCENARIOS))
+        if name in PAGE_CACHED_SCENARIOS:
+            scenarios.append((f'{name}_cached', next_request, False))
+    results = {}
+    for name, next_request, fresh_pages in scenarios:
+        client = clients['user' if name in WRITE_SCENARIOS else 'guest']
+        options = {'cold': args.cold, 'fresh_pages': fresh_pages}
+        run_scenario(client, next_request, args.warmup, **options)
+        latencies, queries, _, errors = run_scenario(
+            client, next_request, args.requests, **options)
+        tracemalloc.start()
+        try:
+            allocated = run_scenario(
+                client, next_request, args.memory_requests, trace=True,
+                **options)[2]
+        finally:
+            tracemalloc.stop()
+        results[name] = {
+            'requests': args.requests,
+            'errors': errors,
+            'p50_ms': round(percentile(latencies, 0.5) * 1000, 3),
+            'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+            'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+            'queries': round(statistics.mean(queries), 2),
+            'allocated_bytes': int(statistics.median(allocated or [0])),
+        }
+    return results
+
+
+def compare(results, baseline, args):
+    """Регрессии: (сценарий, метрика, было, стало) для метрик,
+    которые выросли больше, чем на порог от базового значения.
+    Рост в пределах абсолютного допуска не считается: у быстрых
+    страниц доли миллисекунды - это шум, а не регрессия"""
+    regressions = []
+    for name, current in results['scenarios'].items():
+        previous = baseline['scenarios'].get(name)
+        if previous is None:
+            continue
+        for metric, (threshold, slack) in COMPARED.items():
+            limit = previous[metric] * (1 + getattr(args, threshold))
+            if slack is not None:
+                limit = max(limit, previous[metric] + getattr(args, slack))
+            if current[metric] > limit:
+                regressions.append(
+                    (name, metric, previous[metric], current[metric]))
+    return regressions
+
+
+def report(results):
+    print(f'{"сценарий":<15} {"p50, мс":>8} {"p95, мс":>8} {"p99, мс":>8} '
+          f'{"запросов":>9} {"КиБ":>8} {"ошибок":>7}')
+    for name, row in results['scenarios'].items():
+        print(f'{name:<15} {row["p50_ms"]:>8.2f} {row["p95_ms"]:>8.2f} '
+              f'{row["p99_ms"]:>8.2f} {row["queries"]:>9.2f} '
+              f'{row["allocated_bytes"] / 1024:>8.0f} {row["errors"]:>7}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--warmup', type=int, default=20)
+    parser.add_argument(
+        '--memory-requests', type=int, default=20,
+        help='запросов прохода под tracemalloc')
+    parser.add_argument('--cold', action='store_true')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--posts', type=int, default=20000)
+    parser.add_argument('--comments', type=int, default=40000)
+    parser.add_argument('--follows', type=int, default=5000)
+    parser.add_argument('--output', help='куда записать результаты JSON')
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument(
+        '--save-baseline', action='store_true',
+        help='записать результаты как новый базовый замер')
+    parser.add_argument(
+        '--latency-threshold', type=float, default=0.25,
+        help='допустимый рост p95, доля от базового')
+    parser.add_argument(
+        '--latency-slack', type=float, default=1.0,
+        help='рост p95 в миллисекундах, который не считается регрессией')
+    parser.add_argument(
+        '--queries-threshold', type=float, default=0.0,
+        help='допустимый рост числа запросов к базе, доля')
+    parser.add_argument(
+        '--memory-threshold', type=float, default=0.25,
+        help='допустимый рост выделенной памяти, доля')
+    args = parser.parse_args()
+
+    setup_django()
+    from django import get_version
+    from django.conf import settings
+    from django.core.management import call_command
+    from django.db import connections
+
+    # Замеряется боевой режим: с DEBUG Django запоминает
+    # текст каждого запроса к базе
+    settings.DEBUG = False
+    dataset = {name: getattr(args, name) for name in (
+        'seed', 'users', 'posts', 'comments', 'follows')}
+    with tempfile.TemporaryDirectory() as directory:
+        create_file_db(os.path.join(directory, 'e2e.sqlite3'))
+        call_command(
+            'seed', *(f'--{name}={value}' for name, value in dataset.items()),
+            stdout=io.StringIO())
+        from yatube.wsgi import application
+
+        workload = Workload(args.seed)
+        clients = {'guest': WSGIClient(application),
+                   'user': WSGIClient(application)}
+        clients['user'].login(workload.authors[0], 'password')
+        scenarios = measure(clients, workload, args)
+        connections.close_all()
+
+    results = {
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'environment': {
+            'python': platform.python_version(),
+            'django': get_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'machine': platform.machine(),
+        },
+        'dataset': dataset,
+        'options': {'requests': args.requests, 'cold': args.cold},
+        'scenarios': scenarios,
+    }
+    report(results)
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2, ensure_ascii=False)
+    errors = {name: row['errors']
+              for name, row in results['scenarios'].items() if row['errors']}
+    for name, count in errors.items():
+        print(f'Ошибки {name}: неожиданных ответов {count}')
+    if errors:
+        # Страница ошибки быстрее настоящей: такой замер не годится
+        # ни для сравнения, ни в базовые
+        sys.exit(1)
+    if args.save_baseline:
+        with open(args.baseline, 'w') as file:
+            json.dump(results, file, indent=2, ensure_ascii=False)
+        print(f'Базовый замер записан в {args.baseline}')
+        return
+    if not os.path.exists(args.baseline):
+        return
+
+    with open(args.baseline) as file:
+        baseline = json.load(file)
+    if (baseline['dataset'], baseline['options']) != (
+            results['dataset'], results['options']):
+        print('Базовый замер снят на других данных или настройках, '
+              'сравнение может быть неточным')
+    regressions = compare(results, baseline, args)
+    for name, metric, before, after in regressions:
+        print(f'Регрессия {name}: {metric} {before} -> {after}')
+    if regressions:
+        sys.exit(1)
+    print('Регрессий относительно базового замера нет')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""Комментарии к одному посту от многих пишущих одновременно:
+каждая запись своей транзакцией и через очередь записи.
+
+    python -m benchmarks.group_commit [--seconds 5] [--writers 50]
+
+Каждый режим выполняется в отдельном процессе на свежем файле базы
+с PRAGMA из настроек. Пишущие потоки сохраняют комментарии через
+posts.write_queue.write, как add_comment, со всеми сигналами.
+Выводятся записи в секунду, 50-й и 99-й перцентили задержки и число
+ошибок."""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks import create_file_db, percentile, setup_django
+
+MODES = ('sync', 'queue')
+
+
+def measure(mode, path, seconds, writers):
+    """Выполняется в дочернем процессе, печатает одну строку результата"""
+    setup_django()
+    from django.db import connections
+
+    from posts import write_queue
+    from posts.models import Comment, Post, USER_MODEL
+
+    write_queue.WRITE_QUEUE = mode == 'queue'
+    create_file_db(path)
+    author = USER_MODEL.objects.create_user(username='bench')
+    post = Post.objects.create(text='Горячий пост', author=author)
+    connections.close_all()
+
+    deadline = time.monotonic() + seconds
+    latencies, errors = [], []
+
+    def writer():
+        done, failed = [], 0
+        while time.monotonic() < deadline:
+            comment = Comment(post_id=post.pk, author_id=author.pk,
+                              text='Комментарий')
+            started = time.perf_counter()
+            try:
+                write_queue.write(comment.save)
+            except Exception:
+                failed += 1
+                continue
+            done.append(time.perf_counter() - started)
+        connections.close_all()
+        latencies.extend(done)
+        errors.append(failed)
+
+    threads = [threading.Thread(target=writer) for _ in range(writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    print(len(latencies) / seconds, percentile(latencies, 0.5) * 1000,
+          percentile(latencies, 0.99) * 1000, sum(errors))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--writers', type=int, default=50)
+    parser.add_argument('--child', nargs=2, metavar=('MODE', 'PATH'),
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        measure(*args.child, args.seconds, args.writers)
+        return
+
+    print(f'{"режим":<6} {"записей/с":>10} {"p50, мс":>8} {"p99, мс":>8} '
+          f'{"ошибок":>7}')
+    with tempfile.TemporaryDirectory() as directory:
+        for mode in MODES:
+            output = subprocess.run(
+                [sys.executable, '-m', 'benchmarks.group_commit',
+                 '--child', mode, os.path.join(directory, f'{mode}.sqlite3'),
+                 '--seconds', str(args.seconds),
+                 '--writers', str(args.writers)],
+                check=True, capture_output=True, text=True,
+            ).stdout.split()
+            rate, p50, p99, errors = (float(value) for value in output)
+            print(f'{mode:<6} {rate:>10.0f} {p50:>8.1f} {p99:>8.1f} '
+                  f'{errors:>7.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""Чтение и запись в SQLite из нескольких потоков: без PRAGMA
+и с SQLITE_PRAGMAS из настроек.
+
+    python -m benchmarks.sqlite_concurrency [--seconds 5] [--readers 8]
+                                            [--writers 4]
+
+Каждый режим выполняется в отдельном процессе на свежем файле базы
+(журнал WAL сохраняется в файле и перешёл бы в следующий замер).
+Читатели выбирают первую страницу ленты, писатели создают посты
+со всеми сигналами: счётчики, версии лент, раскладка по подпискам.
+У каждого потока своё соединение, как у потоков сервера.
+
+Выводятся операции в секунду, 99-й перцентиль задержки и число
+ошибок «database is locked». В режиме plain ожидание блокировки -
+стандартные для модуля sqlite3 5 секунд."""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks import create_file_db, percentile, setup_django
+
+MODES = ('plain', 'tuned')
+
+
+def worker(operation, deadline, stats):
+    from django.db import OperationalError, connections
+
+    latencies, errors = [], 0
+    try:
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            try:
+                operation()
+            except OperationalError:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+    finally:
+        connections.close_all()
+    stats.append((latencies, errors))
+
+
+def measure(mode, path, seconds, readers, writers):
+    """Выполняется в дочернем процессе, печатает одну строку результата"""
+    setup_django()
+    from django.db import connection
+
+    from posts.models import Post, USER_MODEL
+    from yatube import sqlite
+
+    if mode == 'plain':
+        sqlite.SQLITE_PRAGMAS = {}
+    create_file_db(path)
+    author = USER_MODEL.objects.create_user(username='bench')
+    Post.objects.bulk_create(
+        Post(text=f'Пост {i}', author=author) for i in range(1000))
+    connection.close()
+
+    def read():
+        list(Post.objects.for_feed().order_by('-pub_date', '-id')[:10])
+
+    def write():
+        Post.objects.create(text='Новый пост', author_id=author.pk)
+
+    deadline = time.monotonic() + seconds
+    reads, writes = [], []
+    threads = [
+        threading.Thread(target=worker, args=(read, deadline, reads))
+        for _ in range(readers)
+    ] + [
+        threading.Thread(target=worker, args=(write, deadline, writes))
+        for _ in range(writers)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for stats in (reads, writes):
+        latencies = [value for done, _ in stats for value in done]
+        errors = sum(errors for _, errors in stats)
+        print(len(latencies) / seconds,
+              percentile(latencies, 0.99) * 1000, errors, end=' ')
+    print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--child', nargs=2, metavar=('MODE', 'PATH'),
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        measure(*args.child, args.seconds, args.readers, args.writers)
+        return
+
+    print(f'{"режим":<6} {"чтений/с":>9} {"p99, мс":>8} {"ошибок":>7} '
+          f'{"записей/с":>10} {"p99, мс":>8} {"ошибок":>7}')
+    with tempfile.TemporaryDirectory() as directory:
+        for mode in MODES:
+            output = subprocess.run(
+                [sys.executable, '-m', 'benchmarks.sqlite_concurrency',
+                 '--child', mode, os.path.join(directory, f'{mode}.sqlite3'),
+                 '--seconds', str(args.seconds),
+                 '--readers', str(args.readers),
+                 '--writers', str(args.writers)],
+                check=True, capture_output=True, text=True,
+            ).stdout.split()
+            read_rate, read_p99, read_errors, write_rate, write_p99, \
+                write_errors = (float(value) for value in output)
+            print(f'{mode:<6} {read_rate:>9.0f} {read_p99:>8.1f} '
+                  f'{read_errors:>7.0f} {write_rate:>10.0f} '
+                  f'{write_p99:>8.1f} {write_errors:>7.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,170 @@
+"""Пиковая память процесса на одну загрузку картинки поста.
+
+    python -m benchmarks.upload_rss
+
+Каждая пара «картинка, режим» выполняется в отдельном процессе,
+чтобы пик RSS (VmHWM) относился только к ней. Тело multipart-запроса заранее
+лежит на диске и читается парсером Django как поток, как из сокета.
+
+Режимы:
+    default - стандартные обработчики загрузки Django и forms.ImageField;
+    bounded - BoundedUploadHandler и BoundedImageField из posts.
+
+Для каждого случая выводится прирост RSS после разбора и проверки
+формы и после полного декодирования картинки, которое затем делают
+миниатюры и варианты для srcset (только для принятых файлов)."""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+from PIL import Image
+
+from benchmarks import setup_django
+
+BOUNDARY = 'benchmark-boundary'
+MODES = ('default', 'bounded')
+
+
+def make_photo(path):
+    """Обычная фотография: 3000x2000 JPEG"""
+    Image.effect_noise((3000, 2000), 40).convert('RGB').save(
+        path, 'JPEG', quality=85)
+
+
+def make_huge_png(path):
+    """Маленький файл, но 8000x8000 пикселей после декодирования"""
+    Image.new('RGB', (8000, 8000), 'white').save(path, 'PNG')
+
+
+def make_big_file(path):
+    """Маленькая картинка с 40 МБ мусора в хвосте"""
+    Image.new('RGB', (100, 100), 'white').save(path, 'PNG')
+    with open(path, 'ab') as file:
+        file.write(os.urandom(40 * 1024 ** 2))
+
+
+CASES = {
+    'photo': ('photo.jpg', make_photo),
+    'huge-png': ('huge.png', make_huge_png),
+    'big-file': ('big.png', make_big_file),
+}
+
+
+def write_body(directory, filename, make):
+    """Собирает тело multipart-запроса с картинкой на диске"""
+    image_path = os.path.join(directory, filename)
+    make(image_path)
+    body_path = image_path + '.body'
+    with open(body_path, 'wb') as body, open(image_path, 'rb') as image:
+        body.write(
+            f'--{BOUNDARY}\r\n'
+            f'Content-Disposition: form-data; name="image"; '
+            f'filename="{filename}"\r\n'
+            f'Content-Type: application/octet-stream\r\n\r\n'.encode())
+        while True:
+            chunk = image.read(1024 ** 2)
+            if not chunk:
+                break
+            body.write(chunk)
+        body.write(f'\r\n--{BOUNDARY}--\r\n'.encode())
+    os.remove(image_path)
+    return body_path
+
+
+def read_status_kb(field):
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith(f'{field}:'):
+                return int(line.split()[1])
+    return 0
+
+
+def current_rss_kb():
+    return read_status_kb('VmRSS')
+
+
+def peak_rss_kb():
+    """VmHWM, а не ru_maxrss: ru_maxrss в Linux переживает exec
+    и досталось бы от родителя, который готовил картинки"""
+    return read_status_kb('VmHWM')
+
+
+def measure(mode, body_path):
+    """Выполняется в дочернем процессе, печатает одну строку результата"""
+    setup_django()
+    from django import forms
+    from django.core.exceptions import ValidationError
+    from django.core.files.uploadhandler import (MemoryFileUploadHandler,
+                                                 TemporaryFileUploadHandler)
+    from django.http.multipartparser import MultiPartParser
+
+    from posts.forms import BoundedImageField
+    from posts.uploads import BoundedUploadHandler
+
+    if mode == 'bounded':
+        handlers = [BoundedUploadHandler()]
+        field = BoundedImageField()
+    else:
+        handlers = [MemoryFileUploadHandler(), TemporaryFileUploadHandler()]
+        field = forms.ImageField()
+
+    meta = {
+        'CONTENT_TYPE': f'multipart/form-data; boundary={BOUNDARY}',
+        'CONTENT_LENGTH': str(os.path.getsize(body_path)),
+    }
+    baseline = current_rss_kb()
+    with open(body_path, 'rb') as stream:
+        _, files = MultiPartParser(meta, stream, handlers).parse()
+    uploaded = files['image']
+    try:
+        field.clean(uploaded)
+        accepted = True
+    except ValidationError:
+        accepted = False
+    validated = peak_rss_kb() - baseline
+
+    processed = None
+    if accepted:
+        uploaded.seek(0)
+        with Image.open(uploaded) as image:
+            image.load()
+        processed = peak_rss_kb() - baseline
+    print(accepted, validated, processed)
+
+
+def run_case(mode, body_path):
+    output = subprocess.run(
+        [sys.executable, '-m', 'benchmarks.upload_rss',
+         '--child', mode, body_path],
+        check=True, capture_output=True, text=True,
+    ).stdout.split()
+    accepted, validated, processed = output
+    return accepted == 'True', int(validated), processed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--child', nargs=2, metavar=('MODE', 'BODY'),
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        measure(*args.child)
+        return
+
+    print(f'{"картинка":<10} {"режим":<8} {"принята":<8} '
+          f'{"проверка, МБ":>13} {"декодирование, МБ":>18}')
+    with tempfile.TemporaryDirectory() as directory:
+        for case, (filename, make) in CASES.items():
+            body_path = write_body(directory, filename, make)
+            for mode in MODES:
+                accepted, validated, processed = run_case(mode, body_path)
+                processed = (f'{int(processed) / 1024:.1f}'
+                             if processed != 'None' else '-')
+                print(f'{case:<10} {mode:<8} {"да" if accepted else "нет":<8} '
+                      f'{validated / 1024:>13.1f} {processed:>18}')
+
+
+if __name__ == '__main__':
+    main()
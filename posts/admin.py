@@ -1,5 +1,41 @@
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin import helpers
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Count
+from django.template.response import TemplateResponse
+
 from . import models
+from .caching import bump_post_feeds
+from .paginator import EstimatedCountPaginator
+from .search import filter_matching, fts_query
+from .signals import change_group_post_count
+
+# Сколько постов обрабатывает один шаг массового действия
+ACTION_BATCH_SIZE = 500
+
+
+def in_batches(queryset, size=None):
+    """Выдаёт списки id из queryset порциями, не загружая объекты.
+
+    Следующая порция выбирается по ключу id > последнего, поэтому
+    правка и удаление предыдущих порций её не сдвигают."""
+    size = size or ACTION_BATCH_SIZE
+    queryset = queryset.order_by('pk').values_list('pk', flat=True)
+    last_pk = 0
+    while True:
+        batch = list(queryset.filter(pk__gt=last_pk)[:size])
+        if not batch:
+            return
+        yield batch
+        last_pk = batch[-1]
+
+
+class PostActionForm(helpers.ActionForm):
+    group = forms.ModelChoiceField(
+        label='Сообщество', queryset=models.Group.objects.all(),
+        required=False, empty_label='Без сообщества')
 
 
 @admin.register(models.Post)
@@ -12,17 +48,116 @@ class PostAdmin(admin.ModelAdmin):
     list_display :
         перечисляем поля, которые должны отображаться в админке
     search_fields :
-        добавляем интерфейс для поиска по тексту постов
+        добавляем интерфейс для поиска по тексту постов; сам поиск
+        идёт по полнотекстовому индексу, см. get_search_results
     list_filter :
         добавляем возможность фильтрации по дате
     empty_value_display :
         это свойство сработает для всех колонок: где пусто -
-        там будет эта строка"""
+        там будет эта строка
+    list_select_related :
+        автор и сообщество приходят тем же запросом, что и посты
+    date_hierarchy :
+        навигация по датам; она, как и сортировка списка,
+        идёт по индексу post_pub_date_idx
+    paginator :
+        вместо полного COUNT число постов считается до предела,
+        а дальше оценивается, см. EstimatedCountPaginator
+    actions :
+        массовые действия, которые обрабатывают посты порциями"""
 
-    list_display = ("pk", "text", "pub_date", "author")
+    list_display = ("pk", "text", "pub_date", "author", "group")
+    list_select_related = ("author", "group")
     search_fields = ("text",)
     list_filter = ("pub_date",)
+    date_hierarchy = "pub_date"
+    ordering = ("-pub_date", "-pk")
     empty_value_display = "-пусто-"
+    raw_id_fields = ("author",)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    action_form = PostActionForm
+    actions = ("delete_in_batches", "move_to_group")
+
+    def get_search_results(self, request, queryset, search_term):
+        """Поиск по индексу FTS5 вместо LIKE '%...%' по всей таблице"""
+        if not fts_query(search_term):
+            return queryset, False
+        return filter_matching(queryset, search_term), False
+
+    def get_actions(self, request):
+        # Стандартное удаление собирает в память все выбранные посты
+        # вместе с комментариями, его заменяет delete_in_batches
+        actions = super().get_actions(request)
+        actions.pop('delete_selected', None)
+        return actions
+
+    def delete_in_batches(self, request, queryset):
+        if request.POST.get('post') != 'yes':
+            return self.delete_confirmation(request, queryset)
+        deleted = 0
+        for batch in in_batches(queryset):
+            with transaction.atomic():
+                _, counts = models.Post.objects.filter(pk__in=batch).delete()
+            deleted += counts.get(models.Post._meta.label, 0)
+        self.message_user(
+            request, f'Удалено постов: {deleted}', messages.SUCCESS)
+
+    delete_in_batches.short_description = 'Удалить выбранные посты'
+    delete_in_batches.allowed_permissions = ('delete',)
+
+    def delete_confirmation(self, request, queryset):
+        paginator = EstimatedCountPaginator(queryset, 1)
+        context = {
+            **self.admin_site.each_context(request),
+            'title': 'Удаление постов',
+            'opts': self.model._meta,
+            'count': paginator.count,
+            'count_label': paginator.count_label,
+            'selected': request.POST.getlist(helpers.ACTION_CHECKBOX_NAME),
+            'select_across': request.POST.get('select_across') == '1',
+            'action_checkbox_name': helpers.ACTION_CHECKBOX_NAME,
+        }
+        return TemplateResponse(
+            request, 'admin/posts/post/delete_in_batches.html', context)
+
+    def move_to_group(self, request, queryset):
+        try:
+            group = self.action_form.base_fields['group'].clean(
+                request.POST.get('group'))
+        except ValidationError:
+            self.message_user(
+                request, 'Такого сообщества нет', messages.ERROR)
+            return
+        group_id = group.pk if group else None
+        moved = 0
+        for batch in in_batches(queryset):
+            with transaction.atomic():
+                moved += self.move_batch(batch, group_id)
+        self.message_user(
+            request, f'Перенесено постов: {moved}', messages.SUCCESS)
+
+    move_to_group.short_description = 'Перенести в выбранное сообщество'
+    move_to_group.allowed_permissions = ('change',)
+
+    def move_batch(self, batch, group_id):
+        """update() не вызывает сигналов, поэтому счётчики сообществ
+        и версии лент поправляются здесь, по одной порции за раз"""
+        posts = models.Post.objects.filter(pk__in=batch).exclude(
+            group_id=group_id)
+        old_groups = {
+            row['group_id']: row['count']
+            for row in posts.order_by().values('group_id').annotate(
+                count=Count('pk'))
+        }
+        authors = set(posts.values_list('author_id', flat=True))
+        moved = posts.update(group_id=group_id)
+        for old_group_id, count in old_groups.items():
+            change_group_post_count(old_group_id, -count)
+        change_group_post_count(group_id, moved)
+        for author_id in authors:
+            bump_post_feeds(author_id, group_id, *old_groups)
+        return moved
 
 
 @admin.register(models.Group)
@@ -37,3 +172,12 @@ class GroupAdmin(admin.ModelAdmin):
 
     title = ("pk", "title", "slug", "description")
     search_fields = ("pk", "title", "slug", "description",)
+
+
+@admin.register(models.Follow)
+class FollowAdmin(admin.ModelAdmin):
+    """Подписки; пользователи выбираются по id, а не списком"""
+
+    list_display = ("pk", "user", "author")
+    list_select_related = ("user", "author")
+    raw_id_fields = ("user", "author")
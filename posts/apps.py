@@ -2,5 +2,11 @@ from django.apps import AppConfig
 
 
 class PostsConfig(AppConfig):
-    name = 'posts'()
+    name = 'posts'
     verbose_name = 'Посты'
+
+    def ready(self):
+        # Подключаем обработчики сигналов, которые ведут счётчики
+        from . import signals  # noqa: F401
+        # и PRAGMA для соединений с SQLite
+        from yatube import sqlite  # noqa: F401
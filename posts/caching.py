@@ -0,0 +1,77 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+FEED_CACHE_TIMEOUT = getattr(settings, 'FEED_CACHE_TIMEOUT', 60 * 5)
+
+# Параметры запроса, которые выбирают страницу ленты
+CURSOR_PARAMS = ('after', 'before', 'page')
+
+
+def feed_version_key(kind, key=''):
+    return f'feed-version:{kind}:{key}'
+
+
+def feed_modified_key(kind, key=''):
+    return f'feed-modified:{kind}:{key}'
+
+
+def new_version():
+    """Начальная версия ленты. Берётся из текущего времени, чтобы после
+    вытеснения счётчика из кэша номера версий не начинались заново
+    и не совпадали с номерами старых фрагментов."""
+    return int(time.time() * 1000)
+
+
+def get_feed_version(kind, key=''):
+    version_key = feed_version_key(kind, key)
+    version = cache.get(version_key)
+    if version is None:
+        cache.add(version_key, new_version(), None)
+        # Когда лента менялась до этого, неизвестно: считаем, что сейчас
+        cache.add(feed_modified_key(kind, key), time.time(), None)
+        version = cache.get(version_key)
+    return version
+
+
+def get_feed_modified(kind, key=''):
+    """Время последнего изменения ленты (timestamp) или None,
+    если его уже нет в кэше"""
+    return cache.get(feed_modified_key(kind, key))
+
+
+def bump_feed_version(kind, key=''):
+    """Делает устаревшими все закэшированные фрагменты ленты"""
+    cache.set(feed_modified_key(kind, key), time.time(), None)
+    version_key = feed_version_key(kind, key)
+    try:
+        cache.incr(version_key)
+    except ValueError:
+        cache.set(version_key, new_version(), None)
+
+
+def bump_post_feeds(author_id, *group_ids):
+    """Сбрасывает ленты, в которых показывается пост,
+    и все закэшированные целиком страницы"""
+    bump_feed_version('pages')
+    bump_feed_version('index')
+    bump_feed_version('profile', author_id)
+    for group_id in set(group_ids):
+        if group_id is not None:
+            bump_feed_version('group', group_id)
+
+
+def feed_cache_context(request, kind, key=''):
+    """Контекст для тега {% cache %} вокруг ленты.
+
+    Ключ фрагмента складывается из вида ленты, сообщества или автора,
+    версии ленты, курсора страницы и пользователя (карточки постов
+    показывают автору кнопку редактирования)."""
+    version = get_feed_version(kind, key)
+    cursor = '&'.join(
+        f'{name}={request.GET.get(name, "")}' for name in CURSOR_PARAMS)
+    return {
+        'feed_cache_key': f'{kind}:{key}:{version}:{request.user.pk}:{cursor}',
+        'feed_cache_timeout': FEED_CACHE_TIMEOUT,
+    }
@@ -0,0 +1,71 @@
+"""Условные GET-запросы к страницам лент и постов.
+
+Валидаторы страницы берутся из версий лент, которые на ней выводятся:
+сигналы увеличивают версию при любом изменении постов, комментариев
+и подписок, а вместе с версией запоминают время изменения. ETag - хэш
+версий и пользователя (страницы авторизованных отличаются кнопками
+и меню), Last-Modified - самое позднее из времён изменения лент.
+Версии лежат в кэше, поэтому для ответа 304 база нужна разве что
+для поиска сообщества или автора по адресу."""
+import hashlib
+import time
+from functools import wraps
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from .caching import get_feed_modified, get_feed_version
+
+
+def feed_validators(request, feeds):
+    """ETag и Last-Modified страницы с лентами feeds - парами (вид, ключ)"""
+    versions = ':'.join(
+        str(get_feed_version(kind, key)) for kind, key in feeds)
+    digest = hashlib.md5(f'{versions}:{request.user.pk}'.encode())
+    modified = [get_feed_modified(kind, key) for kind, key in feeds]
+    if None in modified:
+        # Время вытеснено из кэша: безопаснее считать, что страница новая
+        modified.append(time.time())
+    return quote_etag(digest.hexdigest()), int(max(modified))
+
+
+def set_validators(response, validators):
+    """Ставит ответу ETag и Last-Modified из feed_validators.
+
+    Валидаторы надо получить до выборки постов: если лента изменится
+    во время отрисовки, ответ получит старую версию и не закрепится
+    в кэше клиента под новой."""
+    if response.status_code == 200:
+        etag, last_modified = validators
+        response.setdefault('ETag', etag)
+        response.setdefault('Last-Modified', http_date(last_modified))
+    return response
+
+
+def feed_condition(feeds):
+    """Декоратор представления: на условный GET по неизменившимся лентам
+    отвечает 304 до основных запросов и отрисовки шаблона.
+
+    feeds(request, *args, **kwargs) возвращает ленты страницы или None,
+    если их не определить (например, автора нет - представление само
+    ответит 404). Вызывается только для запросов с If-None-Match или
+    If-Modified-Since, так что обычные запросы не тратят на него
+    обращений к базе: валидаторы ответу ставит само представление
+    через set_validators."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            conditional = (
+                'HTTP_IF_NONE_MATCH' in request.META
+                or 'HTTP_IF_MODIFIED_SINCE' in request.META)
+            if request.method in ('GET', 'HEAD') and conditional:
+                page_feeds = feeds(request, *args, **kwargs)
+                if page_feeds is not None:
+                    etag, last_modified = feed_validators(request, page_feeds)
+                    response = get_conditional_response(
+                        request, etag=etag, last_modified=last_modified)
+                    if response is not None:
+                        return response
+            return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,187 @@
+"""Рассылка событий о новых постах подписчикам потока (SSE).
+
+Broker раздаёт события подпискам своего процесса. Чтобы событие,
+опубликованное в одном процессе, дошло до потоков в других (gunicorn
+с несколькими воркерами), процесс с подписчиками слушает датаграммный
+unix-сокет в каталоге EVENTS_SOCKET_DIR, а publish отправляет событие
+во все сокеты каталога. Сокет завершившегося процесса удаляется при
+первой неудачной отправке. Без EVENTS_SOCKET_DIR события не покидают
+процесс.
+
+Доставка не гарантируется: подписка, которая не успевает разбирать
+очередь, помечается переполненной, а датаграмма может не влезть
+в буфер получателя. Поток в этом случае закрывается, клиент
+переподключается с Last-Event-ID и дочитывает пропущенное из базы."""
+import atexit
+import json
+import os
+import queue
+import socket
+import threading
+from contextlib import suppress
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .storage import post_image_storage
+
+# Каталог сокетов для рассылки событий между процессами;
+# None - только внутри процесса
+EVENTS_SOCKET_DIR = getattr(settings, 'EVENTS_SOCKET_DIR', None)
+# Сколько событий ждёт в очереди подписки, пока её не сочтут отставшей
+EVENTS_QUEUE_SIZE = getattr(settings, 'EVENTS_QUEUE_SIZE', 100)
+
+MAX_DATAGRAM = 1024 ** 2
+
+
+class Subscription:
+    """Очередь событий одного потока. accepts(event) отбирает события"""
+
+    def __init__(self, broker, accepts):
+        self.broker = broker
+        self.accepts = accepts
+        self.queue = queue.Queue(EVENTS_QUEUE_SIZE)
+        self.overflowed = False
+
+    def put(self, event):
+        if self.overflowed or not self.accepts(event):
+            return
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            # Публикация не ждёт медленного читателя: он отключится
+            # и дочитает пропущенное из базы
+            self.overflowed = True
+
+    def get(self, timeout):
+        """Следующее событие или None, если за timeout секунд его не было"""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class Broker:
+    def __init__(self, socket_dir=None):
+        self.socket_dir = socket_dir
+        self.subscriptions = set()
+        self.lock = threading.Lock()
+        self.socket = None
+        self.socket_path = None
+
+    def subscribe(self, accepts=lambda event: True):
+        subscription = Subscription(self, accepts)
+        with self.lock:
+            self.subscriptions.add(subscription)
+            if self.socket_dir and self.socket is None:
+                self.listen()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscriptions.discard(subscription)
+
+    def publish(self, event):
+        """Отдаёт событие подписчикам этого и остальных процессов.
+        event - словарь, который можно записать в JSON"""
+        self.dispatch(event)
+        if self.socket_dir:
+            self.send(event)
+
+    def dispatch(self, event):
+        with self.lock:
+            subscriptions = list(self.subscriptions)
+        for subscription in subscriptions:
+            subscription.put(event)
+
+    def send(self, event):
+        data = json.dumps(event, cls=DjangoJSONEncoder).encode()
+        try:
+            names = os.listdir(self.socket_dir)
+        except FileNotFoundError:
+            return
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sender:
+            sender.setblocking(False)
+            for name in names:
+                path = os.path.join(self.socket_dir, name)
+                if not name.endswith('.sock') or path == self.socket_path:
+                    continue
+                try:
+                    sender.sendto(data, path)
+                except (ConnectionRefusedError, FileNotFoundError):
+                    # Процесс завершился, не убрав за собой сокет
+                    with suppress(FileNotFoundError):
+                        os.remove(path)
+                except OSError:
+                    # Буфер получателя полон или событие слишком велико
+                    pass
+
+    def listen(self):
+        os.makedirs(self.socket_dir, exist_ok=True)
+        self.socket_path = os.path.join(
+            self.socket_dir, f'{os.getpid()}-{id(self):x}.sock')
+        with suppress(FileNotFoundError):
+            os.remove(self.socket_path)
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.socket.bind(self.socket_path)
+        threading.Thread(
+            target=self.receive, args=(self.socket,),
+            name='events-listener', daemon=True).start()
+        atexit.register(self.stop)
+
+    def receive(self, listener):
+        while True:
+            try:
+                data = listener.recv(MAX_DATAGRAM)
+            except OSError:
+                return
+            if not data:
+                # После shutdown в stop() recv возвращает пустые данные
+                return
+            try:
+                event = json.loads(data)
+            except ValueError:
+                continue
+            self.dispatch(event)
+
+    def stop(self):
+        with self.lock:
+            listener, self.socket = self.socket, None
+            path, self.socket_path = self.socket_path, None
+        if listener is not None:
+            # shutdown будит поток, который ждёт в recv
+            with suppress(OSError):
+                listener.shutdown(socket.SHUT_RDWR)
+            listener.close()
+            with suppress(FileNotFoundError):
+                os.remove(path)
+
+
+broker = Broker(EVENTS_SOCKET_DIR)
+
+
+def post_event(post):
+    """Событие о новом посте. В data - пост в том же виде,
+    что и в ответах API"""
+    image = post.image.name
+    return {
+        'id': post.pk,
+        'author_id': post.author_id,
+        'group_id': post.group_id,
+        'data': {
+            'id': post.pk,
+            'text': post.text,
+            'pub_date': post.pub_date,
+            'author': post.author.username,
+            'group': post.group.slug if post.group_id else None,
+            'image': post_image_storage.url(image) if image else None,
+            'comment_count': post.comment_count,
+        },
+    }
+
+
+def publish_post(post):
+    broker.publish(post_event(post))
@@ -1,5 +1,69 @@
 from django import forms
-from .models import Post, Comment
+from django.core.exceptions import ValidationError
+from django.template.defaultfilters import filesizeformat
+from PIL import Image
+
+from .models import Comment, Group, Post
+from .uploads import IMAGE_MAX_BYTES, IMAGE_MAX_PIXELS
+
+
+class BoundedImageField(forms.ImageField):
+    """Поле картинки с ограничениями на размер файла и число пикселей.
+
+    Размер берётся из UploadedFile.size, пиксели - из заголовка,
+    который Pillow читает при ленивом открытии. JPEG дополнительно
+    декодируется через draft в уменьшенном масштабе, чтобы поймать
+    битый файл, не разворачивая его в память целиком. Только после
+    этого работает обычная проверка ImageField."""
+    default_error_messages = {
+        'too_large': 'Файл больше %(limit)s.',
+        'too_many_pixels': (
+            'Картинка %(width)sx%(height)s слишком большая, '
+            'допускается не больше %(limit)s мегапикселей.'),
+    }
+
+    def __init__(self, *, max_bytes=IMAGE_MAX_BYTES,
+                 max_pixels=IMAGE_MAX_PIXELS, **kwargs):
+        self.max_bytes = max_bytes
+        self.max_pixels = max_pixels
+        super().__init__(**kwargs)
+
+    def to_python(self, data):
+        if data in self.empty_values:
+            return super().to_python(data)
+        if data.size > self.max_bytes:
+            raise ValidationError(
+                self.error_messages['too_large'], code='too_large',
+                params={'limit': filesizeformat(self.max_bytes)})
+        self.check_pixels(data)
+        return super().to_python(data)
+
+    def check_pixels(self, data):
+        if hasattr(data, 'temporary_file_path'):
+            source = data.temporary_file_path()
+        else:
+            source = data
+        try:
+            with Image.open(source) as image:
+                width, height = image.size
+                if width * height > self.max_pixels:
+                    raise ValidationError(
+                        self.error_messages['too_many_pixels'],
+                        code='too_many_pixels',
+                        params={'width': width, 'height': height,
+                                'limit': self.max_pixels // 10 ** 6})
+                if image.format == 'JPEG':
+                    image.draft('RGB', (width // 8, height // 8))
+                    image.load()
+        except ValidationError:
+            raise
+        except Exception as exc:
+            raise ValidationError(
+                self.error_messages['invalid_image'], code='invalid_image',
+            ) from exc
+        finally:
+            if hasattr(data, 'seek'):
+                data.seek(0)
 
 
 class PostForm(forms.ModelForm):
@@ -7,6 +71,14 @@ class PostForm(forms.ModelForm):
     class Meta:
         model = Post
         fields = ('group', 'text', 'image')
+        field_classes = {'image': BoundedImageField}
+
+    def save(self, commit=True):
+        # Миниатюра и варианты старой картинки новой уже не подходят
+        if 'image' in self.changed_data:
+            self.instance.thumbnail = ''
+            self.instance.variant_widths = ''
+        return super().save(commit)
 
 
 class CommentForm(forms.ModelForm):
@@ -15,3 +87,15 @@ class CommentForm(forms.ModelForm):
         model = Comment
         fields = ('text',)
         widgets = {'text': forms.Textarea(attrs={'cols': 50, 'rows': 10})}
+
+
+class SearchForm(forms.Form):
+    q = forms.CharField(
+        label='Текст', max_length=200,
+        widget=forms.TextInput(attrs={'placeholder': 'Что ищем?'}))
+    group = forms.ModelChoiceField(
+        label='Сообщество', queryset=Group.objects.all(),
+        to_field_name='slug', required=False, empty_label='Все сообщества')
+    author = forms.CharField(
+        label='Автор', max_length=150, required=False,
+        widget=forms.TextInput(attrs={'placeholder': 'Автор'}))
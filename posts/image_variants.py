@@ -0,0 +1,74 @@
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+
+from .caching import bump_post_feeds
+from .imaging import (VARIANT_FORMATS, VARIANT_WIDTHS, render_variants,
+                      variant_name)
+from .models import Post
+from .storage import post_image_storage
+
+# Число процессов, которые готовят варианты картинок после загрузки;
+# 0 - готовить в вызывающем потоке
+VARIANT_PROCESSES = getattr(settings, 'POST_IMAGE_VARIANT_PROCESSES', 2)
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=VARIANT_PROCESSES)
+    return _executor
+
+
+def variant_job(image_name):
+    """Аргументы render_variants для картинки поста"""
+    targets = {
+        (width, extension): post_image_storage.path(
+            variant_name(image_name, width, extension))
+        for width in VARIANT_WIDTHS
+        for extension in VARIANT_FORMATS
+    }
+    return post_image_storage.path(image_name), targets
+
+
+def save_variant_widths(post_id, image_name, widths):
+    """Отмечает варианты поста готовыми, если картинку не успели заменить.
+    Пост с непустым variant_widths команда build_image_variants
+    пропускает, так что прерванная обработка продолжается с места
+    остановки."""
+    return Post.objects.filter(pk=post_id, image=image_name).update(
+        variant_widths=','.join(str(width) for width in widths))
+
+
+def make_variants(post_id, image_name):
+    """Готовит варианты картинки поста в пуле процессов и ждёт их"""
+    post = Post.objects.filter(pk=post_id, image=image_name).first()
+    if post is None:
+        return None
+    # Тот же файл у другого поста: варианты уже лежат на диске
+    ready = Post.objects.filter(image=image_name).exclude(
+        variant_widths='').values_list('variant_widths', flat=True).first()
+    if ready:
+        widths = [int(width) for width in ready.split(',')]
+    elif VARIANT_PROCESSES:
+        widths = get_executor().submit(
+            render_variants, *variant_job(image_name)).result()
+    else:
+        widths = render_variants(*variant_job(image_name))
+    if save_variant_widths(post_id, image_name, widths):
+        bump_post_feeds(post.author_id, post.group_id)
+    return widths
+
+
+def variant_srcset(post, extension):
+    """Значение атрибута srcset для вариантов картинки поста"""
+    if not post.variant_widths:
+        return ''
+    name = post.image.name
+    return ', '.join(
+        f'{post_image_storage.url(variant_name(name, width, extension))} '
+        f'{width}w'
+        for width in post.variant_widths.split(',')
+    )
@@ -0,0 +1,48 @@
+"""Обработка картинок средствами Pillow без обращений к Django.
+
+Функции отсюда выполняются в отдельных процессах ProcessPoolExecutor,
+поэтому модуль не импортирует ни настройки, ни модели."""
+import os
+import posixpath
+
+from PIL import Image, ImageOps
+
+# Ширины вариантов картинки для srcset; пропорции как у карточки 960x339
+VARIANT_WIDTHS = (320, 640, 960)
+CARD_RATIO = 339 / 960
+# Расширение файла варианта -> формат Pillow
+VARIANT_FORMATS = {'webp': 'WEBP', 'jpg': 'JPEG'}
+VARIANT_QUALITY = 80
+
+
+def variant_name(image_name, width, extension):
+    """posts/ab/cat.png -> variants/posts/ab/cat.png-640w.webp.
+
+    Имя повторяет весь путь исходника вместе с расширением: у cat.png
+    и cat.jpg или у одноимённых файлов из разных каталогов варианты
+    не совпадают и не удаляются вместе"""
+    return posixpath.join(
+        'variants', f'{image_name}-{width}w.{extension}')
+
+
+def render_variants(source_path, targets):
+    """Сохраняет варианты картинки source_path.
+
+    targets - словарь {(ширина, расширение): путь к файлу}. Варианты
+    шире исходной картинки не делаются (кроме самого узкого). Файлы
+    пишутся через временное имя, поэтому прерванная работа не оставляет
+    недописанных вариантов. Возвращает список готовых ширин."""
+    with Image.open(source_path) as source:
+        image = ImageOps.exif_transpose(source).convert('RGB')
+    widths = sorted({width for width, _ in targets})
+    widths = [width for width in widths if width <= image.width] or widths[:1]
+    for width in widths:
+        size = (width, round(width * CARD_RATIO))
+        resized = ImageOps.fit(image, size, Image.LANCZOS)
+        for extension, image_format in VARIANT_FORMATS.items():
+            path = targets[(width, extension)]
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp_path = f'{path}.{os.getpid()}.part'
+            resized.save(temp_path, image_format, quality=VARIANT_QUALITY)
+            os.replace(temp_path, path)
+    return widths
@@ -0,0 +1,73 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+
+from posts.caching import bump_feed_version
+from posts.image_variants import save_variant_widths, variant_job
+from posts.imaging import render_variants
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = ('Готовит WebP и JPEG варианты картинок постов для srcset. '
+            'Готовые посты отмечаются в базе, поэтому после прерывания '
+            'повторный запуск продолжает с места остановки')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes', type=int, default=os.cpu_count(),
+            help='число процессов Pillow')
+        parser.add_argument(
+            '--chunk-size', type=int, default=100,
+            help='сколько постов брать из базы за раз')
+        parser.add_argument(
+            '--force', action='store_true',
+            help='заново подготовить варианты всех картинок')
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='').exclude(image__isnull=True)
+        if options['force']:
+            # Отметки сбрасываются сразу, так что и прерванный
+            # --force можно продолжить запуском без него
+            posts.update(variant_widths='')
+        pending = posts.filter(variant_widths='').order_by('pk').values_list(
+            'pk', 'image', 'author_id', 'group_id')
+
+        done = failed = last_pk = 0
+        with ProcessPoolExecutor(max_workers=options['processes']) as pool:
+            while True:
+                chunk = list(
+                    pending.filter(pk__gt=last_pk)[:options['chunk_size']])
+                if not chunk:
+                    break
+                last_pk = chunk[-1][0]
+                jobs = {
+                    pool.submit(render_variants, *variant_job(row[1])): row
+                    for row in chunk
+                }
+                authors, groups = set(), set()
+                for job in as_completed(jobs):
+                    pk, image, author_id, group_id = jobs[job]
+                    try:
+                        widths = job.result()
+                    except Exception as error:
+                        failed += 1
+                        self.stderr.write(f'Пост {pk}, {image}: {error}')
+                        continue
+                    if save_variant_widths(pk, image, widths):
+                        done += 1
+                        authors.add(author_id)
+                        groups.add(group_id)
+                self.bump_feeds(authors, groups)
+        self.stdout.write(f'Готово постов: {done}, с ошибками: {failed}')
+
+    def bump_feeds(self, authors, groups):
+        if not authors:
+            return
+        bump_feed_version('pages')
+        bump_feed_version('index')
+        for author_id in authors:
+            bump_feed_version('profile', author_id)
+        for group_id in groups - {None}:
+            bump_feed_version('group', group_id)
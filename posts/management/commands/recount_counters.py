@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from posts.models import Comment, Follow, Group, Post, Profile, USER_MODEL
+
+
+def count_of(queryset, field, outer='pk'):
+    """Подзапрос с числом записей queryset, у которых field совпадает
+    с полем outer внешней записи"""
+    return Coalesce(Subquery(
+        queryset.filter(**{field: OuterRef(outer)})
+        .order_by().values(field).annotate(count=Count('pk'))
+        .values('count')
+    ), 0)
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает счётчики постов и подписок пользователей, '
+            'счётчики постов сообществ и комментариев постов')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            missing = USER_MODEL.objects.filter(profile__isnull=True)
+            # Размер пачки выбирает Django: для вставки одного поля
+            # SQLite ограничивает число SELECT в составном запросе
+            Profile.objects.bulk_create(
+                Profile(user_id=pk)
+                for pk in missing.values_list('pk', flat=True).iterator()
+            )
+            profiles = Profile.objects.update(
+                post_count=count_of(Post.objects.all(), 'author', 'user_id'),
+                follower_count=count_of(
+                    Follow.objects.all(), 'author', 'user_id'),
+                following_count=count_of(
+                    Follow.objects.all(), 'user', 'user_id'),
+            )
+            groups = Group.objects.update(
+                post_count=count_of(Post.objects.all(), 'group'))
+            posts = Post.objects.update(
+                comment_count=count_of(Comment.objects.all(), 'post'))
+        self.stdout.write(
+            f'Пересчитано: профилей {profiles}, сообществ {groups}, '
+            f'постов {posts}'
+        )
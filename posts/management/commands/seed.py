@@ -0,0 +1,280 @@
+"""Наполнение базы тестовыми данными для замеров.
+
+Пользователи, сообщества, посты, комментарии и подписки пишутся
+bulk_create пачками по --chunk-size объектов, каждая пачка в своей
+транзакции, без сигналов. Счётчики после загрузки пересчитываются
+командой recount_counters, поисковый индекс перестраивается целиком.
+
+Активность авторов распределена по закону Ципфа: автор с рангом r
+пишет пропорционально 1 / r ** --zipf. Доля --hot-share комментариев
+приходится на --hot-posts горячих постов. Одно и то же зерно --seed
+на одной и той же базе даёт одни и те же данные."""
+import io
+import itertools
+import random
+from array import array
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, reset_queries, transaction
+from PIL import Image, ImageDraw
+
+from posts.caching import bump_feed_version
+from posts.models import Comment, Follow, Group, Post, USER_MODEL
+from posts.search import drop_search_index, install_search_index
+from posts.storage import post_image_storage
+from posts.timeline import fan_out
+from yatube.routers import pin_primary
+
+WORDS = (
+    'кот', 'собака', 'утро', 'вечер', 'город', 'река', 'лес', 'море',
+    'дорога', 'книга', 'песня', 'погода', 'снег', 'дождь', 'солнце',
+    'работа', 'отпуск', 'друг', 'семья', 'чай', 'кофе', 'поезд', 'самолёт',
+    'музей', 'театр', 'кино', 'футбол', 'шахматы', 'код', 'сервер',
+    'база', 'запрос', 'ошибка', 'релиз', 'сегодня', 'вчера', 'завтра',
+    'очень', 'снова', 'наконец', 'опять', 'тихо', 'быстро', 'долго',
+    'новый', 'старый', 'большой', 'маленький', 'красивый', 'странный',
+    'читаю', 'пишу', 'гуляю', 'думаю', 'жду', 'смотрю', 'слушаю', 'еду',
+)
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def zipf_cum_weights(count, exponent):
+    """Накопленные веса рангов 1..count для random.choices"""
+    return list(itertools.accumulate(
+        1 / rank ** exponent for rank in range(1, count + 1)))
+
+
+@contextmanager
+def explicit_dates(*fields):
+    """auto_now_add подставляет текущее время и в bulk_create,
+    на время загрузки поля берут дату из самого объекта"""
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+class Command(BaseCommand):
+    help = ('Наполняет базу пользователями, сообществами, постами, '
+            'комментариями и подписками для замеров производительности')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument('--comments', type=int, default=30000)
+        parser.add_argument(
+            '--follows', type=int, default=0,
+            help='число подписок; ленты подписчиков тоже заполняются')
+        parser.add_argument(
+            '--images', type=int, default=0,
+            help='сколько разных картинок нарисовать для постов')
+        parser.add_argument(
+            '--image-share', type=float, default=0.2,
+            help='доля постов с картинкой, если --images больше нуля')
+        parser.add_argument(
+            '--group-share', type=float, default=0.7,
+            help='доля постов, опубликованных в сообществах')
+        parser.add_argument(
+            '--zipf', type=float, default=1.1,
+            help='показатель закона Ципфа для активности авторов, '
+                 '0 - все авторы пишут одинаково')
+        parser.add_argument(
+            '--hot-posts', type=int, default=10,
+            help='сколько постов собирают львиную долю комментариев')
+        parser.add_argument(
+            '--hot-share', type=float, default=0.5,
+            help='доля комментариев к горячим постам')
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help='за сколько дней до --until разбросаны посты')
+        parser.add_argument(
+            '--until', type=datetime.fromisoformat,
+            default=datetime(2024, 1, 1),
+            help='дата самого позднего поста, YYYY-MM-DD')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--password', default='password',
+            help='пароль всех созданных пользователей')
+        parser.add_argument(
+            '--chunk-size', type=int, default=10000,
+            help='сколько объектов записывать одной транзакцией')
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.rng = random.Random(options['seed'])
+        self.prefix = f'seed{options["seed"]}-'
+        if USER_MODEL.objects.filter(
+                username__startswith=self.prefix).exists():
+            raise CommandError(
+                f'Данные с зерном {options["seed"]} уже загружены')
+        if options['users'] < 1:
+            raise CommandError('Нужен хотя бы один пользователь')
+        until = options['until']
+        if until.tzinfo is None:
+            until = until.replace(tzinfo=timezone.utc)
+        self.until = until.timestamp()
+        # Прочитанные после записи id должны прийти из основной базы
+        pin_primary()
+
+        users = self.create_users()
+        groups = self.create_groups()
+        images = self.create_images()
+        drop_search_index(connection)
+        try:
+            posts, dates = self.create_posts(users, groups, images)
+        finally:
+            install_search_index(connection)
+        self.create_comments(users, posts, dates)
+        authors = self.create_follows(users)
+        call_command('recount_counters', stdout=self.stdout)
+        entries = sum(fan_out(author_id) for author_id in authors)
+        bump_feed_version('pages')
+        bump_feed_version('index')
+        self.stdout.write(f'Записей в лентах подписок: {entries}')
+
+    def insert(self, label, model, objects):
+        """Пишет объекты пачками, возвращает id новых записей
+        в порядке вставки"""
+        last_pk = model.objects.order_by('-pk').values_list(
+            'pk', flat=True).first() or 0
+        count = 0
+        for chunk in chunked(objects, self.options['chunk_size']):
+            with transaction.atomic():
+                model.objects.bulk_create(chunk)
+            count += len(chunk)
+            # С DEBUG = True Django запоминает текст каждого запроса
+            reset_queries()
+        self.stdout.write(f'{label}: {count}')
+        return array('q', model.objects.filter(pk__gt=last_pk).order_by(
+            'pk').values_list('pk', flat=True).iterator())
+
+    def create_users(self):
+        # Соль из зерна: хэш пароля тоже не меняется от запуска к запуску
+        password = make_password(
+            self.options['password'], salt=f'seed{self.options["seed"]}')
+        users = self.insert('Пользователей', USER_MODEL, (
+            USER_MODEL(username=f'{self.prefix}{i}', password=password,
+                       first_name=f'Автор {i}')
+            for i in range(self.options['users'])
+        ))
+        # Ранг автора в законе Ципфа не совпадает с порядком id
+        self.authors = list(users)
+        self.rng.shuffle(self.authors)
+        self.author_weights = zipf_cum_weights(
+            len(self.authors), self.options['zipf'])
+        return users
+
+    def create_groups(self):
+        return self.insert('Сообществ', Group, (
+            Group(title=f'Сообщество {i}', slug=f'{self.prefix}{i}',
+                  description=self.text(10, 30))
+            for i in range(self.options['groups'])
+        ))
+
+    def create_images(self):
+        names = []
+        for i in range(self.options['images']):
+            image = Image.new('RGB', (960, 640), self.color())
+            draw = ImageDraw.Draw(image)
+            for _ in range(12):
+                x, y = self.rng.randrange(960), self.rng.randrange(640)
+                radius = self.rng.randrange(20, 200)
+                draw.ellipse((x - radius, y - radius, x + radius, y + radius),
+                             fill=self.color())
+            content = io.BytesIO()
+            image.save(content, 'JPEG', quality=85)
+            names.append(post_image_storage.save(
+                f'posts/seed-{i}.jpg', ContentFile(content.getvalue())))
+        if names:
+            self.stdout.write(f'Картинок: {len(names)}')
+        return names
+
+    def create_posts(self, users, groups, images):
+        rng, options = self.rng, self.options
+        span = options['days'] * 24 * 60 * 60
+        # Посты вставляются по порядку дат, как при обычной публикации
+        dates = array('d', sorted(
+            self.until - rng.random() * span
+            for _ in range(options['posts'])))
+
+        def posts():
+            for date in dates:
+                group = (rng.choice(groups) if groups
+                         and rng.random() < options['group_share'] else None)
+                image = (rng.choice(images) if images
+                         and rng.random() < options['image_share'] else None)
+                yield Post(
+                    text=self.text(5, 60), author_id=self.author(),
+                    group_id=group, image=image,
+                    pub_date=datetime.fromtimestamp(date, timezone.utc))
+
+        with explicit_dates(Post._meta.get_field('pub_date')):
+            return self.insert('Постов', Post, posts()), dates
+
+    def create_comments(self, users, posts, dates):
+        rng, options = self.rng, self.options
+        if not posts:
+            return
+        hot = rng.sample(range(len(posts)), min(options['hot_posts'],
+                                                len(posts)))
+
+        def comments():
+            for _ in range(options['comments']):
+                if hot and rng.random() < options['hot_share']:
+                    index = rng.choice(hot)
+                else:
+                    index = rng.randrange(len(posts))
+                # Обсуждение затихает через несколько часов после поста
+                created = min(dates[index] + rng.expovariate(1 / 3600 / 6),
+                              self.until)
+                yield Comment(
+                    post_id=posts[index], author_id=rng.choice(users),
+                    text=self.text(2, 12)[:100],
+                    created=datetime.fromtimestamp(created, timezone.utc))
+
+        with explicit_dates(Comment._meta.get_field('created')):
+            self.insert('Комментариев', Comment, comments())
+
+    def create_follows(self, users):
+        """Подписки на авторов с теми же весами Ципфа: у активных
+        авторов больше подписчиков. Возвращает id авторов с подписчиками"""
+        rng = self.rng
+        wanted = min(self.options['follows'],
+                     len(users) * (len(users) - 1))
+        pairs = set()
+        while len(pairs) < wanted:
+            user, author = rng.choice(users), self.author()
+            if user != author:
+                pairs.add((user, author))
+        pairs = sorted(pairs)
+        self.insert('Подписок', Follow, (
+            Follow(user_id=user, author_id=author) for user, author in pairs))
+        return sorted({author for _, author in pairs})
+
+    def author(self):
+        return self.rng.choices(
+            self.authors, cum_weights=self.author_weights)[0]
+
+    def text(self, shortest, longest):
+        words = self.rng.choices(WORDS, k=self.rng.randint(shortest, longest))
+        return ' '.join(words).capitalize() + '.'
+
+    def color(self):
+        return tuple(self.rng.randrange(256) for _ in range(3))
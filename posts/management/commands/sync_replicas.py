@@ -0,0 +1,28 @@
+import sqlite3
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from yatube.routers import REPLICA_DATABASES
+
+
+class Command(BaseCommand):
+    help = ('Копирует основную базу SQLite в файлы реплик из '
+            'REPLICA_DATABASES, чтобы проверить чтение с реплик локально')
+
+    def handle(self, *args, **options):
+        source = connections[DEFAULT_DB_ALIAS]
+        if source.vendor != 'sqlite':
+            raise CommandError('Копирование поддерживается только для SQLite')
+        if not REPLICA_DATABASES:
+            raise CommandError('Реплики не настроены: задайте YATUBE_REPLICAS')
+        source.ensure_connection()
+        for alias in REPLICA_DATABASES:
+            connections[alias].close()
+            target = sqlite3.connect(connections[alias].settings_dict['NAME'])
+            try:
+                # Онлайн-копия: основная база может писаться в это время
+                source.connection.backup(target)
+            finally:
+                target.close()
+            self.stdout.write(f'{alias}: скопирована')
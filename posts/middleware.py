@@ -0,0 +1,84 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.urls import Resolver404, resolve
+from django.utils.cache import (get_cache_key, get_conditional_response,
+                                learn_cache_key)
+from django.utils.http import parse_http_date_safe
+
+from .caching import get_feed_version
+
+PAGE_CACHE_TIMEOUT = getattr(settings, 'PAGE_CACHE_TIMEOUT', 60 * 5)
+PAGE_CACHE_URL_NAMES = getattr(
+    settings, 'PAGE_CACHE_URL_NAMES',
+    ('index', 'group_posts', 'profile', 'post'))
+
+
+class AnonymousPageCacheMiddleware:
+    """Кэш целых страниц для неавторизованных читателей.
+
+    Ключ строится стандартными get_cache_key/learn_cache_key: путь,
+    строка запроса и заголовки из Vary ответа. В префикс ключа входит
+    версия 'pages', которую сигналы постов и комментариев увеличивают
+    при каждом изменении, поэтому устаревшие страницы просто перестают
+    находиться. Авторизованным пользователям страницы из кэша не отдаются
+    никогда. Заголовок X-Cache сообщает HIT, MISS или BYPASS. На условный
+    запрос, совпавший с ETag или Last-Modified страницы из кэша,
+    отвечает 304.
+
+    Должен стоять после AuthenticationMiddleware."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not self.is_cached_url(request):
+            return self.get_response(request)
+        if request.user.is_authenticated:
+            response = self.get_response(request)
+            response['X-Cache'] = 'BYPASS'
+            return response
+
+        key_prefix = self.key_prefix()
+        cache_key = get_cache_key(request, key_prefix, 'GET', cache=cache)
+        if cache_key is not None:
+            response = cache.get(cache_key)
+            if response is not None:
+                # Клиент с той же версией страницы получает 304
+                response = get_conditional_response(
+                    request, etag=response.get('ETag'),
+                    last_modified=parse_http_date_safe(
+                        response.get('Last-Modified', '')),
+                    response=response)
+                response['X-Cache'] = 'HIT'
+                return response
+
+        response = self.get_response(request)
+        if self.is_cacheable(request, response):
+            cache_key = learn_cache_key(
+                request, response, PAGE_CACHE_TIMEOUT, key_prefix, cache=cache)
+            cache.set(cache_key, response, PAGE_CACHE_TIMEOUT)
+        response['X-Cache'] = 'MISS'
+        return response
+
+    def key_prefix(self):
+        return f'pages:{get_feed_version("pages")}'
+
+    def is_cached_url(self, request):
+        if request.method not in ('GET', 'HEAD'):
+            return False
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return False
+        return match.view_name in PAGE_CACHE_URL_NAMES
+
+    def is_cacheable(self, request, response):
+        # Ответы с cookie (в том числе с CSRF-токеном) и приватные ответы
+        # относятся к конкретному посетителю и в общий кэш не попадают
+        return (
+            response.status_code == 200
+            and not response.streaming
+            and not response.cookies
+            and not request.META.get('CSRF_COOKIE_USED')
+            and 'private' not in response.get('Cache-Control', '')
+        )
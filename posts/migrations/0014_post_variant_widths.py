@@ -0,0 +1,18 @@
+# Generated by Django 2.2.6 on 2026-10-18 17:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_post_thumbnail'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='variant_widths',
+            field=models.CharField(blank=True, editable=False, max_length=50, verbose_name='Ширины вариантов картинки'),
+        ),
+    ]
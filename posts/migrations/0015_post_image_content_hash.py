@@ -0,0 +1,19 @@
+# Generated by Django 2.2.6 on 2026-10-18 17:34
+
+from django.db import migrations, models
+import posts.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_post_variant_widths'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(blank=True, db_index=True, null=True, storage=posts.storage.ContentHashStorage(), upload_to='posts/'),
+        ),
+    ]
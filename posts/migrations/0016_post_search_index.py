@@ -0,0 +1,59 @@
+from django.db import migrations
+
+# SQL индекса на момент миграции. Рабочий код в posts/search.py может
+# меняться, а миграция должна создавать ровно эту схему
+FTS_TABLE = 'posts_post_fts'
+
+CREATE_TABLE = f"""
+CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+    text, content='posts_post', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+)"""
+
+TRIGGERS = {
+    f'{FTS_TABLE}_insert': f"""
+        AFTER INSERT ON posts_post BEGIN
+            INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text);
+        END""",
+    f'{FTS_TABLE}_delete': f"""
+        AFTER DELETE ON posts_post BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text)
+            VALUES ('delete', old.id, old.text);
+        END""",
+    f'{FTS_TABLE}_update': f"""
+        AFTER UPDATE OF text ON posts_post BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text)
+            VALUES ('delete', old.id, old.text);
+            INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text);
+        END""",
+}
+
+REBUILD = f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"
+
+
+def create_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(CREATE_TABLE)
+    for name, body in TRIGGERS.items():
+        schema_editor.execute(f'CREATE TRIGGER IF NOT EXISTS {name} {body}')
+    schema_editor.execute(REBUILD)
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for name in TRIGGERS:
+        schema_editor.execute(f'DROP TRIGGER IF EXISTS {name}')
+    schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_post_image_content_hash'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
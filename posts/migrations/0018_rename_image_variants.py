@@ -0,0 +1,20 @@
+from django.db import migrations
+
+
+def reset_variants(apps, schema_editor):
+    # Варианты картинок теперь называются по полному пути исходника,
+    # старые файлы не находятся: команда build_image_variants
+    # подготовит их заново
+    Post = apps.get_model('posts', 'Post')
+    Post.objects.exclude(variant_widths='').update(variant_widths='')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0017_follow_timeline'),
+    ]
+
+    operations = [
+        migrations.RunPython(reset_variants, migrations.RunPython.noop),
+    ]
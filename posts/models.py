@@ -1,6 +1,8 @@
 from django.db import models
 from django.contrib.auth import get_user_model
 
+from .storage import post_image_storage
+
 USER_MODEL = get_user_model()
 
 
@@ -15,7 +17,9 @@ class Group(models.Model):
     description:
         описание сообщества
     slug :
-        уникальный адрес группы"""
+        уникальный адрес группы
+    post_count :
+        число постов сообщества, ведётся сигналами"""
 
     title = models.CharField(
         'Заголовок',
@@ -31,6 +35,8 @@ class Group(models.Model):
         unique=True,
         help_text='Укажите адрес для страницы группы'
     )
+    post_count = models.PositiveIntegerField(
+        'Количество записей', default=0, editable=False)
 
     class Meta:
         verbose_name = 'Сообщество'
@@ -43,6 +49,14 @@ class Group(models.Model):
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+
+    def for_feed(self):
+        """Посты вместе со всем, что выводит карточка поста:
+        автор и сообщество подтягиваются тем же запросом"""
+        return self.select_related('author', 'group')
+
+
 class Post(models.Model):
     """Создаем модель сообщества с названием Post
     со свойствами:
@@ -51,12 +65,19 @@ class Post(models.Model):
     ----------
     text:
         текст постов
+    comment_count:
+        число комментариев, ведётся сигналами
     pub_date:
         дата публикации постов
     author:
         автор поста
     group:
-        принадлежность поста к группе"""
+        принадлежность поста к группе
+    thumbnail:
+        имя файла готовой миниатюры картинки, заполняется в фоне
+    variant_widths:
+        ширины готовых вариантов картинки для srcset через запятую,
+        пусто - варианты ещё не готовы"""
 
     text = models.TextField(
         "Содержание",
@@ -71,7 +92,20 @@ class Post(models.Model):
         Group, on_delete=models.SET_NULL, blank=True, null=True,
         related_name="posts", verbose_name="Группа", help_text='Выбери группу'
     )
-    image = models.ImageField(upload_to='posts/', blank=True, null=True)
+    # Файлы называются по содержимому, одинаковые загрузки делят
+    # один файл; индекс нужен для подсчёта ссылок на файл
+    image = models.ImageField(
+        upload_to='posts/', blank=True, null=True, db_index=True,
+        storage=post_image_storage)
+    thumbnail = models.CharField(
+        'Миниатюра', max_length=255, blank=True, editable=False)
+    variant_widths = models.CharField(
+        'Ширины вариантов картинки', max_length=50, blank=True,
+        editable=False)
+    comment_count = models.PositiveIntegerField(
+        'Количество комментариев', default=0, editable=False)
+
+    objects = PostQuerySet.as_manager()
 
     def __str__(self):
         return self.text
@@ -79,6 +113,16 @@ class Post(models.Model):
     class Meta:
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        # Индексы под ленты: общую, сообщества и автора,
+        # все они отсортированы по дате публикации
+        indexes = [
+            models.Index(fields=['pub_date'], name='post_pub_date_idx'),
+            models.Index(
+                fields=['group', 'pub_date'], name='post_group_pub_date_idx'),
+            models.Index(
+                fields=['author', 'pub_date'],
+                name='post_author_pub_date_idx'),
+        ]
 
 
 class Comment(models.Model):
@@ -99,6 +143,107 @@ class Comment(models.Model):
 
     class Meta:
         ordering = ('-created',)
+        indexes = [
+            models.Index(
+                fields=['post', 'created'], name='comment_post_created_idx'),
+        ]
+
+    def __str__(self):
+        return self.text[0:15]
+
+
+class Profile(models.Model):
+    """Счётчики пользователя, которые иначе пришлось бы считать
+    запросом COUNT на каждой странице профайла.
+
+    Properties
+    ----------
+    user:
+        пользователь
+    post_count:
+        число постов пользователя, ведётся сигналами
+    follower_count:
+        число подписчиков, ведётся сигналами
+    following_count:
+        число авторов, на которых подписан пользователь"""
+
+    user = models.OneToOneField(
+        USER_MODEL, on_delete=models.CASCADE, related_name='profile')
+    post_count = models.PositiveIntegerField(
+        'Количество записей', default=0)
+    follower_count = models.PositiveIntegerField(
+        'Количество подписчиков', default=0)
+    following_count = models.PositiveIntegerField(
+        'Количество подписок', default=0)
+
+    class Meta:
+        verbose_name = 'Профиль'
+        verbose_name_plural = 'Профили'
+
+    def __str__(self):
+        return str(self.user)
+
+
+class Follow(models.Model):
+    """Подписка пользователя user на автора author"""
+
+    user = models.ForeignKey(
+        USER_MODEL, on_delete=models.CASCADE, related_name='follower',
+        verbose_name='Подписчик')
+    author = models.ForeignKey(
+        USER_MODEL, on_delete=models.CASCADE, related_name='following',
+        verbose_name='Автор')
+
+    class Meta:
+        verbose_name = 'Подписка'
+        verbose_name_plural = 'Подписки'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'author'], name='follow_unique'),
+        ]
 
     def __str__(self):
-        return self.text[0:15]
\ No newline at end of file
+        return f'{self.user} -> {self.author}'
+
+
+class TimelineEntry(models.Model):
+    """Строка ленты подписок: пост автора, на которого подписан user.
+
+    Строки раскладываются при публикации поста (fan-out on write),
+    поэтому лента читается одним проходом по индексу
+    (user, pub_date, post). pub_date - копия даты поста."""
+
+    user = models.ForeignKey(
+        USER_MODEL, on_delete=models.CASCADE, related_name='timeline')
+    post = models.ForeignKey(
+        Post, on_delete=models.CASCADE, related_name='timeline_entries')
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        verbose_name = 'Запись ленты подписок'
+        verbose_name_plural = 'Записи ленты подписок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'], name='timeline_entry_unique'),
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', 'pub_date', 'post'],
+                name='timeline_user_pub_date_idx'),
+        ]
+
+
+def profile_of(user):
+    """Профиль пользователя. У пользователя, созданного в обход
+    сигналов (loaddata, bulk_create), профиля нет: он создаётся
+    со счётчиками, подсчитанными по базе"""
+    try:
+        return user.profile
+    except Profile.DoesNotExist:
+        profile, _ = Profile.objects.get_or_create(user=user, defaults={
+            'post_count': Post.objects.filter(author=user).count(),
+            'follower_count': Follow.objects.filter(author=user).count(),
+            'following_count': Follow.objects.filter(user=user).count(),
+        })
+        user.profile = profile
+        return profile
@@ -0,0 +1,186 @@
+import base64
+import binascii
+
+from django.core.paginator import Page, Paginator
+from django.db.models import Max, Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+
+class CursorPaginator:
+    """Постраничный вывод по ключу (дата, id) без COUNT и OFFSET.
+
+    Записи упорядочены от новых к старым. Следующая страница задаётся
+    параметром ``?after=<курсор>``, предыдущая - ``?before=<курсор>``,
+    где курсор - закодированная пара значений ключа крайней записи.
+    Поэтому любая страница выбирается одним запросом по индексу,
+    сколько бы страниц ни было до неё. Старые ссылки ``?page=N``
+    обслуживаются обычным :class:`Paginator` и дают курсорные ссылки
+    на соседние страницы.
+
+    Возвращаемая страница - обычный :class:`Page`; ``number`` у неё
+    относительный (1 - первая страница, 2 - любая следующая), а ссылки
+    на соседние страницы лежат в ``page.next_link`` и
+    ``page.previous_link``.
+
+    Если число записей уже известно (например, из счётчика), его можно
+    передать в ``count``, и для ``?page=N`` не понадобится COUNT.
+
+    Подклассы без номеров страниц выставляют ``offset_pages = False``,
+    тогда ``?page=N`` просто игнорируется."""
+    offset_pages = True
+
+    def __init__(self, object_list, per_page, fields=('pub_date', 'id'),
+                 count=None):
+        self.object_list = object_list
+        self.per_page = per_page
+        self.fields = fields
+        self.count = count
+        self.num_pages = 1
+
+    def validate_number(self, number):
+        return number
+
+    @property
+    def ordering(self):
+        return tuple(f'-{field}' for field in self.fields)
+
+    def key(self, obj):
+        """Значения ключа (дата, id) записи"""
+        return tuple(getattr(obj, field) for field in self.fields)
+
+    def encode_cursor(self, obj):
+        date, pk = self.key(obj)
+        raw = f'{date.isoformat()}|{pk}'.encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def decode_cursor(self, token):
+        """Возвращает пару (дата, id) или None для битого курсора"""
+        if not token:
+            return None
+        try:
+            raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+            date, pk = raw.decode().split('|')
+            date = parse_datetime(date)
+            pk = int(pk)
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            return None
+        if date is None:
+            return None
+        return date, pk
+
+    def get_page(self, params):
+        """Возвращает страницу по параметрам запроса (``request.GET``)"""
+        after = self.decode_cursor(params.get('after'))
+        before = self.decode_cursor(params.get('before'))
+        if (self.offset_pages and after is None and before is None
+                and params.get('page')):
+            return self._offset_page(params)
+
+        # Одна лишняя запись показывает, есть ли что-то за краем страницы
+        objects = self.fetch(self.per_page + 1, after=after, before=before)
+        has_more = len(objects) > self.per_page
+        objects = objects[:self.per_page]
+        if before is not None:
+            objects.reverse()
+            has_previous, has_next = has_more, True
+        else:
+            has_previous, has_next = after is not None, has_more
+
+        number = 2 if has_previous else 1
+        self.num_pages = number + 1 if has_next else number
+        page = Page(objects, number, self)
+        self._set_links(page, params)
+        return page
+
+    def fetch(self, limit, after=None, before=None):
+        """Не больше limit записей за курсором after или перед before,
+        в порядке get_queryset"""
+        return list(self.get_queryset(after=after, before=before)[:limit])
+
+    def get_queryset(self, after=None, before=None):
+        """Запрос окна записей за курсором after или перед курсором before"""
+        date_field, pk_field = self.fields
+        queryset = self.object_list
+        if before is not None:
+            date, pk = before
+            # date >= X отдельным условием, чтобы база искала по индексу,
+            # а не перебирала все записи под условием OR
+            return queryset.filter(
+                Q(**{f'{date_field}__gte': date}),
+                Q(**{f'{date_field}__gt': date}) | Q(**{f'{pk_field}__gt': pk})
+            ).order_by(*self.fields)
+        if after is not None:
+            date, pk = after
+            queryset = queryset.filter(
+                Q(**{f'{date_field}__lte': date}),
+                Q(**{f'{date_field}__lt': date}) | Q(**{f'{pk_field}__lt': pk})
+            )
+        return queryset.order_by(*self.ordering)
+
+    def _offset_page(self, params):
+        paginator = Paginator(
+            self.object_list.order_by(*self.ordering), self.per_page)
+        if self.count is not None:
+            paginator.count = self.count
+        page = paginator.get_page(params.get('page'))
+        self._set_links(page, params)
+        return page
+
+    def _set_links(self, page, params):
+        page.next_link = page.previous_link = None
+        if not len(page):
+            return
+        if page.has_next():
+            page.next_link = self._link(
+                params, after=self.encode_cursor(page[len(page) - 1]))
+        if page.has_previous():
+            page.previous_link = self._link(
+                params, before=self.encode_cursor(page[0]))
+
+    def _link(self, params, **cursor):
+        query = params.copy()
+        for key in ('page', 'after', 'before'):
+            query.pop(key, None)
+        query.update(cursor)
+        return f'?{query.urlencode()}'
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator для больших таблиц, прежде всего для админки.
+
+    Записи считаются точно, только пока их не больше ``exact_limit``:
+    COUNT идёт по подзапросу с LIMIT и не обходит всю таблицу. Если
+    записей больше, число всей таблицы оценивается сверху по наибольшему
+    id - это один шаг по первичному ключу. Для отфильтрованного списка
+    такой оценки нет, и число остаётся ограниченным: ``exact_limit + 1``,
+    в подписи «10000+»."""
+    exact_limit = 10000
+    # Число оценено по наибольшему id или ограничено пределом
+    estimated = False
+    capped = False
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list.order_by()
+        exact = queryset[:self.exact_limit + 1].count()
+        if exact <= self.exact_limit:
+            return exact
+        if queryset.query.where:
+            # Наибольший id таблицы ничего не говорит о том,
+            # сколько записей прошло фильтр
+            self.capped = True
+            return exact
+        self.estimated = True
+        top = queryset.model._default_manager.aggregate(top=Max('pk'))['top']
+        return max(top or 0, exact)
+
+    @property
+    def count_label(self):
+        """Число записей для показа"""
+        count = self.count
+        if self.capped:
+            return f'{self.exact_limit}+'
+        if self.estimated:
+            return f'около {count}'
+        return str(count)
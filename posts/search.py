@@ -0,0 +1,166 @@
+"""Полнотекстовый поиск по постам на FTS5.
+
+Таблица posts_post_fts - внешний индекс по Post.text: сам текст в ней
+не хранится (content='posts_post'), а синхронизацию ведут триггеры SQLite,
+так что bulk_create, update() и правки в обход ORM тоже попадают
+в индекс. Результаты упорядочены по bm25 (меньше - лучше) и id."""
+import base64
+import binascii
+import re
+
+from .models import Post
+from .paginator import CursorPaginator
+
+FTS_TABLE = 'posts_post_fts'
+
+CREATE_TABLE = f"""
+CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+    text, content='posts_post', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+)"""
+
+TRIGGERS = {
+    f'{FTS_TABLE}_insert': f"""
+        AFTER INSERT ON posts_post BEGIN
+            INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text);
+        END""",
+    f'{FTS_TABLE}_delete': f"""
+        AFTER DELETE ON posts_post BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text)
+            VALUES ('delete', old.id, old.text);
+        END""",
+    f'{FTS_TABLE}_update': f"""
+        AFTER UPDATE OF text ON posts_post BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text)
+            VALUES ('delete', old.id, old.text);
+            INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text);
+        END""",
+}
+
+
+def install_search_index(connection):
+    """Создаёт индекс и недостающие триггеры.
+
+    SQLite-редактор схемы Django пересоздаёт таблицу при изменении
+    полей и теряет её триггеры, поэтому функция вызывается после
+    каждого migrate. Если триггеров не было, индекс перестраивается
+    целиком. Возвращает True, если что-то пришлось создать."""
+    if connection.vendor != 'sqlite':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger' "
+            "AND tbl_name = 'posts_post'")
+        existing = {name for name, in cursor.fetchall()}
+        missing = [name for name in TRIGGERS if name not in existing]
+        if not missing:
+            return False
+        cursor.execute(CREATE_TABLE)
+        for name in missing:
+            cursor.execute(f'CREATE TRIGGER {name} {TRIGGERS[name]}')
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    return True
+
+
+def drop_search_index(connection):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name in TRIGGERS:
+            cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+        cursor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+def fts_query(text):
+    """Запрос FTS5 из строки пользователя.
+
+    Каждое слово берётся в кавычки, чтобы операторы и спецсимволы FTS5
+    не ломали запрос, и ищется как префикс: «кот» найдёт и «котёнка».
+    Пустая строка - если слов нет."""
+    words = re.findall(r'\w+', text)
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def filter_matching(queryset, text):
+    """Посты из queryset, подходящие под поисковую строку, без оценки.
+
+    Подзапрос пишется в extra, а не через pk__in=RawSQL(...): Django
+    берёт RawSQL в скобки ещё раз, и IN ((SELECT ...)) сравнивает id
+    только с первой строкой подзапроса."""
+    return queryset.extra(
+        where=[f'posts_post.id IN (SELECT rowid FROM {FTS_TABLE} '
+               f'WHERE {FTS_TABLE} MATCH %s)'],
+        params=[fts_query(text)],
+    )
+
+
+def search_posts(text, queryset=None):
+    """Посты, подходящие под поисковую строку, с оценкой bm25 в rank.
+
+    Таблица индекса присоединяется к запросу, а не подставляется
+    подзапросом, чтобы bm25 считался тем же проходом по индексу."""
+    if queryset is None:
+        queryset = Post.objects.all()
+    query = fts_query(text)
+    if not query:
+        # Пустой результат, но с полем rank, как у настоящего
+        return queryset.extra(select={'rank': '0'}).none()
+    return queryset.extra(
+        select={'rank': f'bm25({FTS_TABLE})'},
+        tables=[FTS_TABLE],
+        where=[f'{FTS_TABLE}.rowid = posts_post.id',
+               f'{FTS_TABLE} MATCH %s'],
+        params=[query],
+    )
+
+
+class SearchPaginator(CursorPaginator):
+    """Курсорный вывод результатов поиска по ключу (rank, id).
+
+    В отличие от лент записи идут по возрастанию ключа: лучшая оценка
+    bm25 - наименьшая. Номеров страниц нет, ``?page=N`` игнорируется."""
+
+    offset_pages = False
+
+    def __init__(self, object_list, per_page):
+        super().__init__(object_list, per_page, fields=('rank', 'id'))
+
+    @property
+    def ordering(self):
+        return self.fields
+
+    def encode_cursor(self, obj):
+        # repr даёт кратчайшую запись float, которая читается обратно
+        # без потерь, иначе равенство rank на границе страниц не сработает
+        raw = f'{obj.rank!r}|{obj.pk}'.encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def decode_cursor(self, token):
+        if not token:
+            return None
+        try:
+            raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+            rank, pk = raw.decode().split('|')
+            return float(rank), int(pk)
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            return None
+
+    def get_queryset(self, after=None, before=None):
+        queryset = self.object_list
+        if before is not None:
+            return self.beyond(queryset, '<', *before).order_by(
+                '-rank', '-id')
+        if after is not None:
+            queryset = self.beyond(queryset, '>', *after)
+        return queryset.order_by(*self.ordering)
+
+    @staticmethod
+    def beyond(queryset, op, rank, pk):
+        """Записи, чей ключ (rank, id) больше или меньше курсора"""
+        bm25 = f'bm25({FTS_TABLE})'
+        return queryset.extra(
+            where=[f'({bm25} {op} %s OR '
+                   f'({bm25} = %s AND posts_post.id {op} %s))'],
+            params=[rank, rank, pk],
+        )
@@ -0,0 +1,150 @@
+from django.db import connections, transaction
+from django.db.models import F
+from django.db.models.signals import (post_delete, post_init, post_migrate,
+                                      post_save)
+from django.dispatch import receiver
+
+from .caching import bump_feed_version, bump_post_feeds
+from .events import publish_post
+from .models import Comment, Follow, Group, Post, Profile, USER_MODEL
+from .search import install_search_index
+from .storage import post_image_storage
+from .thumbnails import release_image
+from .timeline import drop_author, fan_out
+
+
+def change_post_count(author_id, delta):
+    return Profile.objects.filter(user_id=author_id).update(
+        post_count=F('post_count') + delta)
+
+
+def change_group_post_count(group_id, delta):
+    if group_id is not None:
+        Group.objects.filter(pk=group_id).update(
+            post_count=F('post_count') + delta)
+
+
+@receiver(post_save, sender=USER_MODEL)
+def create_profile(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        Profile.objects.get_or_create(user=instance)
+
+
+@receiver(post_init, sender=Post)
+def remember_group(sender, instance, **kwargs):
+    """Запоминает сообщество поста, чтобы при смене сообщества
+    перенести пост из одного счётчика в другой"""
+    instance._counted_group_id = instance.__dict__.get('group_id')
+
+
+@receiver(post_init, sender=Post)
+def remember_image(sender, instance, **kwargs):
+    """Запоминает картинку поста: заменённый файл освобождается"""
+    image = instance.__dict__.get('image')
+    instance._stored_image = getattr(image, 'name', image) or ''
+
+
+def release_image_on_commit(name):
+    if name:
+        transaction.on_commit(lambda: release_image(name))
+
+
+@receiver(post_save, sender=Post)
+def count_saved_post(sender, instance, created, raw, **kwargs):
+    if raw:
+        return
+    if created:
+        if not change_post_count(instance.author_id, 1):
+            # Профиль пользователя, созданного в обход сигналов
+            post_count = sender.objects.filter(
+                author_id=instance.author_id).count()
+            Profile.objects.get_or_create(
+                user_id=instance.author_id,
+                defaults={'post_count': post_count})
+        change_group_post_count(instance.group_id, 1)
+        fan_out(instance.author_id, instance.pk)
+        # Подписчики потока узнают о посте, только когда он уже виден
+        transaction.on_commit(lambda: publish_post(instance))
+    elif instance._counted_group_id != instance.group_id:
+        change_group_post_count(instance._counted_group_id, -1)
+        change_group_post_count(instance.group_id, 1)
+    bump_post_feeds(
+        instance.author_id, instance._counted_group_id, instance.group_id)
+    instance._counted_group_id = instance.group_id
+    image = instance.image.name or ''
+    if not created and instance._stored_image != image:
+        release_image_on_commit(instance._stored_image)
+    if image and (created or instance._stored_image != image):
+        # Пост записан: файл держит уже он, а не отметка загрузки
+        transaction.on_commit(
+            lambda: post_image_storage.release_claim(image))
+    instance._stored_image = image
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    change_post_count(instance.author_id, -1)
+    change_group_post_count(instance._counted_group_id, -1)
+    bump_post_feeds(instance.author_id, instance._counted_group_id)
+    release_image_on_commit(instance.image.name)
+
+
+def bump_comment_feeds(comment):
+    """Сбрасывает ленты поста: в карточке выводится число комментариев"""
+    if Comment.post.is_cached(comment):
+        post = comment.post
+        bump_post_feeds(post.author_id, post.group_id)
+        return
+    post = Post.objects.filter(pk=comment.post_id).values(
+        'author_id', 'group_id').first()
+    if post is not None:
+        bump_post_feeds(post['author_id'], post['group_id'])
+
+
+@receiver(post_save, sender=Comment)
+def count_saved_comment(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        Post.objects.filter(pk=instance.post_id).update(
+            comment_count=F('comment_count') + 1)
+        bump_comment_feeds(instance)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    Post.objects.filter(pk=instance.post_id).update(
+        comment_count=F('comment_count') - 1)
+    bump_comment_feeds(instance)
+
+
+def change_follow_counts(follow, delta):
+    Profile.objects.filter(user_id=follow.user_id).update(
+        following_count=F('following_count') + delta)
+    Profile.objects.filter(user_id=follow.author_id).update(
+        follower_count=F('follower_count') + delta)
+    # Счётчики выводятся в профилях обоих, в том числе закэшированных
+    # целиком, и входят в их валидаторы условных запросов
+    bump_feed_version('pages')
+    bump_feed_version('profile', follow.user_id)
+    bump_feed_version('profile', follow.author_id)
+
+
+@receiver(post_save, sender=Follow)
+def count_saved_follow(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        change_follow_counts(instance, 1)
+        fan_out(instance.author_id, user_id=instance.user_id)
+
+
+@receiver(post_delete, sender=Follow)
+def count_deleted_follow(sender, instance, **kwargs):
+    change_follow_counts(instance, -1)
+    drop_author(instance.user_id, instance.author_id)
+
+
+@receiver(post_migrate)
+def restore_search_index(sender, using, **kwargs):
+    """Возвращает триггеры поиска, если migrate пересоздал таблицу постов"""
+    connection = connections[using]
+    if (sender.name == 'posts'
+            and Post._meta.db_table in connection.introspection.table_names()):
+        install_search_index(connection)
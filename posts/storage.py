@@ -0,0 +1,104 @@
+import fcntl
+import hashlib
+import os
+import posixpath
+import time
+from contextlib import contextmanager, suppress
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils._os import safe_join
+from django.utils.deconstruct import deconstructible
+
+# Сколько секунд уже существующий файл, доставшийся новой загрузке,
+# не удаляется: пост с ним за это время успеет записаться в базу
+CLAIM_SECONDS = getattr(settings, 'POST_IMAGE_CLAIM_SECONDS', 60 * 60)
+
+
+@deconstructible
+class ContentHashStorage(FileSystemStorage):
+    """Хранилище, которое называет файлы по sha256 содержимого.
+
+    posts/cat.PNG -> posts/3f/3f9a...e1.png. Одинаковые загрузки получают
+    одно имя и делят один файл, а вместе с ним и миниатюры sorl, которые
+    привязаны к имени исходника. Удалять файл можно только когда на него
+    не ссылается ни один пост, см. posts.thumbnails.release_image.
+
+    Пост с повторной загрузкой ещё не записан, когда save() уже вернул
+    имя существующего файла. Поэтому save() отмечает такой файл
+    в claims/ под блокировкой, а release_image под той же блокировкой
+    не трогает отмеченные файлы. Отметка снимается, когда пост
+    записан, или устаревает через POST_IMAGE_CLAIM_SECONDS.
+
+    Блокировка и отметки лежат в POST_IMAGE_STATE_DIR, а не в MEDIA_ROOT,
+    чтобы /media/ их не раздавал."""
+
+    def get_hashed_name(self, name, content):
+        digest = hashlib.sha256()
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        for chunk in content.chunks():
+            digest.update(chunk)
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        digest = digest.hexdigest()
+        directory, filename = posixpath.split(name)
+        extension = posixpath.splitext(filename)[1].lower()
+        return posixpath.join(directory, digest[:2], digest + extension)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.get_hashed_name(name, content)
+        with self.lock():
+            if self.exists(name):
+                self.claim(name)
+                return name
+        # Параллельная загрузка того же файла может успеть раньше,
+        # тогда FileSystemStorage сохранит копию под свободным именем
+        return self._save(name, content)
+
+    @contextmanager
+    def lock(self):
+        """Блокировка между процессами: проверка «файл уже есть»
+        при сохранении не перемежается с удалением файла"""
+        os.makedirs(self.state_dir, exist_ok=True)
+        with open(os.path.join(self.state_dir, '.lock'), 'a') as file:
+            fcntl.flock(file, fcntl.LOCK_EX)
+            yield
+
+    @property
+    def state_dir(self):
+        return getattr(
+            settings, 'POST_IMAGE_STATE_DIR',
+            os.path.join(settings.BASE_DIR, 'media_state'),
+        )
+
+    def claim_path(self, name):
+        return safe_join(self.state_dir, 'claims', name)
+
+    def claim(self, name):
+        path = self.claim_path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'a'):
+            pass
+        os.utime(path)
+
+    def is_claimed(self, name):
+        """Файл недавно достался загрузке, чей пост может быть
+        ещё не записан"""
+        try:
+            claimed = os.path.getmtime(self.claim_path(name))
+        except FileNotFoundError:
+            return False
+        return time.time() - claimed < CLAIM_SECONDS
+
+    def release_claim(self, name):
+        with suppress(FileNotFoundError):
+            os.remove(self.claim_path(name))
+
+
+post_image_storage = ContentHashStorage()
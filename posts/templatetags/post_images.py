@@ -0,0 +1,41 @@
+from django import template
+
+from posts.image_variants import variant_srcset
+from posts.thumbnails import card_thumbnail_url
+from posts.thumbnails import resolve_thumbnails as resolve
+
+register = template.Library()
+
+# Атрибут sizes для вариантов картинки карточки
+IMAGE_SIZES = '(max-width: 960px) 100vw, 960px'
+
+
+@register.simple_tag
+def resolve_thumbnails(posts):
+    """Одним обращением находит миниатюры всех постов страницы.
+    Ставится перед циклом по постам внутри {% cache %}, чтобы при
+    попадании в кэш фрагмента не выполняться вовсе."""
+    resolve(posts)
+    return ''
+
+
+@register.simple_tag
+def post_image_url(post):
+    """Адрес картинки для карточки поста.
+
+    Готовая миниатюра берётся из Post.thumbnail, иначе из найденных
+    тегом resolve_thumbnails; при промахе - исходная картинка, пока
+    миниатюра готовится в фоне."""
+    return card_thumbnail_url(post)
+
+
+@register.simple_tag
+def post_image_srcset(post, extension):
+    """srcset из готовых вариантов картинки в формате extension"""
+    return variant_srcset(post, extension)
+
+
+@register.simple_tag
+def post_image_sizes():
+    """Карточка занимает всю ширину колонки, но не больше 960px"""
+    return IMAGE_SIZES
@@ -0,0 +1,163 @@
+from unittest import mock
+
+from django.contrib.admin import helpers
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Group, Post, USER_MODEL
+from posts.paginator import EstimatedCountPaginator
+
+
+class PostAdminTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.admin = USER_MODEL.objects.create_superuser(
+            'admin', 'admin@example.com', 'password')
+        cls.user = USER_MODEL.objects.create_user(username='kirill')
+        cls.old_group = Group.objects.create(
+            title='Старое', slug='old', description='Старое сообщество')
+        cls.new_group = Group.objects.create(
+            title='Новое', slug='new', description='Новое сообщество')
+        for i in range(6):
+            post = Post.objects.create(
+                text=f'Пост {i}', author=cls.user,
+                group=cls.old_group if i % 2 else None)
+            Comment.objects.create(post=post, author=cls.user, text='Ок')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.admin)
+        self.url = reverse('admin:posts_post_changelist')
+
+    def run_action(self, action, pks, **data):
+        return self.client.post(self.url, {
+            'action': action, 'index': 0,
+            helpers.ACTION_CHECKBOX_NAME: pks, **data,
+        }, follow=True)
+
+    def count_queries(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return [query['sql'] for query in context.captured_queries]
+
+    def test_changelist_queries_do_not_grow(self):
+        """Список постов не делает запросов на каждую строку"""
+        queries = self.count_queries()
+        for i in range(5):
+            Post.objects.create(
+                text=f'Ещё {i}', author=self.user, group=self.new_group)
+        self.assertEqual(len(self.count_queries()), len(queries))
+
+    def test_changelist_count_is_bounded(self):
+        """Число постов считается подзапросом с LIMIT, а не по всей таблице"""
+        counts = [sql for sql in self.count_queries() if 'COUNT(' in sql]
+        self.assertTrue(counts)
+        for sql in counts:
+            self.assertIn('LIMIT', sql)
+
+    def test_date_hierarchy(self):
+        """Навигация по датам доступна"""
+        response = self.client.get(self.url)
+        self.assertContains(response, 'xfull')
+
+    def test_delete_asks_for_confirmation(self):
+        """Удаление сначала показывает страницу подтверждения"""
+        pks = list(Post.objects.values_list('pk', flat=True)[:2])
+        response = self.client.post(self.url, {
+            'action': 'delete_in_batches', 'index': 0,
+            helpers.ACTION_CHECKBOX_NAME: pks,
+        })
+        self.assertTemplateUsed(
+            response, 'admin/posts/post/delete_in_batches.html')
+        self.assertEqual(response.context['count'], 2)
+        self.assertEqual(Post.objects.count(), 6)
+
+    @mock.patch('posts.admin.ACTION_BATCH_SIZE', 2)
+    def test_delete_in_batches(self):
+        """Подтверждённое удаление идёт порциями и обновляет счётчики"""
+        pks = list(Post.objects.values_list('pk', flat=True)[:5])
+        with mock.patch.object(
+            Post.objects, 'filter', wraps=Post.objects.filter
+        ) as post_filter:
+            self.client.post(self.url, {
+                'action': 'delete_in_batches', 'post': 'yes',
+                helpers.ACTION_CHECKBOX_NAME: pks,
+            })
+        batches = [call.kwargs['pk__in'] for call in post_filter.mock_calls
+                   if 'pk__in' in call.kwargs]
+        self.assertEqual([len(batch) for batch in batches], [2, 2, 1])
+        self.assertEqual(Post.objects.count(), 1)
+        self.assertEqual(Comment.objects.count(), 1)
+        self.user.profile.refresh_from_db()
+        self.assertEqual(self.user.profile.post_count, 1)
+
+    @mock.patch('posts.admin.ACTION_BATCH_SIZE', 2)
+    def test_move_to_group(self):
+        """Перенос в сообщество идёт порциями и правит счётчики"""
+        pks = list(Post.objects.values_list('pk', flat=True))
+        self.run_action('move_to_group', pks, group=self.new_group.pk)
+        self.assertEqual(
+            Post.objects.filter(group=self.new_group).count(), 6)
+        self.old_group.refresh_from_db()
+        self.new_group.refresh_from_db()
+        self.assertEqual(self.old_group.post_count, 0)
+        self.assertEqual(self.new_group.post_count, 6)
+
+    def test_move_out_of_groups(self):
+        """Пустое сообщество убирает посты из сообществ"""
+        pks = list(Post.objects.values_list('pk', flat=True))
+        self.run_action('move_to_group', pks, group='')
+        self.assertFalse(Post.objects.exclude(group=None).exists())
+        self.old_group.refresh_from_db()
+        self.assertEqual(self.old_group.post_count, 0)
+
+
+class EstimatedCountPaginatorTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        user = USER_MODEL.objects.create_user(username='count')
+        Post.objects.bulk_create(
+            Post(text=f'Пост {i}', author=user) for i in range(30))
+
+    def test_exact_below_limit(self):
+        """До предела число записей точное"""
+        paginator = EstimatedCountPaginator(Post.objects.all(), 10)
+        self.assertEqual(paginator.count, 30)
+
+    def test_estimate_above_limit(self):
+        """Сверх предела число оценивается по наибольшему id"""
+        paginator = EstimatedCountPaginator(Post.objects.all(), 10)
+        paginator.exact_limit = 10
+        top = Post.objects.order_by('-pk').values_list('pk', flat=True)[0]
+        with self.assertNumQueries(2):
+            self.assertEqual(paginator.count, top)
+        self.assertEqual(paginator.count_label, f'около {top}')
+
+    def test_filtered_list_is_capped(self):
+        """Для отфильтрованного списка наибольший id ничего не значит:
+        число ограничено пределом и подписано «10+»"""
+        paginator = EstimatedCountPaginator(
+            Post.objects.filter(text__startswith='Пост 1'), 5)
+        paginator.exact_limit = 5
+        with self.assertNumQueries(1):
+            self.assertEqual(paginator.count, 6)
+        self.assertEqual(paginator.count_label, '5+')
+
+    def test_changelist_shows_label(self):
+        """Список в админке подписывает число тем же способом"""
+        admin = USER_MODEL.objects.create_superuser(
+            'boss', 'boss@example.com', 'password')
+        client = Client()
+        client.force_login(admin)
+        with mock.patch.object(EstimatedCountPaginator, 'exact_limit', 5):
+            response = client.get(
+                reverse('admin:posts_post_changelist'),
+                {'pub_date__year': Post.objects.first().pub_date.year})
+        self.assertContains(response, '5+ Посты')
@@ -0,0 +1,74 @@
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Post, USER_MODEL
+from posts.views import COMMENTS_PER_PAGE
+
+
+class CommentPaginationTests(TestCase):
+    """Комментарии поста выводятся порциями по курсору"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = USER_MODEL.objects.create_user(username='vasya')
+        cls.post = Post.objects.create(text='Пост', author=cls.user)
+        for i in range(COMMENTS_PER_PAGE + 5):
+            Comment.objects.create(
+                post=cls.post, author=cls.user, text=f'Комментарий {i}')
+        cls.comments = list(
+            cls.post.comments.order_by('-created', '-id'))
+        cls.post_url = reverse('post', kwargs={
+            'username': cls.user.username, 'post_id': cls.post.id})
+        cls.fragment_url = reverse('post_comments', kwargs={
+            'username': cls.user.username, 'post_id': cls.post.id})
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def test_post_page_shows_first_comments_and_count(self):
+        """На странице поста первая порция комментариев и их число"""
+        response = self.client.get(self.post_url)
+        page = response.context['comments']
+        self.assertEqual(list(page), self.comments[:COMMENTS_PER_PAGE])
+        self.assertContains(
+            response, f'Комментариев: {len(self.comments)}')
+        self.assertContains(response, self.fragment_url + page.next_link)
+
+    def test_fragment_returns_next_batch(self):
+        """Фрагмент отдаёт HTML следующей порции без ссылки дальше"""
+        page = self.client.get(self.post_url).context['comments']
+        response = self.client.get(self.fragment_url + page.next_link)
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, 'include/comment_list.html')
+        self.assertEqual(
+            list(response.context['comments']),
+            self.comments[COMMENTS_PER_PAGE:])
+        self.assertNotContains(response, 'comments-more')
+        self.assertNotContains(response, '<html>')
+
+    def test_fragment_json(self):
+        """С Accept: application/json фрагмент отдаёт JSON"""
+        response = self.client.get(
+            self.fragment_url, HTTP_ACCEPT='application/json')
+        data = response.json()
+        self.assertEqual(data['count'], len(self.comments))
+        self.assertEqual(
+            [comment['id'] for comment in data['comments']],
+            [comment.id for comment in self.comments[:COMMENTS_PER_PAGE]])
+        self.assertEqual(data['comments'][0]['author'], self.user.username)
+
+        data = self.client.get(
+            data['next'], HTTP_ACCEPT='application/json').json()
+        self.assertEqual(
+            [comment['id'] for comment in data['comments']],
+            [comment.id for comment in self.comments[COMMENTS_PER_PAGE:]])
+        self.assertIsNone(data['next'])
+
+    def test_fragment_of_missing_post(self):
+        """Фрагмент для несуществующего поста - 404"""
+        url = reverse('post_comments', kwargs={
+            'username': self.user.username, 'post_id': self.post.id + 100})
+        self.assertEqual(self.client.get(url).status_code, 404)
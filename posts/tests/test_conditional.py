@@ -0,0 +1,106 @@
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post, USER_MODEL
+from posts.tests.utils import QueryBudgetMixin
+
+
+class ConditionalGetTests(QueryBudgetMixin, TestCase):
+    """Страницы лент и постов отвечают 304 на условный GET,
+    пока на них ничего не изменилось"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = USER_MODEL.objects.create_user(username='masha')
+        cls.reader = USER_MODEL.objects.create_user(username='petya')
+        cls.group = Group.objects.create(
+            title='Тестовый заголовок',
+            description='Описание',
+            slug='test-slug'
+        )
+        cls.post = Post.objects.create(
+            text='Тестовый текст', author=cls.user, group=cls.group)
+        cls.urls = {
+            'index': reverse('index'),
+            'group': reverse('group_posts', kwargs={'slug': cls.group.slug}),
+            'profile': reverse(
+                'profile', kwargs={'username': cls.user.username}),
+            'post': reverse('post', kwargs={
+                'username': cls.user.username, 'post_id': cls.post.id}),
+        }
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def revalidate(self, url, response):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_unchanged_pages_not_modified(self):
+        """Неизменившаяся страница - 304 без выборки постов: только
+        сессия, пользователь и поиск сообщества или автора"""
+        budgets = {'index': 2, 'group': 3, 'profile': 3, 'post': 3}
+        for name, url in self.urls.items():
+            with self.subTest(page=name):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertTrue(response.has_header('Last-Modified'))
+                with self.assertMaxQueries(budgets[name]):
+                    again = self.revalidate(url, response)
+                self.assertEqual(again.status_code, 304)
+
+    def test_if_modified_since(self):
+        """If-Modified-Since тоже даёт 304"""
+        response = self.client.get(self.urls['index'])
+        again = self.client.get(
+            self.urls['index'],
+            HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(again.status_code, 304)
+
+    def test_changes_invalidate_validators(self):
+        """Новый пост, комментарий и подписка меняют ETag страниц"""
+        changes = {
+            'index': lambda: Post.objects.create(
+                text='Новый', author=self.reader),
+            'group': lambda: Post.objects.create(
+                text='Новый', author=self.reader, group=self.group),
+            'profile': lambda: Follow.objects.create(
+                user=self.reader, author=self.user),
+            'post': lambda: Comment.objects.create(
+                post=self.post, author=self.reader, text='Комментарий'),
+        }
+        for name, change in changes.items():
+            with self.subTest(page=name):
+                url = self.urls[name]
+                response = self.client.get(url)
+                change()
+                again = self.revalidate(url, response)
+                self.assertEqual(again.status_code, 200)
+                self.assertNotEqual(again['ETag'], response['ETag'])
+
+    def test_validators_differ_between_users(self):
+        """Страницы разных пользователей не делят ETag"""
+        response = self.client.get(self.urls['index'])
+        guest = Client()
+        again = guest.get(
+            self.urls['index'], HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(again.status_code, 200)
+
+    def test_cached_page_not_modified(self):
+        """Страница из кэша страниц анонима тоже отвечает 304"""
+        guest = Client()
+        response = guest.get(self.urls['index'])
+        again = guest.get(
+            self.urls['index'], HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again['X-Cache'], 'HIT')
+
+    def test_missing_author_is_404(self):
+        """Условный запрос к странице несуществующего автора - 404"""
+        response = self.client.get(
+            reverse('profile', kwargs={'username': 'nobody'}),
+            HTTP_IF_NONE_MATCH='"abc"')
+        self.assertEqual(response.status_code, 404)
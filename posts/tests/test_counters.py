@@ -0,0 +1,106 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Group, Post, Profile, USER_MODEL
+
+
+class CountersTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = USER_MODEL.objects.create_user(username='sasha')
+        cls.group = Group.objects.create(
+            title='Тестовый заголовок',
+            description='Описание',
+            slug='test-slug'
+        )
+        cls.other_group = Group.objects.create(
+            title='Другая группа',
+            description='Описание',
+            slug='other-slug'
+        )
+
+    def counters(self):
+        self.group.refresh_from_db()
+        self.other_group.refresh_from_db()
+        return (
+            Profile.objects.get(user=self.user).post_count,
+            self.group.post_count,
+            self.other_group.post_count,
+        )
+
+    def test_post_counters(self):
+        """Счётчики постов следуют за созданием, переносом и удалением"""
+        post = Post.objects.create(
+            text='Текст', author=self.user, group=self.group)
+        self.assertEqual(self.counters(), (1, 1, 0))
+        post = Post.objects.get(pk=post.pk)
+        post.group = self.other_group
+        post.save()
+        self.assertEqual(self.counters(), (1, 0, 1))
+        post.delete()
+        self.assertEqual(self.counters(), (0, 0, 0))
+
+    def test_comment_counter(self):
+        """Счётчик комментариев следует за созданием и удалением"""
+        post = Post.objects.create(text='Текст', author=self.user)
+        comment = Comment.objects.create(
+            post=post, author=self.user, text='Комментарий')
+        Comment.objects.create(post=post, author=self.user, text='Ещё')
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 2)
+        comment.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 1)
+
+    def test_recount_command(self):
+        """Команда recount_counters исправляет разошедшиеся счётчики"""
+        post = Post.objects.create(
+            text='Текст', author=self.user, group=self.group)
+        Comment.objects.create(post=post, author=self.user, text='Текст')
+        Profile.objects.update(post_count=10)
+        Group.objects.update(post_count=10)
+        Post.objects.update(comment_count=10)
+        call_command('recount_counters', stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual(self.counters(), (1, 1, 0))
+        self.assertEqual(post.comment_count, 1)
+
+    def test_pages_without_count_queries(self):
+        """Страницы профайла и сообщества обходятся без COUNT"""
+        Post.objects.create(text='Текст', author=self.user, group=self.group)
+        urls = [
+            reverse('profile', kwargs={'username': self.user.username}),
+            reverse('profile', kwargs={'username': self.user.username})
+            + '?page=1',
+            reverse('group_posts', kwargs={'slug': self.group.slug}),
+            reverse('group_posts', kwargs={'slug': self.group.slug})
+            + '?page=1',
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as queries:
+                    response = Client().get(url)
+                self.assertEqual(response.status_code, 200)
+                for query in queries.captured_queries:
+                    self.assertNotIn('COUNT(', query['sql'].upper())
+
+    def test_user_without_profile(self):
+        """Страницы пользователя, созданного в обход сигналов,
+        открываются, а профиль создаётся с подсчитанными счётчиками"""
+        USER_MODEL.objects.bulk_create([USER_MODEL(username='loaded')])
+        user = USER_MODEL.objects.get(username='loaded')
+        Post.objects.bulk_create([Post(text='Текст', author=user)])
+        post = Post.objects.get(author=user)
+        response = Client().get(
+            reverse('profile', kwargs={'username': user.username}))
+        self.assertContains(response, 'Количество записей: 1')
+        response = Client().get(reverse('post', kwargs={
+            'username': user.username, 'post_id': post.pk}))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Profile.objects.get(user=user).post_count, 1)
@@ -0,0 +1,58 @@
+import os
+import shutil
+import socket
+import tempfile
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from posts.events import Broker
+
+
+class BrokerTests(SimpleTestCase):
+    """Рассылка событий внутри процесса и между процессами"""
+
+    def test_dispatch_to_matching_subscriptions(self):
+        """Событие получают только подписки, которые его принимают"""
+        broker = Broker()
+        everything = broker.subscribe()
+        odd = broker.subscribe(lambda event: event['id'] % 2)
+        for pk in (1, 2):
+            broker.publish({'id': pk})
+        self.assertEqual(everything.get(0)['id'], 1)
+        self.assertEqual(everything.get(0)['id'], 2)
+        self.assertEqual(odd.get(0)['id'], 1)
+        self.assertIsNone(odd.get(0))
+        odd.close()
+        broker.publish({'id': 3})
+        self.assertIsNone(odd.get(0))
+
+    def test_slow_subscription_overflows(self):
+        """Переполненная подписка помечается и перестаёт принимать события,
+        а публикация не ждёт"""
+        broker = Broker()
+        with mock.patch('posts.events.EVENTS_QUEUE_SIZE', 2):
+            subscription = broker.subscribe()
+        for pk in range(3):
+            broker.publish({'id': pk})
+        self.assertTrue(subscription.overflowed)
+        self.assertEqual(subscription.queue.qsize(), 2)
+
+    def test_events_cross_processes_over_socket(self):
+        """Событие доходит до подписчиков другого брокера через сокет,
+        сокеты остановленных брокеров удаляются"""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        listener, publisher = Broker(directory), Broker(directory)
+        subscription = listener.subscribe()
+        self.addCleanup(listener.stop)
+        # Сокет процесса, который завершился, не удалив его
+        stale = os.path.join(directory, '1-dead.sock')
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as dead:
+            dead.bind(stale)
+
+        publisher.publish({'id': 1, 'data': {'text': 'Пост'}})
+        self.assertEqual(
+            subscription.get(timeout=5), {'id': 1, 'data': {'text': 'Пост'}})
+        self.assertFalse(publisher.socket_path)
+        self.assertFalse(os.path.exists(stale))
@@ -0,0 +1,175 @@
+import unittest
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Follow, Post, Profile, TimelineEntry, USER_MODEL
+from posts.timeline import TimelinePaginator
+
+
+class FollowTests(TestCase):
+    """Подписки, счётчики подписок и лента /follow/"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = USER_MODEL.objects.create_user(username='reader')
+        cls.author = USER_MODEL.objects.create_user(username='author')
+        cls.other = USER_MODEL.objects.create_user(username='other')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def follow(self, author):
+        return self.client.post(
+            reverse('profile_follow', kwargs={'username': author.username}))
+
+    def unfollow(self, author):
+        return self.client.post(
+            reverse('profile_unfollow', kwargs={'username': author.username}))
+
+    def feed(self, **params):
+        response = self.client.get(reverse('follow_index'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.context['page']
+
+    def test_follow_and_unfollow(self):
+        """Подписка и отписка меняют Follow и счётчики профилей"""
+        response = self.follow(self.author)
+        self.assertRedirects(
+            response,
+            reverse('profile', kwargs={'username': self.author.username}))
+        self.follow(self.author)
+        self.assertEqual(Follow.objects.filter(
+            user=self.reader, author=self.author).count(), 1)
+        self.assertEqual(Profile.objects.get(
+            user=self.author).follower_count, 1)
+        self.assertEqual(Profile.objects.get(
+            user=self.reader).following_count, 1)
+
+        self.unfollow(self.author)
+        self.assertFalse(Follow.objects.exists())
+        self.assertEqual(Profile.objects.get(
+            user=self.author).follower_count, 0)
+        self.assertEqual(Profile.objects.get(
+            user=self.reader).following_count, 0)
+
+    def test_cannot_follow_self(self):
+        """На себя подписаться нельзя"""
+        self.follow(self.reader)
+        self.assertFalse(Follow.objects.exists())
+
+    def test_follow_requires_post(self):
+        """GET-запрос (ссылка, предзагрузка) подписку не меняет"""
+        for name in ('profile_follow', 'profile_unfollow'):
+            with self.subTest(name=name):
+                response = self.client.get(
+                    reverse(name, kwargs={'username': self.author.username}))
+                self.assertEqual(response.status_code, 405)
+        self.assertFalse(Follow.objects.exists())
+
+    def test_profile_shows_counters_and_button(self):
+        """Профиль показывает счётчики подписок и кнопку подписки"""
+        url = reverse('profile', kwargs={'username': self.author.username})
+        response = self.client.get(url)
+        self.assertFalse(response.context['following'])
+        self.assertContains(response, 'Подписаться')
+        self.assertContains(response, 'csrfmiddlewaretoken')
+        self.follow(self.author)
+        response = self.client.get(url)
+        self.assertTrue(response.context['following'])
+        self.assertContains(response, 'Подписчиков: 1')
+        self.assertContains(response, 'Отписаться')
+
+    def test_new_post_is_fanned_out(self):
+        """Новый пост автора попадает только в ленты его подписчиков"""
+        self.follow(self.author)
+        post = Post.objects.create(text='Новый пост', author=self.author)
+        Post.objects.create(text='Чужой пост', author=self.other)
+        self.assertEqual(list(self.feed()), [post])
+        self.assertEqual(TimelineEntry.objects.count(), 1)
+
+    def test_follow_backfills_and_unfollow_cleans_timeline(self):
+        """При подписке в ленту попадают прошлые посты автора,
+        при отписке они из неё убираются"""
+        posts = [Post.objects.create(text=f'Пост {i}', author=self.author)
+                 for i in range(3)]
+        self.follow(self.author)
+        self.assertEqual(list(self.feed()), posts[::-1])
+        self.unfollow(self.author)
+        self.assertEqual(list(self.feed()), [])
+        self.assertFalse(TimelineEntry.objects.exists())
+
+    def test_feed_pages_by_cursor(self):
+        """Лента листается курсором в обе стороны"""
+        self.follow(self.author)
+        posts = [Post.objects.create(text=f'Пост {i}', author=self.author)
+                 for i in range(15)]
+        first = self.feed()
+        self.assertEqual(list(first), posts[:4:-1])
+        second = self.feed(after=first.next_link.split('=', 1)[1])
+        self.assertEqual(list(second), posts[4::-1])
+        back = self.feed(before=second.previous_link.split('=', 1)[1])
+        self.assertEqual(list(back), list(first))
+
+    def test_celebrity_posts_are_read_on_demand(self):
+        """Посты знаменитости не раскладываются, а подмешиваются
+        в ленту при чтении по порядку дат"""
+        self.follow(self.other)
+        with mock.patch('posts.timeline.CELEBRITY_FOLLOWERS', 1):
+            self.follow(self.author)
+            posts = [
+                Post.objects.create(text='Обычный', author=self.other),
+                Post.objects.create(text='Знаменитость', author=self.author),
+                Post.objects.create(text='Обычный 2', author=self.other),
+            ]
+            self.assertFalse(TimelineEntry.objects.filter(
+                post__author=self.author).exists())
+            self.assertEqual(list(self.feed()), posts[::-1])
+
+    def test_author_below_threshold_is_fanned_out(self):
+        """Автор, который перестал быть знаменитостью, снова
+        раскладывается по лентам подписчиков"""
+        with mock.patch('posts.timeline.CELEBRITY_FOLLOWERS', 2):
+            Follow.objects.create(user=self.other, author=self.author)
+            self.follow(self.author)
+            post = Post.objects.create(text='Пост', author=self.author)
+            self.assertFalse(TimelineEntry.objects.exists())
+            Follow.objects.filter(user=self.other).delete()
+        self.assertEqual(list(self.feed()), [post])
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader, post=post).exists())
+
+    def test_follow_pages_require_login(self):
+        """Подписки доступны только авторизованному пользователю"""
+        guest = Client()
+        for url in (reverse('follow_index'),
+                    reverse('profile_follow',
+                            kwargs={'username': self.author.username})):
+            with self.subTest(url=url):
+                response = guest.get(url)
+                self.assertRedirects(
+                    response, f"{reverse('login')}?next={url}")
+        self.assertFalse(Follow.objects.exists())
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN')
+class TimelineQueryPlanTests(TestCase):
+    """Лента подписок читается проходом по индексу ленты"""
+
+    def test_timeline_uses_index(self):
+        user = USER_MODEL.objects.create_user(username='reader')
+        paginator = TimelinePaginator(user, 10)
+        sql, params = paginator.entries.get_queryset().query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            plan = [row[-1] for row in cursor.fetchall()]
+        self.assertTrue(any(
+            'timeline_user_pub_date_idx' in step for step in plan), plan)
+        for step in plan:
+            self.assertNotIn('TEMP B-TREE', step, plan)
@@ -1,6 +1,7 @@
 from django.test import Client, TestCase
 from django.urls import reverse
 
+import hashlib
 import shutil
 import tempfile
 from django.conf import settings
@@ -125,12 +126,14 @@ class PostFormTests(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertIsNotNone(Post.objects.first().image)
         self.assertEqual(response.status_code, 200)
+        # Файл называется по sha256 содержимого
+        digest = hashlib.sha256(small_gif).hexdigest()
         self.assertTrue(
             Post.objects.filter(
                 author=PostFormTests.author,
                 text='test_text',
                 group=PostFormTests.group.id,
-                image='posts/small.gif'
+                image=f'posts/{digest[:2]}/{digest}.gif'
             ).exists(),
         )
         
\ No newline at end of file
@@ -0,0 +1,119 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from posts.image_variants import make_variants
+from posts.imaging import VARIANT_WIDTHS, variant_name
+from posts.models import Post, USER_MODEL
+from posts.tests.test_thumbnails import make_image
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def tearDownModule():
+    shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+@mock.patch('posts.image_variants.VARIANT_PROCESSES', 0)
+class ImageVariantTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = USER_MODEL.objects.create_user(username='lena')
+        self.post = Post.objects.create(
+            text='Пост с картинкой', author=self.user,
+            image=make_image(size=(700, 300)))
+
+    def test_variants_are_rendered(self):
+        """Варианты не шире исходной картинки готовятся в WebP и JPEG"""
+        widths = make_variants(self.post.pk, self.post.image.name)
+        self.assertEqual(widths, [320, 640])
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.variant_widths, '320,640')
+        for width in widths:
+            for extension, image_format in (('webp', 'WEBP'),
+                                            ('jpg', 'JPEG')):
+                name = variant_name(self.post.image.name, width, extension)
+                path = os.path.join(TEMP_MEDIA_ROOT, name)
+                with Image.open(path) as image:
+                    self.assertEqual(image.format, image_format)
+                    self.assertEqual(image.width, width)
+
+    def test_small_image_gets_narrowest_variant(self):
+        """Картинка уже самого узкого варианта получает только его"""
+        post = Post.objects.create(
+            text='Маленькая', author=self.user, image=make_image('small.png'))
+        self.assertEqual(
+            make_variants(post.pk, post.image.name), [VARIANT_WIDTHS[0]])
+
+    def test_replaced_image_is_skipped(self):
+        """Варианты заменённой картинки не готовятся"""
+        self.assertIsNone(make_variants(self.post.pk, 'posts/old.png'))
+
+    def test_variant_names_do_not_collide(self):
+        """У исходников с одной основой имени варианты разные"""
+        names = ['posts/aa/cat.png', 'posts/aa/cat.jpg', 'posts/bb/cat.png']
+        variants = {variant_name(name, 640, 'webp') for name in names}
+        self.assertEqual(len(variants), len(names))
+
+    def test_srcset_in_feed(self):
+        """Лента выводит srcset и sizes для готовых вариантов"""
+        response = Client().get(reverse('index'))
+        self.assertNotContains(response, 'srcset')
+        make_variants(self.post.pk, self.post.image.name)
+        response = Client().get(reverse('index'))
+        webp = variant_name(self.post.image.name, 640, 'webp')
+        self.assertContains(response, f'{settings.MEDIA_URL}{webp} 640w')
+        self.assertContains(response, 'type="image/webp"')
+        self.assertContains(response, 'sizes="(max-width: 960px)')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class BuildImageVariantsCommandTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        user = USER_MODEL.objects.create_user(username='oleg')
+        self.posts = [
+            Post.objects.create(
+                text=f'Пост {i}', author=user,
+                image=make_image(f'backfill{i}.png', size=(400 + i, 200)))
+            for i in range(3)
+        ]
+        Post.objects.create(text='Без картинки', author=user)
+
+    def run_command(self, *args):
+        out = StringIO()
+        call_command(
+            'build_image_variants', '--processes=2', '--chunk-size=2',
+            *args, stdout=out, stderr=StringIO())
+        return out.getvalue()
+
+    def test_backfill_all_posts_with_images(self):
+        """Команда готовит варианты всех постов с картинками"""
+        self.assertIn('Готово постов: 3', self.run_command())
+        for post in self.posts:
+            post.refresh_from_db()
+            self.assertEqual(post.variant_widths, '320')
+
+    def test_resume_skips_finished_posts(self):
+        """Повторный запуск берёт только необработанные посты"""
+        Post.objects.filter(pk=self.posts[0].pk).update(variant_widths='320')
+        self.assertIn('Готово постов: 2', self.run_command())
+        self.assertIn('Готово постов: 0', self.run_command())
+        self.assertIn('Готово постов: 3', self.run_command('--force'))
+
+    def test_missing_file_is_reported(self):
+        """Пост с пропавшим файлом остаётся необработанным"""
+        os.remove(self.posts[1].image.path)
+        self.assertIn('с ошибками: 1', self.run_command())
+        self.posts[1].refresh_from_db()
+        self.assertEqual(self.posts[1].variant_widths, '')
@@ -0,0 +1,159 @@
+import os
+import shutil
+import tempfile
+from unittest import mock
+from wsgiref.util import FileWrapper
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.test import (Client, RequestFactory, TestCase,
+                         override_settings)
+from django.urls import reverse
+
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+CONTENT = bytes(range(100))
+
+
+def tearDownModule():
+    shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class MediaServeTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        os.makedirs(os.path.join(TEMP_MEDIA_ROOT, 'posts'), exist_ok=True)
+        with open(os.path.join(TEMP_MEDIA_ROOT, 'posts', 'a.png'), 'wb') as f:
+            f.write(CONTENT)
+        cls.url = reverse('media', kwargs={'path': 'posts/a.png'})
+
+    def setUp(self):
+        self.client = Client()
+
+    def get(self, **headers):
+        return self.client.get(self.url, **headers)
+
+    def test_full_file(self):
+        """Файл отдаётся целиком через объект файла для sendfile"""
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), CONTENT)
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertEqual(response['Content-Length'], '100')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertTrue(response['ETag'].startswith('"'))
+        self.assertIn('Last-Modified', response)
+
+    def wsgi_get(self, **headers):
+        """Запрос через WSGIHandler с wsgi.file_wrapper, как у сервера:
+        (статус, заголовки, тело, был ли передан файл)"""
+        wrapped = []
+
+        def file_wrapper(file, block_size=8192):
+            wrapped.append(file)
+            return FileWrapper(file, block_size)
+
+        environ = RequestFactory().get(self.url, **headers).environ
+        environ['wsgi.file_wrapper'] = file_wrapper
+        started = []
+        body = WSGIHandler()(
+            environ, lambda status, headers: started.extend((status, headers)))
+        try:
+            content = b''.join(body)
+        finally:
+            body.close()
+        status, headers = started
+        return status, dict(headers), content, bool(wrapped)
+
+    def test_file_handed_to_file_wrapper(self):
+        """Весь файл сервер получает объектом файла для sendfile,
+        диапазон - ограниченным итератором: FileWrapper прочитал бы
+        файл до конца"""
+        status, headers, content, wrapped = self.wsgi_get()
+        self.assertEqual(status, '200 OK')
+        self.assertEqual(content, CONTENT)
+        self.assertTrue(wrapped)
+
+        status, headers, content, wrapped = self.wsgi_get(
+            HTTP_RANGE='bytes=10-19')
+        self.assertEqual(status, '206 Partial Content')
+        self.assertEqual(headers['Content-Length'], '10')
+        self.assertEqual(content, CONTENT[10:20])
+        self.assertFalse(wrapped)
+
+    def test_conditional_get(self):
+        """Совпавший ETag или неизменённая дата дают 304"""
+        first = self.get()
+        for headers in ({'HTTP_IF_NONE_MATCH': first['ETag']},
+                        {'HTTP_IF_MODIFIED_SINCE': first['Last-Modified']}):
+            with self.subTest(headers=headers):
+                response = self.get(**headers)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response['ETag'], first['ETag'])
+        response = self.get(HTTP_IF_NONE_MATCH='"other"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_ranges(self):
+        """Запросы диапазона отдают только нужные байты"""
+        cases = {
+            'bytes=10-19': (CONTENT[10:20], 'bytes 10-19/100'),
+            'bytes=90-': (CONTENT[90:], 'bytes 90-99/100'),
+            'bytes=-5': (CONTENT[-5:], 'bytes 95-99/100'),
+            'bytes=95-500': (CONTENT[95:], 'bytes 95-99/100'),
+        }
+        for header, (content, content_range) in cases.items():
+            with self.subTest(range=header):
+                response = self.get(HTTP_RANGE=header)
+                self.assertEqual(response.status_code, 206)
+                self.assertEqual(
+                    b''.join(response.streaming_content), content)
+                self.assertEqual(response['Content-Range'], content_range)
+                self.assertEqual(
+                    response['Content-Length'], str(len(content)))
+
+    def test_unsatisfiable_range(self):
+        """Диапазон за концом файла даёт 416"""
+        response = self.get(HTTP_RANGE='bytes=200-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */100')
+
+    def test_if_range(self):
+        """При несовпавшем If-Range файл отдаётся целиком"""
+        etag = self.get()['ETag']
+        response = self.get(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=etag)
+        self.assertEqual(response.status_code, 206)
+        response = self.get(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"old"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_not_found(self):
+        """Несуществующий файл, каталог и выход из MEDIA_ROOT дают 404"""
+        for path in ('posts/missing.png', 'posts', '../yatube/settings.py'):
+            with self.subTest(path=path):
+                response = self.client.get(
+                    reverse('media', kwargs={'path': path}))
+                self.assertEqual(response.status_code, 404)
+
+    def test_only_safe_methods(self):
+        """Файлы доступны только на чтение"""
+        self.assertEqual(self.client.post(self.url).status_code, 405)
+
+    @mock.patch('yatube.media.MEDIA_SENDFILE', 'x-accel-redirect')
+    def test_x_accel_redirect(self):
+        """В режиме nginx тело отправляет прокси"""
+        response = self.get()
+        self.assertEqual(
+            response['X-Accel-Redirect'], '/protected-media/posts/a.png')
+        self.assertEqual(response.content, b'')
+        self.assertIn('ETag', response)
+        response = self.get(HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    @mock.patch('yatube.media.MEDIA_SENDFILE', 'x-sendfile')
+    def test_x_sendfile(self):
+        """В режиме X-Sendfile прокси получает полный путь к файлу"""
+        response = self.get()
+        self.assertEqual(
+            response['X-Sendfile'],
+            os.path.join(TEMP_MEDIA_ROOT, 'posts', 'a.png'))
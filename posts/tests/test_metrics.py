@@ -0,0 +1,159 @@
+import json
+import os
+import tempfile
+import threading
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Post, USER_MODEL
+from yatube import metrics
+
+
+def counter(counters, name, **labels):
+    return counters.get((name, tuple(labels.items())), 0)
+
+
+class MetricsTests(TestCase):
+    """Метрики запросов и страница /metrics"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = USER_MODEL.objects.create_user(username='lena')
+        cls.admin = USER_MODEL.objects.create_user(
+            username='admin', is_staff=True)
+        Post.objects.create(text='Пост', author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def test_request_metrics(self):
+        """Запросы, SQL, шаблоны и кэш записываются по имени адреса"""
+        before = metrics.snapshot()[0]
+        self.client.get(reverse('index'))
+        self.client.get(reverse('index'))
+        counters, histograms = metrics.snapshot()
+
+        def grew(name, **labels):
+            return (counter(counters, name, **labels)
+                    - counter(before, name, **labels))
+
+        self.assertEqual(grew('yatube_http_requests_total', view='index',
+                              method='GET', status='200'), 2)
+        self.assertGreater(grew('yatube_db_queries_total', view='index'), 0)
+        self.assertGreater(
+            grew('yatube_template_render_seconds_total', view='index'), 0)
+        self.assertEqual(grew('yatube_page_cache_total', view='index',
+                              result='miss'), 1)
+        self.assertEqual(grew('yatube_page_cache_total', view='index',
+                              result='hit'), 1)
+        self.assertGreater(
+            grew('yatube_cache_gets_total', view='index', result='hit'), 0)
+        latency = histograms[('yatube_http_request_duration_seconds',
+                              (('view', 'index'), ('method', 'GET')))]
+        self.assertGreaterEqual(sum(latency[:-1]), 2)
+        self.assertIn(('yatube_http_response_size_bytes',
+                       (('view', 'index'),)), histograms)
+
+    def test_threads_are_summed(self):
+        """Каждый поток пишет в своё хранилище, сводка складывает все"""
+        before = metrics.snapshot()[0]
+        thread = threading.Thread(
+            target=Client().get, args=(reverse('about:tech'),))
+        thread.start()
+        thread.join()
+        self.client.get(reverse('about:tech'))
+        labels = {'view': 'about:tech', 'method': 'GET', 'status': '200'}
+        self.assertEqual(
+            counter(metrics.snapshot()[0], 'yatube_http_requests_total',
+                    **labels)
+            - counter(before, 'yatube_http_requests_total', **labels), 2)
+
+    def test_metrics_page_is_for_staff(self):
+        """Страница метрик видна сотрудникам и сборщику с токеном"""
+        url = reverse('metrics')
+        response = self.client.get(url)
+        self.assertRedirects(
+            response, f"{reverse('admin:login')}?next={url}")
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+        self.client.force_login(self.admin)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'],
+                         'text/plain; version=0.0.4')
+        self.assertContains(
+            response, '# TYPE yatube_http_request_duration_seconds histogram')
+
+        with mock.patch('yatube.metrics.METRICS_TOKEN', 'secret'):
+            self.assertEqual(Client().get(
+                url, HTTP_AUTHORIZATION='Bearer secret').status_code, 200)
+            self.assertEqual(Client().get(
+                url, HTTP_AUTHORIZATION='Bearer wrong').status_code, 302)
+
+    def test_processes_are_merged(self):
+        """Сводки процессов из общего каталога складываются"""
+        labels = [['view', 'index'], ['method', 'GET'], ['status', '200']]
+        with tempfile.TemporaryDirectory() as directory, \
+                mock.patch('yatube.metrics.METRICS_DIR', directory):
+            own = counter(metrics.snapshot()[0],
+                          'yatube_http_requests_total', **dict(labels))
+            with open(os.path.join(directory, '1.json'), 'w') as file:
+                json.dump({
+                    'counters': [['yatube_http_requests_total', labels, 5]],
+                    'histograms': [],
+                }, file)
+            counters = metrics.collect()[0]
+            self.assertTrue(os.path.exists(
+                os.path.join(directory, metrics._file_name)))
+        self.assertEqual(
+            counter(counters, 'yatube_http_requests_total', **dict(labels)),
+            own + 5)
+
+    def test_same_pid_gets_own_file(self):
+        """Новый процесс с pid завершившегося не затирает его сводку"""
+        with tempfile.TemporaryDirectory() as directory, \
+                mock.patch('yatube.metrics.METRICS_DIR', directory), \
+                mock.patch('yatube.metrics._file_name'), \
+                mock.patch('yatube.metrics.os.getpid', return_value=1):
+            metrics._after_fork()
+            metrics.flush()
+            # Следующий воркер получил тот же pid
+            metrics._after_fork()
+            metrics.flush()
+            names = os.listdir(directory)
+        self.assertEqual(len(names), 2)
+        for name in names:
+            self.assertRegex(name, r'^1-[0-9a-f]{32}\.json$')
+
+
+class RenderTests(TestCase):
+    def test_text_format(self):
+        """Корзины гистограммы накопительные, значения меток
+        экранируются"""
+        store = metrics.Store()
+        labels = (('view', 'say "hi"'),)
+        store.inc('yatube_db_queries_total', labels, 3)
+        for seconds in (0.001, 0.02, 20):
+            store.observe(
+                'yatube_http_request_duration_seconds', labels, seconds)
+        text = metrics.render(store.counters, store.histograms)
+        self.assertIn('yatube_db_queries_total{view="say \\"hi\\""} 3\n', text)
+        for line in (
+                'yatube_http_request_duration_seconds_bucket'
+                '{view="say \\"hi\\"",le="0.005"} 1',
+                'yatube_http_request_duration_seconds_bucket'
+                '{view="say \\"hi\\"",le="0.025"} 2',
+                'yatube_http_request_duration_seconds_bucket'
+                '{view="say \\"hi\\"",le="10"} 2',
+                'yatube_http_request_duration_seconds_bucket'
+                '{view="say \\"hi\\"",le="+Inf"} 3',
+                'yatube_http_request_duration_seconds_count'
+                '{view="say \\"hi\\""} 3'):
+            self.assertIn(line + '\n', text)
+        self.assertNotIn('yatube_page_cache_total', text)
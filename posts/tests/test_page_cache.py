@@ -0,0 +1,84 @@
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Group, Post, USER_MODEL
+from posts.tests.utils import QueryBudgetMixin
+
+
+class AnonymousPageCacheTests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = USER_MODEL.objects.create_user(username='fedor')
+        cls.group = Group.objects.create(
+            title='Тестовый заголовок',
+            description='Описание',
+            slug='test-slug'
+        )
+        cls.post = Post.objects.create(
+            text='Тестовый текст',
+            group=cls.group,
+            author=cls.user
+        )
+        cls.urls = [
+            reverse('index'),
+            reverse('group_posts', kwargs={'slug': cls.group.slug}),
+            reverse('profile', kwargs={'username': cls.user.username}),
+            reverse('post', kwargs={
+                'username': cls.user.username, 'post_id': cls.post.id}),
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_anonymous_pages_served_from_cache(self):
+        """Повторный запрос анонима отдаётся из кэша без запросов к базе"""
+        for url in self.urls:
+            with self.subTest(url=url):
+                first = self.guest_client.get(url)
+                self.assertEqual(first['X-Cache'], 'MISS')
+                with self.assertMaxQueries(0):
+                    second = self.guest_client.get(url)
+                self.assertEqual(second['X-Cache'], 'HIT')
+                self.assertEqual(second.content, first.content)
+
+    def test_query_string_is_part_of_key(self):
+        """Страницы с разной строкой запроса кэшируются отдельно"""
+        self.guest_client.get(reverse('index'))
+        response = self.guest_client.get(reverse('index') + '?page=1')
+        self.assertEqual(response['X-Cache'], 'MISS')
+
+    def test_authorized_user_bypasses_cache(self):
+        """Авторизованный пользователь не получает страницы из кэша"""
+        for url in self.urls:
+            with self.subTest(url=url):
+                self.guest_client.get(url)
+                response = self.authorized_client.get(url)
+                self.assertEqual(response['X-Cache'], 'BYPASS')
+                self.assertContains(response, 'Новая запись')
+
+    def test_cache_invalidated_by_posts_and_comments(self):
+        """Новый пост и новый комментарий сбрасывают кэш страниц"""
+        for url in self.urls:
+            self.guest_client.get(url)
+        post = Post.objects.create(
+            text='Новый пост', author=self.user, group=self.group)
+        for url in self.urls[:3]:
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertEqual(response['X-Cache'], 'MISS')
+                self.assertContains(response, post.text)
+        Comment.objects.create(
+            post=self.post, author=self.user, text='Новый комментарий')
+        response = self.guest_client.get(self.urls[3])
+        self.assertContains(response, 'Новый комментарий')
+
+    def test_response_varies_on_cookie(self):
+        """Ответ из кэша предупреждает прокси, что он зависит от cookie"""
+        self.guest_client.get(self.urls[0])
+        response = self.guest_client.get(self.urls[0])
+        self.assertIn('Cookie', response['Vary'])
@@ -0,0 +1,83 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Group, Post, USER_MODEL
+from posts.views import POSTS_PER_PAGE
+
+
+class CursorPaginatorTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = USER_MODEL.objects.create_user(username='ivan')
+        cls.group = Group.objects.create(
+            title='Тестовый заголовок',
+            description='Описание',
+            slug='test-slug'
+        )
+        Post.objects.bulk_create(
+            Post(text=f'Пост {i}', author=cls.user, group=cls.group)
+            for i in range(POSTS_PER_PAGE * 2 + 5)
+        )
+        cls.ordered = list(Post.objects.order_by('-pub_date', '-id'))
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def walk(self, url):
+        """Проходит ленту по ссылкам «Следующая» и собирает все посты"""
+        posts, link = [], ''
+        while link is not None:
+            page = self.guest_client.get(url + link).context['page']
+            posts.extend(page)
+            link = page.next_link
+        return posts
+
+    def test_cursor_walk_returns_every_post_once(self):
+        """Переход по курсорам выдаёт все посты по порядку без повторов"""
+        urls = [
+            reverse('index'),
+            reverse('group_posts', kwargs={'slug': self.group.slug}),
+            reverse('profile', kwargs={'username': self.user.username}),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.walk(url), self.ordered)
+
+    def test_previous_link_returns_previous_page(self):
+        """Ссылка «Предыдущая» возвращает на ту же страницу"""
+        first = self.guest_client.get(reverse('index')).context['page']
+        second = self.guest_client.get(
+            reverse('index') + first.next_link).context['page']
+        back = self.guest_client.get(
+            reverse('index') + second.previous_link).context['page']
+        self.assertEqual(list(back), list(first))
+        self.assertIsNone(back.previous_link)
+
+    def test_page_number_fallback(self):
+        """Старые ссылки ?page=N продолжают работать"""
+        page = self.guest_client.get(
+            reverse('index') + '?page=2').context['page']
+        self.assertEqual(
+            list(page), self.ordered[POSTS_PER_PAGE:POSTS_PER_PAGE * 2])
+        self.assertIn('after=', page.next_link)
+
+    def test_broken_cursor_shows_first_page(self):
+        """Испорченный курсор открывает первую страницу"""
+        page = self.guest_client.get(
+            reverse('index') + '?after=%%%').context['page']
+        self.assertEqual(list(page), self.ordered[:POSTS_PER_PAGE])
+
+    def test_cursor_page_without_count_and_offset(self):
+        """Курсорная страница не считает записи и не использует OFFSET"""
+        first = self.guest_client.get(reverse('index')).context['page']
+        with CaptureQueriesContext(connection) as queries:
+            self.guest_client.get(reverse('index') + first.next_link)
+        for query in queries.captured_queries:
+            with self.subTest(sql=query['sql']):
+                self.assertNotIn('SELECT COUNT(*)', query['sql'].upper())
+                self.assertNotIn('OFFSET', query['sql'].upper())
@@ -0,0 +1,110 @@
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post, USER_MODEL
+from posts.tests.utils import QueryBudgetMixin
+from posts.views import POSTS_PER_PAGE
+
+
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Число запросов каждой страницы не зависит от числа постов на ней"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = USER_MODEL.objects.create_user(username='masha')
+        cls.commentator = USER_MODEL.objects.create_user(username='petya')
+        cls.group = Group.objects.create(
+            title='Тестовый заголовок',
+            description='Описание',
+            slug='test-slug'
+        )
+        Post.objects.bulk_create(
+            Post(text=f'Пост {i}', author=cls.user, group=cls.group)
+            for i in range(POSTS_PER_PAGE * 2)
+        )
+        cls.post = Post.objects.latest('pk')
+        Comment.objects.bulk_create(
+            Comment(post=post, author=cls.commentator, text='Комментарий')
+            for post in Post.objects.all()
+        )
+        Follow.objects.create(user=cls.commentator, author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+        self.follower_client = Client()
+        self.follower_client.force_login(self.commentator)
+
+    def test_guest_pages_query_budget(self):
+        """Бюджет запросов страниц для анонима"""
+        budgets = {
+            reverse('index'): 1,
+            reverse('group_posts', kwargs={'slug': self.group.slug}): 2,
+            reverse('profile', kwargs={'username': self.user.username}): 2,
+            reverse('post', kwargs={
+                'username': self.user.username,
+                'post_id': self.post.id}): 2,
+            reverse('post_comments', kwargs={
+                'username': self.user.username,
+                'post_id': self.post.id}): 2,
+            reverse('search') + '?q=Пост': 2,
+        }
+        for url, budget in budgets.items():
+            with self.subTest(url=url):
+                with self.assertMaxQueries(budget):
+                    response = self.guest_client.get(url)
+                self.assertEqual(response.status_code, 200)
+
+    def test_authorized_pages_query_budget(self):
+        """Бюджет запросов страниц для авторизованного пользователя:
+        к страницам анонима добавляются сессия и пользователь"""
+        budgets = {
+            reverse('index'): 3,
+            reverse('new_post'): 3,
+            reverse('post_edit', kwargs={
+                'username': self.user.username,
+                'post_id': self.post.id}): 4,
+        }
+        for url, budget in budgets.items():
+            with self.subTest(url=url):
+                with self.assertMaxQueries(budget):
+                    response = self.authorized_client.get(url)
+                self.assertEqual(response.status_code, 200)
+
+    def test_comments_json_query_budget(self):
+        """Бюджет запросов порции комментариев в JSON"""
+        url = reverse('post_comments', kwargs={
+            'username': self.user.username, 'post_id': self.post.id})
+        with self.assertMaxQueries(2):
+            response = self.guest_client.get(
+                url, HTTP_ACCEPT='application/json')
+        self.assertEqual(len(response.json()['comments']), 1)
+
+    def test_follow_index_query_budget(self):
+        """Бюджет запросов ленты подписок: сессия, пользователь
+        и страница ленты"""
+        with self.assertMaxQueries(4):
+            response = self.follower_client.get(reverse('follow_index'))
+        self.assertEqual(len(response.context['page']), POSTS_PER_PAGE)
+
+    def test_add_comment_query_budget(self):
+        """Бюджет запросов добавления комментария вместе
+        с обновлением счётчика комментариев"""
+        url = reverse('add_comment', kwargs={
+            'username': self.user.username, 'post_id': self.post.id})
+        with self.assertMaxQueries(5):
+            response = self.authorized_client.post(url, {'text': 'Текст'})
+        self.assertEqual(response.status_code, 302)
+
+    def test_feed_query_count_does_not_grow_with_page(self):
+        """Полная страница ленты стоит столько же запросов, сколько пустая"""
+        url = reverse('profile', kwargs={'username': self.commentator})
+        with self.assertMaxQueries(3) as empty:
+            self.guest_client.get(url)
+        url = reverse('profile', kwargs={'username': self.user.username})
+        with self.assertMaxQueries(len(empty)):
+            self.guest_client.get(url)
@@ -0,0 +1,89 @@
+import unittest
+
+from django.db import connection
+from django.test import TestCase
+from django.utils import timezone
+
+from posts.models import Comment, Group, Post, USER_MODEL
+from posts.paginator import CursorPaginator
+from posts.views import POSTS_PER_PAGE
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN')
+class FeedQueryPlanTests(TestCase):
+    """Запросы лент должны идти по индексам: без полного перебора
+    таблицы и без сортировки во временном B-дереве."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = USER_MODEL.objects.create_user(username='olga')
+        cls.group = Group.objects.create(
+            title='Тестовый заголовок',
+            description='Описание',
+            slug='test-slug'
+        )
+        cls.post = Post.objects.create(
+            text='Тестовый текст',
+            group=cls.group,
+            author=cls.user
+        )
+        Comment.objects.create(post=cls.post, author=cls.user, text='Текст')
+
+    def query_plan(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def assertUsesIndexes(self, queryset):
+        plan = self.query_plan(queryset)
+        for step in plan:
+            self.assertNotIn('TEMP B-TREE', step, plan)
+            if step.startswith('SCAN'):
+                self.assertIn('INDEX', step, plan)
+
+    def feed_querysets(self):
+        cursor = (timezone.now(), self.post.id)
+        feeds = {
+            'index': Post.objects.for_feed(),
+            'group': Post.objects.for_feed().filter(group=self.group),
+            'profile': Post.objects.for_feed().filter(author=self.user),
+        }
+        for name, posts in feeds.items():
+            paginator = CursorPaginator(posts, POSTS_PER_PAGE)
+            yield name, paginator.get_queryset()
+            yield f'{name} after', paginator.get_queryset(after=cursor)
+            yield f'{name} before', paginator.get_queryset(before=cursor)
+
+    def test_feed_queries_use_indexes(self):
+        """Ленты постов выбираются по индексам"""
+        for name, queryset in self.feed_querysets():
+            with self.subTest(feed=name):
+                self.assertUsesIndexes(queryset[:POSTS_PER_PAGE + 1])
+
+    def test_post_comments_use_index(self):
+        """Комментарии поста выбираются по индексу (post, created),
+        в том числе окна за курсором и перед ним"""
+        paginator = CursorPaginator(
+            self.post.comments.all(), POSTS_PER_PAGE, fields=('created', 'id'))
+        cursor = (timezone.now(), 1)
+        for window in (paginator.get_queryset(),
+                       paginator.get_queryset(after=cursor),
+                       paginator.get_queryset(before=cursor)):
+            with self.subTest(query=str(window.query)):
+                self.assertUsesIndexes(window[:POSTS_PER_PAGE + 1])
+
+    def test_admin_date_hierarchy_uses_index(self):
+        """Список постов в админке и навигация по датам идут по индексу"""
+        now = timezone.now()
+        posts = Post.objects.select_related('author', 'group').order_by(
+            '-pub_date', '-pk')
+        day = posts.filter(pub_date__gte=now, pub_date__lt=now)
+        for name, queryset in (('list', posts), ('day', day)):
+            with self.subTest(query=name):
+                self.assertUsesIndexes(queryset[:100])
+        for kind in ('year', 'month', 'day'):
+            with self.subTest(dates=kind):
+                plan = self.query_plan(Post.objects.dates('pub_date', kind))
+                self.assertIn('COVERING INDEX post_pub_date_idx', plan[0])
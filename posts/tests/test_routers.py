@@ -0,0 +1,84 @@
+from unittest import mock
+
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase
+from django.urls import reverse
+
+from posts.models import Post, USER_MODEL
+from yatube import routers
+from yatube.routers import (PIN_COOKIE, PinPrimaryMiddleware,
+                            PrimaryReplicaRouter, is_pinned)
+
+
+@mock.patch('yatube.routers.REPLICA_DATABASES', ('replica1', 'replica2'))
+class PrimaryReplicaRouterTests(TestCase):
+    """Чтение с реплик, запись и закреплённые чтения - в основную базу"""
+
+    def setUp(self):
+        self.router = PrimaryReplicaRouter()
+        self.addCleanup(self.reset)
+        self.reset()
+        # Тест и так идёт в транзакции TestCase, её не считаем
+        patcher = mock.patch.object(
+            routers.connections['default'], 'in_atomic_block', False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def reset(self):
+        routers._state.pinned = routers._state.wrote = False
+
+    def test_reads_go_to_replicas(self):
+        aliases = {self.router.db_for_read(Post) for _ in range(50)}
+        self.assertEqual(aliases, {'replica1', 'replica2'})
+
+    def test_write_pins_reads_to_primary(self):
+        self.assertEqual(self.router.db_for_write(Post), 'default')
+        self.assertEqual(self.router.db_for_read(Post), 'default')
+
+    def test_transaction_reads_from_primary(self):
+        routers.connections['default'].in_atomic_block = True
+        self.assertEqual(self.router.db_for_read(Post), 'default')
+
+    def test_migrations_only_on_primary(self):
+        self.assertTrue(self.router.allow_migrate('default', 'posts'))
+        self.assertFalse(self.router.allow_migrate('replica1', 'posts'))
+
+
+# Реплика, которая смотрит в основную базу: тестовая база одна
+@mock.patch('yatube.routers.REPLICA_DATABASES', ('default',))
+class PinPrimaryMiddlewareTests(TestCase):
+    """После записи пользователь закреплён за основной базой"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = USER_MODEL.objects.create_user(username='masha')
+
+    def test_write_sets_pin_cookie(self):
+        """Новый пост ставит cookie закрепления, чтение - нет"""
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('index'))
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+        response = self.client.post(reverse('new_post'), {'text': 'Пост'})
+        self.assertIn(PIN_COOKIE, response.cookies)
+        self.assertFalse(is_pinned())
+
+    def test_cookie_pins_request(self):
+        """Запрос с действующей cookie читает из основной базы"""
+        seen = []
+
+        def view(request):
+            seen.append(is_pinned())
+            return HttpResponse()
+
+        middleware = PinPrimaryMiddleware(view)
+        factory = RequestFactory()
+        request = factory.get('/')
+        request.COOKIES[PIN_COOKIE] = str(2 ** 40)
+        middleware(request)
+        request = factory.get('/')
+        request.COOKIES[PIN_COOKIE] = '1'
+        middleware(request)
+        middleware(factory.get('/'))
+        self.assertEqual(seen, [True, False, False])
+        self.assertFalse(is_pinned())
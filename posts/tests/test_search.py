@@ -0,0 +1,121 @@
+from django.contrib.admin.sites import site
+from django.core.cache import cache
+from django.db import connection
+from django.http import QueryDict
+from django.test import Client, RequestFactory, TestCase
+from django.urls import reverse
+
+from posts.models import Group, Post, USER_MODEL
+from posts.search import SearchPaginator, install_search_index, search_posts
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = USER_MODEL.objects.create_user(username='masha')
+        cls.other = USER_MODEL.objects.create_user(username='sasha')
+        cls.group = Group.objects.create(
+            title='Коты', slug='cats', description='Про котов')
+        cls.best = Post.objects.create(
+            text='Кот, кот и ещё раз кот', author=cls.author,
+            group=cls.group)
+        cls.good = Post.objects.create(
+            text='Кот спит на длинном-длинном диване у окна',
+            author=cls.other)
+        cls.unrelated = Post.objects.create(
+            text='Собака гуляет', author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def search(self, **params):
+        return self.client.get(reverse('search'), params)
+
+    def test_ranked_by_bm25(self):
+        """Результаты идут по убыванию релевантности"""
+        response = self.search(q='кот')
+        self.assertEqual(
+            list(response.context['page']), [self.best, self.good])
+
+    def test_prefix_and_case(self):
+        """Поиск не зависит от регистра и находит слова по началу"""
+        posts = search_posts('СОБАК')
+        self.assertEqual(list(posts), [self.unrelated])
+
+    def test_filters(self):
+        """Результаты фильтруются по сообществу и автору"""
+        cases = {
+            'group': ({'group': 'cats'}, [self.best]),
+            'author': ({'author': 'sasha'}, [self.good]),
+        }
+        for name, (params, expected) in cases.items():
+            with self.subTest(filter=name):
+                response = self.search(q='кот', **params)
+                self.assertEqual(list(response.context['page']), expected)
+
+    def test_fts_syntax_is_escaped(self):
+        """Операторы FTS5 в запросе не ломают поиск"""
+        for query in ('кот OR', '"кот', 'кот*', 'NEAR(кот', '...'):
+            with self.subTest(query=query):
+                self.assertEqual(self.search(q=query).status_code, 200)
+
+    def test_index_follows_changes(self):
+        """Индекс обновляется при правке и удалении поста"""
+        post = Post.objects.get(pk=self.unrelated.pk)
+        Post.objects.filter(pk=post.pk).update(text='Кошка')
+        self.assertEqual(list(search_posts('собака')), [])
+        self.assertEqual(list(search_posts('кошка')), [post])
+        post.delete()
+        self.assertEqual(list(search_posts('кошка')), [])
+
+    def test_cursor_pages(self):
+        """Страницы результатов выбираются курсором (rank, id)"""
+        posts = [
+            Post.objects.create(text=f'Пёс номер {i}', author=self.author)
+            for i in range(5)
+        ]
+        paginator = SearchPaginator(search_posts('пёс'), 2)
+        seen = []
+        page = paginator.get_page(QueryDict())
+        while True:
+            seen.extend(page)
+            if not page.next_link:
+                break
+            page = paginator.get_page(QueryDict(page.next_link[1:]))
+        self.assertCountEqual(seen, posts)
+        self.assertEqual(len(seen), len(set(seen)))
+        previous = paginator.get_page(QueryDict(page.previous_link[1:]))
+        self.assertEqual(list(previous), seen[2:4])
+
+    def test_page_query_has_no_offset(self):
+        """Запрос страницы не использует OFFSET"""
+        paginator = SearchPaginator(search_posts('кот'), 1)
+        cursor = paginator.encode_cursor(search_posts('кот').order_by(
+            'rank', 'id')[0])
+        sql = str(paginator.get_queryset(
+            after=paginator.decode_cursor(cursor))[:2].query)
+        self.assertNotIn('OFFSET', sql)
+        self.assertIn('MATCH', sql)
+
+    def test_triggers_restored(self):
+        """Потерянные триггеры восстанавливаются с перестройкой индекса"""
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TRIGGER posts_post_fts_insert')
+        self.assertTrue(install_search_index(connection))
+        self.assertFalse(install_search_index(connection))
+        post = Post.objects.create(text='Попугай', author=self.author)
+        self.assertEqual(list(search_posts('попугай')), [post])
+
+    def test_admin_search_uses_index(self):
+        """Поиск в админке идёт по полнотекстовому индексу"""
+        request = RequestFactory().get('/')
+        model_admin = site._registry[Post]
+        queryset, distinct = model_admin.get_search_results(
+            request, Post.objects.all(), 'собака')
+        self.assertEqual(list(queryset), [self.unrelated])
+        self.assertIn('MATCH', str(queryset.query))
+        queryset, distinct = model_admin.get_search_results(
+            request, Post.objects.all(), 'кот')
+        self.assertCountEqual(queryset, [self.best, self.good])
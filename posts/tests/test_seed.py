@@ -0,0 +1,98 @@
+import shutil
+import tempfile
+from collections import Counter
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+
+from posts.models import Comment, Follow, Group, Post, Profile, USER_MODEL
+from posts.search import search_posts
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def tearDownModule():
+    shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class SeedTests(TestCase):
+    """Команда seed наполняет базу тестовыми данными"""
+
+    def seed(self, *args):
+        call_command(
+            'seed', '--users', '30', '--groups', '3', '--posts', '300',
+            '--comments', '600', '--chunk-size', '70', *args,
+            stdout=StringIO())
+
+    def snapshot(self):
+        return (
+            list(Post.objects.order_by('pk').values_list(
+                'text', 'pub_date', 'author__username', 'group__slug',
+                'image')),
+            list(Comment.objects.order_by('pk').values_list(
+                'text', 'created', 'author__username', 'post__text')),
+            list(Follow.objects.order_by('pk').values_list(
+                'user__username', 'author__username')),
+        )
+
+    def test_counts_and_counters(self):
+        """Создаётся заказанное число записей, счётчики пересчитаны"""
+        self.seed('--follows', '50')
+        self.assertEqual(USER_MODEL.objects.count(), 30)
+        self.assertEqual(Group.objects.count(), 3)
+        self.assertEqual(Post.objects.count(), 300)
+        self.assertEqual(Comment.objects.count(), 600)
+        self.assertEqual(Follow.objects.count(), 50)
+        self.assertEqual(Profile.objects.count(), 30)
+        post = Post.objects.order_by('-comment_count').first()
+        self.assertEqual(post.comment_count, post.comments.count())
+        self.assertTrue(USER_MODEL.objects.first().check_password('password'))
+
+    def test_same_seed_gives_same_data(self):
+        """Одно и то же зерно даёт те же данные, другое - другие"""
+        self.seed('--follows', '20')
+        first = self.snapshot()
+        USER_MODEL.objects.all().delete()
+        Group.objects.all().delete()
+        self.seed('--follows', '20')
+        self.assertEqual(self.snapshot(), first)
+        self.seed('--seed', '1', '--follows', '20')
+        self.assertNotEqual(self.snapshot()[0][300:], first[0])
+
+    def test_seed_is_not_loaded_twice(self):
+        self.seed()
+        with self.assertRaises(CommandError):
+            self.seed()
+
+    def test_distributions(self):
+        """Активность авторов неравномерна, горячие посты
+        собирают заданную долю комментариев"""
+        self.seed('--hot-posts', '3', '--hot-share', '0.6')
+        authors = Counter(Post.objects.values_list('author_id', flat=True))
+        counts = sorted(authors.values(), reverse=True)
+        self.assertGreater(counts[0], 5 * counts[len(counts) // 2])
+        hot = Post.objects.order_by('-comment_count')[:3]
+        share = sum(post.comment_count for post in hot) / 600
+        self.assertGreater(share, 0.55)
+
+    def test_dates_and_search(self):
+        """Даты постов идут по порядку id и не позже --until,
+        посты попадают в поисковый индекс"""
+        self.seed('--until', '2023-06-01', '--days', '30')
+        dates = list(Post.objects.order_by('pk').values_list(
+            'pub_date', flat=True))
+        self.assertEqual(dates, sorted(dates))
+        self.assertLessEqual(dates[-1].isoformat(), '2023-06-01')
+        self.assertGreaterEqual(dates[0].isoformat(), '2023-05-02')
+        word = Post.objects.first().text.split()[0]
+        self.assertTrue(search_posts(word).exists())
+
+    def test_images(self):
+        """Посты с картинками делят несколько нарисованных файлов"""
+        self.seed('--images', '2', '--image-share', '0.5')
+        images = set(Post.objects.exclude(image='').values_list(
+            'image', flat=True))
+        self.assertEqual(len(images), 2)
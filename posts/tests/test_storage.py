@@ -0,0 +1,136 @@
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.test import TestCase, TransactionTestCase, override_settings
+from sorl.thumbnail import get_thumbnail
+
+from posts.image_variants import make_variants
+from posts.models import Post, USER_MODEL
+from posts.storage import post_image_storage
+from posts.tests.test_thumbnails import make_image
+from posts.thumbnails import CARD_GEOMETRY, CARD_OPTIONS
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+TEMP_STATE_DIR = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def tearDownModule():
+    shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+    shutil.rmtree(TEMP_STATE_DIR, ignore_errors=True)
+
+
+@override_settings(
+    MEDIA_ROOT=TEMP_MEDIA_ROOT, POST_IMAGE_STATE_DIR=TEMP_STATE_DIR)
+class ContentHashStorageTests(TestCase):
+    def setUp(self):
+        self.user = USER_MODEL.objects.create_user(username='petr')
+
+    def create_post(self, image):
+        return Post.objects.create(text='Текст', author=self.user, image=image)
+
+    def test_identical_uploads_share_file(self):
+        """Одинаковые загрузки получают одно имя и один файл"""
+        first = self.create_post(make_image('cat.png'))
+        second = self.create_post(make_image('CAT_copy.PNG'))
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertRegex(
+            first.image.name, r'^posts/[0-9a-f]{2}/[0-9a-f]{64}\.png$')
+        directory = os.path.dirname(first.image.path)
+        self.assertEqual(len(os.listdir(directory)), 1)
+
+    def test_different_uploads_get_different_names(self):
+        """Разное содержимое - разные файлы"""
+        first = self.create_post(make_image(size=(10, 10)))
+        second = self.create_post(make_image(size=(20, 10)))
+        self.assertNotEqual(first.image.name, second.image.name)
+
+    @mock.patch('posts.image_variants.VARIANT_PROCESSES', 0)
+    def test_shared_file_reuses_variants(self):
+        """Варианты общего файла не готовятся второй раз"""
+        first = self.create_post(make_image(size=(330, 100)))
+        second = self.create_post(make_image(size=(330, 100)))
+        make_variants(first.pk, first.image.name)
+        with mock.patch('posts.image_variants.render_variants') as render:
+            self.assertEqual(
+                make_variants(second.pk, second.image.name), [320])
+        render.assert_not_called()
+
+
+@override_settings(
+    MEDIA_ROOT=TEMP_MEDIA_ROOT, POST_IMAGE_STATE_DIR=TEMP_STATE_DIR)
+class ImageReleaseTests(TransactionTestCase):
+    # Вне транзакции чтения идут и в реплики, если они настроены
+    databases = '__all__'
+
+    def setUp(self):
+        self.user = USER_MODEL.objects.create_user(username='anna')
+        self.first = Post.objects.create(
+            text='Первый', author=self.user, image=make_image(size=(50, 50)))
+        self.second = Post.objects.create(
+            text='Второй', author=self.user, image=make_image(size=(50, 50)))
+        self.name = self.first.image.name
+        self.thumbnail = get_thumbnail(
+            self.first.image, CARD_GEOMETRY, **CARD_OPTIONS)
+
+    def test_file_removed_with_last_post(self):
+        """Файл и миниатюры удаляются вместе с последним постом"""
+        self.first.delete()
+        self.assertTrue(post_image_storage.exists(self.name))
+        self.second.delete()
+        self.assertFalse(post_image_storage.exists(self.name))
+        self.assertFalse(self.thumbnail.exists())
+
+    def test_replaced_file_released(self):
+        """Заменённая у всех постов картинка удаляется"""
+        for post in (self.first, self.second):
+            post.image = make_image(size=(60, 60))
+            post.save()
+        self.assertFalse(post_image_storage.exists(self.name))
+        self.assertTrue(post_image_storage.exists(self.first.image.name))
+
+    def test_reupload_during_release_keeps_file(self):
+        """Файл, доставшийся загрузке до записи её поста,
+        не удаляется вместе с последним старым постом"""
+        name = post_image_storage.save(
+            'posts/copy.png', make_image(size=(50, 50)))
+        self.assertEqual(name, self.name)
+        self.first.delete()
+        self.second.delete()
+        self.assertTrue(post_image_storage.exists(name))
+
+        post = Post.objects.create(text='Третий', author=self.user, image=name)
+        self.assertFalse(post_image_storage.is_claimed(name))
+        post.delete()
+        self.assertFalse(post_image_storage.exists(name))
+
+    def test_stale_claim_does_not_keep_file(self):
+        """Загрузка без записанного поста держит файл недолго"""
+        post_image_storage.save('posts/copy.png', make_image(size=(50, 50)))
+        with mock.patch('posts.storage.CLAIM_SECONDS', 0):
+            self.first.delete()
+            self.second.delete()
+        self.assertFalse(post_image_storage.exists(self.name))
+
+    def test_save_restores_released_file(self):
+        """Файл, удалённый между загрузками, записывается заново"""
+        self.first.delete()
+        self.second.delete()
+        name = post_image_storage.save(
+            'posts/copy.png', make_image(size=(50, 50)))
+        self.assertEqual(name, self.name)
+        self.assertTrue(post_image_storage.exists(name))
+
+    def test_state_is_not_served(self):
+        """Блокировка и отметки хранилища не раздаются через /media/"""
+        name = post_image_storage.save(
+            'posts/copy.png', make_image(size=(50, 50)))
+        claim = post_image_storage.claim_path(name)
+        self.assertTrue(os.path.exists(claim))
+        self.assertFalse(claim.startswith(TEMP_MEDIA_ROOT))
+        for path in ('.lock', f'claims/{name}'):
+            with self.subTest(path=path):
+                response = self.client.get(settings.MEDIA_URL + path)
+                self.assertEqual(response.status_code, 404)
@@ -0,0 +1,160 @@
+import io
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, TransactionTestCase
+from django.test import override_settings
+from django.urls import reverse
+from PIL import Image
+from sorl.thumbnail import get_thumbnail
+
+from posts.models import Post, USER_MODEL
+from posts.thumbnails import (CARD_GEOMETRY, CARD_OPTIONS, _run_in_worker,
+                              card_thumbnail_file, make_thumbnails,
+                              resolve_thumbnails)
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def tearDownModule():
+    shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+
+def make_image(name='picture.png', size=(40, 20)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, 'red').save(buffer, 'PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), 'image/png')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = USER_MODEL.objects.create_user(username='nina')
+        self.post = Post.objects.create(
+            text='Пост с картинкой', author=self.user, image=make_image())
+        self.guest_client = Client()
+
+    def test_make_thumbnails_saves_thumbnail_name(self):
+        """Фоновая задача сохраняет имя готовой миниатюры"""
+        name = make_thumbnails(self.post.pk, self.post.image.name)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.thumbnail, name)
+        with Image.open(os.path.join(TEMP_MEDIA_ROOT, name)) as image:
+            self.assertEqual(image.size, (960, 339))
+
+    def test_replaced_image_is_not_overwritten(self):
+        """Миниатюра заменённой картинки не сохраняется"""
+        self.assertIsNone(make_thumbnails(self.post.pk, 'posts/old.png'))
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.thumbnail, '')
+
+    def test_render_does_not_call_sorl(self):
+        """Страница выводит готовую миниатюру без обращений к sorl"""
+        make_thumbnails(self.post.pk, self.post.image.name)
+        self.post.refresh_from_db()
+        with mock.patch(
+            'sorl.thumbnail.base.ThumbnailBackend.get_thumbnail',
+            side_effect=AssertionError('sorl вызван при отрисовке'),
+        ):
+            response = self.guest_client.get(reverse('index'))
+        self.assertContains(response, self.post.thumbnail)
+
+    @mock.patch('posts.thumbnails.THUMBNAIL_WORKERS', 2)
+    @mock.patch('posts.thumbnails._scheduled', set())
+    @mock.patch('posts.thumbnails.get_executor')
+    def test_original_image_until_thumbnail_is_ready(self, get_executor):
+        """Пока миниатюры нет, показывается исходная картинка,
+        а миниатюра ставится в фон. Pillow при показе не работает"""
+        with mock.patch('PIL.Image.open', side_effect=AssertionError(
+                'Pillow вызван при отрисовке')):
+            response = self.guest_client.get(reverse('index'))
+            cache.clear()
+            self.guest_client.get(reverse('index'))
+        self.assertContains(response, self.post.image.url)
+        get_executor.return_value.submit.assert_called_once_with(
+            _run_in_worker, self.post.pk, self.post.image.name)
+
+    @mock.patch('posts.thumbnails.THUMBNAIL_WORKERS', 0)
+    @mock.patch('posts.thumbnails.get_executor')
+    def test_no_workers_no_background_thumbnails(self, get_executor):
+        """Без фоновых потоков промах при показе потоков не запускает"""
+        response = self.guest_client.get(reverse('index'))
+        self.assertContains(response, self.post.image.url)
+        get_executor.assert_not_called()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ResolveThumbnailsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Ключи sorl от прошлых тестов с той же картинкой остались бы
+        # в кэше, и get_thumbnail не записал бы их в базу
+        cache.clear()
+        cls.user = USER_MODEL.objects.create_user(username='vera')
+        for i in range(3):
+            post = Post.objects.create(
+                text=f'Пост {i}', author=cls.user,
+                image=make_image(f'picture{i}.png'))
+            get_thumbnail(post.image, CARD_GEOMETRY, **CARD_OPTIONS)
+
+    def setUp(self):
+        cache.clear()
+        self.posts = list(Post.objects.all())
+
+    def test_file_name_matches_sorl(self):
+        """Имя миниатюры совпадает с тем, что выдаёт sorl"""
+        for post in self.posts:
+            with self.subTest(post=post):
+                self.assertEqual(
+                    card_thumbnail_file(post.image).name,
+                    get_thumbnail(
+                        post.image, CARD_GEOMETRY, **CARD_OPTIONS).name)
+
+    def test_whole_page_in_one_query(self):
+        """Миниатюры всей страницы находятся одним запросом,
+        а после прогрева кэша - вовсе без запросов"""
+        with self.assertNumQueries(1):
+            resolve_thumbnails(self.posts)
+        for post in self.posts:
+            self.assertEqual(
+                post.resolved_thumbnail.name,
+                card_thumbnail_file(post.image).name)
+        with self.assertNumQueries(0):
+            resolve_thumbnails(self.posts)
+
+    def test_render_uses_resolved_thumbnails(self):
+        """Лента с прогретыми миниатюрами не вызывает sorl"""
+        with mock.patch(
+            'sorl.thumbnail.base.ThumbnailBackend.get_thumbnail',
+            side_effect=AssertionError('sorl вызван при отрисовке'),
+        ):
+            response = self.client.get(reverse('index'))
+        for post in self.posts:
+            self.assertContains(response, card_thumbnail_file(post.image).url)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailScheduleTests(TransactionTestCase):
+    # Вне транзакции чтения идут и в реплики, если они настроены
+    databases = '__all__'
+
+    @mock.patch('posts.thumbnails.THUMBNAIL_WORKERS', 0)
+    @mock.patch('posts.image_variants.VARIANT_PROCESSES', 0)
+    def test_new_post_schedules_thumbnails(self):
+        """После сохранения поста с картинкой готовятся миниатюра
+        и варианты для srcset"""
+        user = USER_MODEL.objects.create_user(username='nina')
+        client = Client()
+        client.force_login(user)
+        client.post(
+            reverse('new_post'), {'text': 'Текст', 'image': make_image()})
+        post = Post.objects.get()
+        self.assertNotEqual(post.thumbnail, '')
+        self.assertNotEqual(post.variant_widths, '')
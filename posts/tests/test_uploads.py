@@ -0,0 +1,102 @@
+import io
+import shutil
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from posts.forms import PostForm
+from posts.models import Post, USER_MODEL
+from posts.tests.test_thumbnails import make_image
+from posts.uploads import BoundedUploadHandler
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def tearDownModule():
+    shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+
+class BoundedUploadHandlerTests(TestCase):
+    def receive(self, chunks, max_bytes):
+        handler = BoundedUploadHandler(max_bytes=max_bytes)
+        handler.new_file('image', 'picture.png', 'image/png', None)
+        start = 0
+        for chunk in chunks:
+            handler.receive_data_chunk(chunk, start)
+            start += len(chunk)
+        uploaded = handler.file_complete(start)
+        self.addCleanup(uploaded.close)
+        return uploaded
+
+    def test_small_file_is_written_to_disk(self):
+        """Файл в пределах лимита целиком пишется во временный файл"""
+        uploaded = self.receive([b'abc', b'def'], max_bytes=10)
+        self.assertTrue(uploaded.temporary_file_path())
+        self.assertEqual(uploaded.read(), b'abcdef')
+
+    def test_large_file_is_not_kept(self):
+        """Сверх лимита файл не хранится, но размер известен"""
+        uploaded = self.receive([b'a' * 8] * 3, max_bytes=10)
+        self.assertEqual(uploaded.size, 24)
+        self.assertEqual(uploaded.read(), b'')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class BoundedImageUploadTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = USER_MODEL.objects.create_user(username='ivan')
+        self.client = Client()
+        self.client.force_login(self.user)
+        self.image_field = PostForm.base_fields['image']
+
+    def post_image(self, image):
+        return self.client.post(
+            reverse('new_post'), {'text': 'Текст', 'image': image})
+
+    def test_too_large_file_rejected(self):
+        """Файл больше лимита отклоняется без открытия в Pillow"""
+        with mock.patch.object(self.image_field, 'max_bytes', 50), \
+                mock.patch('PIL.Image.open') as image_open:
+            response = self.post_image(make_image())
+        image_open.assert_not_called()
+        self.assertIn('image', response.context['form'].errors)
+        self.assertFalse(Post.objects.exists())
+
+    def test_too_many_pixels_rejected(self):
+        """Картинка с лишними пикселями отклоняется по заголовку"""
+        with mock.patch.object(self.image_field, 'max_pixels', 100), \
+                mock.patch('PIL.ImageFile.ImageFile.load') as load:
+            response = self.post_image(make_image(size=(40, 20)))
+        load.assert_not_called()
+        self.assertIn('image', response.context['form'].errors)
+        self.assertFalse(Post.objects.exists())
+
+    def test_truncated_jpeg_rejected(self):
+        """Обрезанный JPEG ловится уменьшенным декодированием"""
+        buffer = io.BytesIO()
+        Image.effect_noise((200, 200), 64).convert('RGB').save(
+            buffer, 'JPEG')
+        data = buffer.getvalue()[:buffer.tell() // 2]
+        response = self.post_image(
+            SimpleUploadedFile('broken.jpg', data, 'image/jpeg'))
+        self.assertIn('image', response.context['form'].errors)
+        self.assertFalse(Post.objects.exists())
+
+    def test_valid_image_accepted(self):
+        """Картинка в пределах лимитов сохраняется"""
+        self.post_image(make_image())
+        self.assertTrue(Post.objects.exclude(image='').exists())
+
+    def test_csrf_still_checked(self):
+        """Представления с загрузкой по-прежнему проверяют CSRF"""
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.user)
+        response = client.post(reverse('new_post'), {'text': 'Текст'})
+        self.assertEqual(response.status_code, 403)
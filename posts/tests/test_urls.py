@@ -115,17 +115,48 @@ class PostURLTest(TestCase):
 
 
     def test_index_page_cache(self):
-        """Testing correct caching the index template"""
+        """Фрагмент главной страницы берётся из кэша"""
+        cache.clear()
+        self.authorized_client.get(reverse('index'))
+        # update() не посылает сигналов, поэтому кэш не сбрасывается
+        Post.objects.filter(pk=self.post2.pk).update(text='Изменённый текст')
         response = self.authorized_client.get(reverse('index'))
-        last_post = response.context['page'][0]
+        self.assertNotContains(response, 'Изменённый текст')
+
+    def test_index_page_cache_invalidation(self):
+        """Новый пост сразу виден на главной, несмотря на кэш"""
+        cache.clear()
+        self.authorized_client.get(reverse('index'))
         post = Post.objects.create(
             text='Новый пост',
             author=self.user,
-            )
+        )
         response = self.authorized_client.get(reverse('index'))
-        current_post = response.context['page'][0]
-        self.assertEqual(last_post, current_post, 'Caching is not working.')
-        cache.clean()
+        self.assertContains(response, post.text)
+        self.assertEqual(response.context['page'][0], post)
+        post.delete()
         response = self.authorized_client.get(reverse('index'))
-        current_post = response.context['page'][0]
-        self.assertEqual(current_post, post, 'Caching is not working.')
+        self.assertNotContains(response, post.text)
+
+    def test_group_and_profile_cache_invalidation(self):
+        """Лента сообщества и профайл сбрасываются при переносе поста"""
+        cache.clear()
+        urls = [
+            reverse('group_posts', kwargs={'slug': self.group.slug}),
+            reverse('profile', kwargs={'username': self.user.username}),
+        ]
+        for url in urls:
+            self.authorized_client.get(url)
+        post = Post.objects.create(
+            text='Пост в сообществе',
+            author=self.user,
+            group=self.group,
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.authorized_client.get(url)
+                self.assertContains(response, post.text)
+        post.group = None
+        post.save()
+        response = self.authorized_client.get(urls[0])
+        self.assertNotContains(response, post.text)
@@ -0,0 +1,141 @@
+import threading
+from concurrent.futures import TimeoutError
+from unittest import mock
+
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+
+from posts.models import Comment, Post, USER_MODEL
+from posts.write_queue import WriteQueue, write
+
+
+class WriteQueueTests(TransactionTestCase):
+    """Записи из разных потоков фиксируются общей транзакцией,
+    каждый вызывающий получает свой результат"""
+
+    databases = '__all__'
+
+    def test_results_and_errors_per_write(self):
+        writes = WriteQueue(window=0.05)
+
+        def fail():
+            raise ValueError('ошибка записи')
+
+        futures = [writes.submit(lambda: 1), writes.submit(fail),
+                   writes.submit(lambda x: x * 3, 1)]
+        self.assertEqual(futures[0].result(timeout=5), 1)
+        with self.assertRaisesMessage(ValueError, 'ошибка записи'):
+            futures[1].result(timeout=5)
+        self.assertEqual(futures[2].result(timeout=5), 3)
+
+    def test_concurrent_writes_share_transaction(self):
+        writes = WriteQueue(window=0.5)
+        batches = []
+        commit = writes.commit
+
+        def record(batch):
+            batches.append(len(batch))
+            commit(batch)
+
+        writes.commit = record
+        results = []
+        threads = [
+            threading.Thread(target=lambda i=i: results.append(
+                writes.submit(lambda: i).result(timeout=5)))
+            for i in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sorted(results), list(range(5)))
+        self.assertEqual(batches, [5])
+
+    @mock.patch('posts.write_queue.WRITE_QUEUE', True)
+    @mock.patch('posts.write_queue.WRITE_QUEUE_TIMEOUT', 0.1)
+    def test_timed_out_write_is_cancelled(self):
+        """Запись, которую писатель не успел начать, отменяется
+        по таймауту и потом не выполняется"""
+        writes = WriteQueue(window=0)
+        busy, release = threading.Event(), threading.Event()
+
+        def block():
+            busy.set()
+            release.wait(5)
+
+        done = []
+        with mock.patch('posts.write_queue.write_queue', writes):
+            first = writes.submit(block)
+            busy.wait(5)
+            with self.assertRaises(TimeoutError):
+                write(done.append, 'отменена')
+            release.set()
+            first.result(timeout=5)
+            self.assertEqual(writes.submit(lambda: 1).result(timeout=5), 1)
+        self.assertEqual(done, [])
+
+    @mock.patch('posts.write_queue.WRITE_QUEUE', True)
+    @mock.patch('posts.write_queue.WRITE_QUEUE_TIMEOUT', 0.1)
+    def test_started_write_is_awaited(self):
+        """Начатую запись не отменить: её результат дожидаются"""
+        writes = WriteQueue(window=0)
+        # Писатель уже запущен и сразу возьмёт запись
+        writes.submit(lambda: None).result(timeout=5)
+
+        def slow():
+            threading.Event().wait(0.4)
+            return 'записано'
+
+        with mock.patch('posts.write_queue.write_queue', writes):
+            self.assertEqual(write(slow), 'записано')
+
+    def test_commit_hook_error_does_not_fail_batch(self):
+        """Ошибка хука после фиксации не выдаёт записи за незаписанные
+        и не отменяет хуки других записей"""
+        writes = WriteQueue(window=0.05)
+        published = []
+
+        def fail():
+            raise ValueError('хук упал')
+
+        def first():
+            transaction.on_commit(fail)
+            return 1
+
+        def second():
+            transaction.on_commit(lambda: published.append(2))
+            return 2
+
+        futures = [writes.submit(first), writes.submit(second)]
+        with self.assertLogs('posts.write_queue', 'ERROR'):
+            self.assertEqual(
+                [future.result(timeout=5) for future in futures], [1, 2])
+        self.assertEqual(published, [2])
+
+    @mock.patch('posts.write_queue.WRITE_QUEUE', True)
+    def test_comment_through_queue(self):
+        """Комментарий, записанный писателем очереди, сразу виден"""
+        user = USER_MODEL.objects.create_user(username='masha')
+        post = Post.objects.create(text='Пост', author=user)
+        self.client.force_login(user)
+        self.client.post(
+            reverse('add_comment', kwargs={
+                'username': user.username, 'post_id': post.id}),
+            {'text': 'Комментарий'})
+        self.assertEqual(Comment.objects.get().text, 'Комментарий')
+        self.assertEqual(Post.objects.get().comment_count, 1)
+
+
+class SynchronousWriteTests(TestCase):
+    def test_disabled_queue_writes_in_place(self):
+        with mock.patch('posts.write_queue.write_queue.submit') as submit:
+            self.assertEqual(write(lambda: 42), 42)
+        submit.assert_not_called()
+
+    @mock.patch('posts.write_queue.WRITE_QUEUE', True)
+    def test_write_inside_transaction_is_synchronous(self):
+        """Внутри транзакции писатель не увидел бы её данных"""
+        with mock.patch('posts.write_queue.write_queue.submit') as submit:
+            self.assertEqual(write(lambda: 42), 42)
+        submit.assert_not_called()
@@ -0,0 +1,35 @@
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.utils import CaptureQueriesContext
+
+
+class _AssertMaxQueriesContext(CaptureQueriesContext):
+    def __init__(self, test_case, limit, connection):
+        self.test_case = test_case
+        self.limit = limit
+        super().__init__(connection)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        super().__exit__(exc_type, exc_value, traceback)
+        if exc_type is not None:
+            return
+        queries = '\n'.join(
+            f'{i}. {query["sql"]}'
+            for i, query in enumerate(self.captured_queries, start=1)
+        )
+        self.test_case.assertLessEqual(
+            len(self), self.limit,
+            f'{len(self)} запросов при бюджете {self.limit}:\n{queries}'
+        )
+
+
+class QueryBudgetMixin:
+    """Добавляет в TestCase проверку бюджета запросов к базе:
+
+        with self.assertMaxQueries(3):
+            self.client.get('/')
+
+    В отличие от assertNumQueries падает только при превышении бюджета
+    и выводит все выполненные запросы."""
+
+    def assertMaxQueries(self, limit, using=DEFAULT_DB_ALIAS):
+        return _AssertMaxQueriesContext(self, limit, connections[using])
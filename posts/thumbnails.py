@@ -0,0 +1,212 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, connections, transaction
+from sorl.thumbnail import default, delete, get_thumbnail
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores import cached_db_kvstore
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from yatube.routers import pin_primary
+
+from .caching import bump_post_feeds
+from .image_variants import make_variants
+from .imaging import VARIANT_FORMATS, VARIANT_WIDTHS, variant_name
+from .models import Post
+from .storage import post_image_storage
+
+logger = logging.getLogger(__name__)
+
+# Миниатюра карточки поста: геометрия и опции sorl-thumbnail
+CARD_GEOMETRY = '960x339'
+CARD_OPTIONS = {'crop': 'center', 'upscale': True}
+
+# Число фоновых потоков, которые готовят миниатюры;
+# 0 - готовить сразу после сохранения, в том же потоке,
+# а промахи при показе оставлять исходной картинкой
+THUMBNAIL_WORKERS = getattr(settings, 'POST_THUMBNAIL_WORKERS', 2)
+
+_executor = None
+# Картинки постов, чьи миниатюры уже готовятся после промаха при показе
+_scheduled = set()
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=THUMBNAIL_WORKERS,
+            thread_name_prefix='post-thumbnails')
+    return _executor
+
+
+def thumbnail_url(name):
+    """Адрес готовой миниатюры: только сборка строки, без Pillow
+    и без обращений к хранилищу ключей sorl"""
+    return default.storage.url(name)
+
+
+def card_thumbnail_file(image):
+    """Файл миниатюры карточки с тем же именем, что даст get_thumbnail,
+    но без открытия картинки и без обращений к хранилищу ключей"""
+    backend = default.backend
+    source = ImageFile(image)
+    options = dict(CARD_OPTIONS)
+    if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(sorl_settings, attr)
+        if value != getattr(sorl_defaults, attr):
+            options.setdefault(key, value)
+    name = backend._get_thumbnail_filename(source, CARD_GEOMETRY, options)
+    return ImageFile(name, default.storage)
+
+
+def get_many_thumbnails(thumbnails):
+    """Ищет готовые миниатюры в хранилище ключей sorl одним обращением
+    к кэшу и не больше чем одним запросом к базе.
+
+    Возвращает словарь {ключ миниатюры: ImageFile} только для найденных."""
+    kvstore = default.kvstore
+    if not isinstance(kvstore, cached_db_kvstore.KVStore):
+        found = {thumbnail.key: kvstore.get(thumbnail)
+                 for thumbnail in thumbnails}
+        return {key: value for key, value in found.items() if value}
+
+    raw_keys = {add_prefix(thumbnail.key): thumbnail.key
+                for thumbnail in thumbnails}
+    values = kvstore.cache.get_many(list(raw_keys))
+    missing = [key for key in raw_keys if key not in values]
+    if missing:
+        rows = dict(KVStoreModel.objects.filter(
+            key__in=missing).values_list('key', 'value'))
+        kvstore.cache.set_many(rows, sorl_settings.THUMBNAIL_CACHE_TIMEOUT)
+        values.update(rows)
+    return {
+        raw_keys[key]: deserialize_image_file(value)
+        for key, value in values.items()
+        if value and value != cached_db_kvstore.EMPTY_VALUE
+    }
+
+
+def resolve_thumbnails(posts):
+    """Находит миниатюры сразу для всех постов страницы и кладёт их
+    в post.resolved_thumbnail. Посты с готовым Post.thumbnail
+    пропускаются; для ненайденных остаётся None."""
+    pending = {}
+    for post in posts:
+        post.resolved_thumbnail = None
+        if post.image and not post.thumbnail:
+            pending[post] = card_thumbnail_file(post.image)
+    if not pending:
+        return
+    found = get_many_thumbnails(pending.values())
+    for post, thumbnail in pending.items():
+        post.resolved_thumbnail = found.get(thumbnail.key)
+
+
+def card_thumbnail_url(post):
+    """Адрес миниатюры карточки: готовый из Post.thumbnail или найденный
+    resolve_thumbnails. При промахе отдаётся исходная картинка, а миниатюра
+    готовится в фоне: Pillow не должен работать во время показа ленты"""
+    if post.thumbnail:
+        return thumbnail_url(post.thumbnail)
+    thumbnail = getattr(post, 'resolved_thumbnail', None)
+    if thumbnail is None:
+        schedule_missing_thumbnail(post)
+        return post.image.url
+    return thumbnail.url
+
+
+def schedule_missing_thumbnail(post):
+    """Ставит в фон подготовку миниатюры, которой не оказалось при
+    показе. Повторные промахи той же картинки задачу не дублируют.
+    Без фоновых потоков промах остаётся промахом: запрос не ждёт Pillow"""
+    key = (post.pk, post.image.name)
+    if not THUMBNAIL_WORKERS or key in _scheduled:
+        return
+    _scheduled.add(key)
+    future = get_executor().submit(_run_in_worker, *key)
+    future.add_done_callback(lambda future: _scheduled.discard(key))
+
+
+def make_thumbnails(post_id, image_name):
+    """Готовит миниатюры поста и запоминает имя файла в Post.thumbnail.
+
+    Если картинку поста успели заменить, результат не сохраняется:
+    за новой картинкой уже поставлена своя задача."""
+    post = Post.objects.filter(pk=post_id, image=image_name).first()
+    if post is None:
+        return None
+    thumbnail = get_thumbnail(post.image, CARD_GEOMETRY, **CARD_OPTIONS)
+    updated = Post.objects.filter(pk=post_id, image=image_name).update(
+        thumbnail=thumbnail.name)
+    if updated:
+        bump_post_feeds(post.author_id, post.group_id)
+    return thumbnail.name
+
+
+def process_image(post_id, image_name):
+    """Миниатюра и варианты для srcset; неудача одного
+    не мешает подготовить другое"""
+    for task in (make_thumbnails, make_variants):
+        try:
+            task(post_id, image_name)
+        except Exception:
+            logger.exception(
+                'Не удалось выполнить %s для поста %s',
+                task.__name__, post_id)
+
+
+def _run_in_worker(post_id, image_name):
+    close_old_connections()
+    # Пост только что записан, реплики могут его ещё не знать
+    pin_primary()
+    try:
+        process_image(post_id, image_name)
+    finally:
+        # У каждого потока свои соединения с базами, закрываем их сами
+        connections.close_all()
+
+
+def schedule_thumbnails(post):
+    """Ставит подготовку миниатюр и вариантов картинки в очередь после
+    фиксации транзакции, чтобы запрос пользователя не ждал Pillow"""
+    if not post.image:
+        return
+    post_id, image_name = post.pk, post.image.name
+    if THUMBNAIL_WORKERS:
+        transaction.on_commit(
+            lambda: get_executor().submit(_run_in_worker, post_id, image_name))
+    else:
+        transaction.on_commit(lambda: process_image(post_id, image_name))
+
+
+def release_image(name):
+    """Удаляет картинку вместе с миниатюрами sorl и вариантами,
+    если на неё больше не ссылается ни один пост.
+
+    Число ссылок - это число постов с таким Post.image, его даёт
+    индекс по полю. Счётчик в отдельной таблице здесь не нужен:
+    удаления редки, а запрос по индексу не может разойтись с данными."""
+    if not name or Post.objects.filter(image=name).exists():
+        return False
+    with post_image_storage.lock():
+        # Пока ждали блокировку, тот же файл мог достаться новой
+        # загрузке: её пост либо уже записан, либо файл отмечен
+        if (post_image_storage.is_claimed(name)
+                or Post.objects.filter(image=name).exists()):
+            return False
+        post_image_storage.release_claim(name)
+        delete(ImageFile(name, post_image_storage))
+        for width in VARIANT_WIDTHS:
+            for extension in VARIANT_FORMATS:
+                post_image_storage.delete(
+                    variant_name(name, width, extension))
+    return True
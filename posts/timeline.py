@@ -0,0 +1,119 @@
+"""Лента подписок пользователя.
+
+Посты раскладываются по лентам подписчиков при публикации (fan-out on
+write): для каждого подписчика появляется строка TimelineEntry, и лента
+читается одним проходом по индексу (user, pub_date, post) без
+``author IN (...)`` по всем авторам подписок.
+
+У знаменитостей - авторов, у которых подписчиков не меньше
+CELEBRITY_FOLLOWERS, - раскладка одного поста стоила бы слишком много
+записей. Их посты не раскладываются, а подмешиваются при чтении ленты
+(fan-out on read) отдельным запросом по индексу постов автора."""
+from django.conf import settings
+from django.db import connection
+
+from .models import Follow, Post, Profile, TimelineEntry
+from .paginator import CursorPaginator
+
+# С какого числа подписчиков посты автора читаются при показе ленты,
+# а не раскладываются по лентам подписчиков
+CELEBRITY_FOLLOWERS = getattr(settings, 'TIMELINE_CELEBRITY_FOLLOWERS', 1000)
+# Сколько последних постов автора попадает в ленту при подписке
+TIMELINE_BACKFILL = getattr(settings, 'TIMELINE_BACKFILL', 50)
+
+
+def fan_out(author_id, post_id=None, user_id=None):
+    """Раскладывает пост автора по лентам подписчиков одним
+    INSERT ... SELECT, не вынимая подписчиков в Python.
+
+    Без post_id раскладываются TIMELINE_BACKFILL последних постов
+    автора, user_id ограничивает раскладку одним подписчиком. Посты
+    знаменитостей не раскладываются: условие на счётчик подписчиков
+    проверяется тем же запросом. Уже разложенные строки пропускаются."""
+    qn = connection.ops.quote_name
+    entry, follow, post, profile = (
+        model._meta for model in (TimelineEntry, Follow, Post, Profile))
+    if post_id is None:
+        posts = (f'SELECT {qn("id")} FROM {qn(post.db_table)} '
+                 f'WHERE {qn("author_id")} = %s '
+                 f'ORDER BY {qn("pub_date")} DESC, {qn("id")} DESC LIMIT %s')
+        params = [author_id, TIMELINE_BACKFILL]
+    else:
+        posts, params = '%s', [post_id]
+    sql = (
+        f'{connection.ops.insert_statement(ignore_conflicts=True)} '
+        f'{qn(entry.db_table)} ({qn("user_id")}, {qn("post_id")}, '
+        f'{qn("pub_date")}) '
+        f'SELECT f.{qn("user_id")}, p.{qn("id")}, p.{qn("pub_date")} '
+        f'FROM {qn(follow.db_table)} f '
+        f'INNER JOIN {qn(post.db_table)} p '
+        f'ON p.{qn("author_id")} = f.{qn("author_id")} '
+        f'WHERE f.{qn("author_id")} = %s AND p.{qn("id")} IN ({posts}) '
+        f'AND NOT EXISTS (SELECT 1 FROM {qn(profile.db_table)} '
+        f'WHERE {qn("user_id")} = %s AND {qn("follower_count")} >= %s)'
+    )
+    params = [author_id, *params, author_id, CELEBRITY_FOLLOWERS]
+    if user_id is not None:
+        sql += f' AND f.{qn("user_id")} = %s'
+        params.append(user_id)
+    sql += ' ' + connection.ops.ignore_conflicts_suffix_sql(
+        ignore_conflicts=True)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.rowcount
+
+
+def drop_author(user_id, author_id):
+    """Убирает посты автора из ленты пользователя после отписки.
+
+    Вызывается после уменьшения счётчика подписчиков. Если автор
+    при этом перестал быть знаменитостью, его посты больше не
+    подмешиваются при чтении, и последние из них раскладываются
+    по лентам оставшихся подписчиков."""
+    TimelineEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id).delete()
+    followers = Profile.objects.filter(user_id=author_id).values_list(
+        'follower_count', flat=True).first()
+    if followers == CELEBRITY_FOLLOWERS - 1:
+        fan_out(author_id)
+
+
+class TimelinePaginator(CursorPaginator):
+    """Курсорный вывод ленты подписок пользователя по ключу (дата, id).
+
+    Разложенные строки ленты и посты знаменитостей из подписок читаются
+    двумя запросами с одним и тем же курсором и сливаются в одну
+    страницу. Номеров страниц у ленты нет."""
+
+    offset_pages = False
+
+    def __init__(self, user, per_page):
+        celebrities = list(Follow.objects.filter(
+            user=user,
+            author__profile__follower_count__gte=CELEBRITY_FOLLOWERS,
+        ).values_list('author_id', flat=True))
+        entries = TimelineEntry.objects.filter(user=user).select_related(
+            'post__author', 'post__group')
+        self.pulled = None
+        if celebrities:
+            # Строки, разложенные до того, как автор стал знаменитостью,
+            # не должны дублировать его посты из второго запроса
+            entries = entries.exclude(post__author__in=celebrities)
+            self.pulled = CursorPaginator(
+                Post.objects.for_feed().filter(author__in=celebrities),
+                per_page)
+        self.entries = CursorPaginator(
+            entries, per_page, fields=('pub_date', 'post_id'))
+        super().__init__(entries, per_page)
+
+    def fetch(self, limit, after=None, before=None):
+        posts = [entry.post for entry in self.entries.fetch(
+            limit, after=after, before=before)]
+        if self.pulled is None:
+            return posts
+        posts += self.pulled.fetch(limit, after=after, before=before)
+        # Порядок окна, как у get_queryset: перед курсором before -
+        # по возрастанию ключа, иначе по убыванию
+        posts.sort(key=lambda post: (post.pub_date, post.pk),
+                   reverse=before is None)
+        return posts[:limit]
@@ -0,0 +1,51 @@
+from functools import wraps
+
+from django.conf import settings
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+
+# Ограничения на картинку поста: размер файла в байтах
+# и число пикселей, которое проверяется по заголовку до декодирования
+IMAGE_MAX_BYTES = getattr(settings, 'POST_IMAGE_MAX_BYTES', 10 * 1024 ** 2)
+IMAGE_MAX_PIXELS = getattr(settings, 'POST_IMAGE_MAX_PIXELS', 25 * 10 ** 6)
+
+
+class BoundedUploadHandler(TemporaryFileUploadHandler):
+    """Пишет загружаемый файл сразу во временный файл на диске, минуя память.
+
+    Если файл больше max_bytes, остаток не записывается, а уже
+    записанное обрезается. Настоящий размер всё равно попадает
+    в UploadedFile.size, и форма отклоняет файл, не открывая его."""
+
+    def __init__(self, request=None, max_bytes=None):
+        super().__init__(request)
+        self.max_bytes = IMAGE_MAX_BYTES if max_bytes is None else max_bytes
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received <= self.max_bytes:
+            self.file.write(raw_data)
+        elif self.received - len(raw_data) <= self.max_bytes:
+            # Первый кусок сверх лимита: освобождаем место на диске
+            self.file.truncate(0)
+
+
+def bounded_uploads(view):
+    """Подключает BoundedUploadHandler к представлению.
+
+    Обработчики загрузки можно заменить только до первого обращения
+    к request.POST, а CsrfViewMiddleware обращается к нему раньше
+    представления. Поэтому, как советует документация Django, проверка
+    CSRF переносится внутрь: снаружи csrf_exempt, внутри csrf_protect."""
+    protected = csrf_protect(view)
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        request.upload_handlers = [BoundedUploadHandler(request)]
+        return protected(request, *args, **kwargs)
+
+    return csrf_exempt(wrapper)
@@ -6,10 +6,18 @@ urlpatterns = [
     path("", views.index, name="index"),
     path("group/<slug:slug>/", views.group_posts, name="group_posts"),
     path("new/", views.new_post, name="new_post"),
+    path("search/", views.search, name="search"),
+    path("follow/", views.follow_index, name="follow_index"),
     # Профайл пользователя
     path('<str:username>/', views.profile, name='profile'),
+    path('<str:username>/follow/', views.profile_follow,
+         name='profile_follow'),
+    path('<str:username>/unfollow/', views.profile_unfollow,
+         name='profile_unfollow'),
     # Просмотр записи
     path('<str:username>/<int:post_id>/', views.post_view, name='post'),
+    path('<str:username>/<int:post_id>/comments/', views.post_comments,
+         name='post_comments'),
     # Страница с формой редактирования существующей записи
     path(
         '<str:username>/<int:post_id>/edit/',
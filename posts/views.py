@@ -1,41 +1,120 @@
 from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
 from django.shortcuts import render, get_object_or_404, redirect
-from django.core.paginator import Paginator
+from django.urls import reverse
+from django.views.decorators.http import require_POST
 
-from .forms import PostForm, CommentForm
-from .models import Post, Group, Comment
+from .caching import feed_cache_context
+from .conditional import feed_condition, feed_validators, set_validators
+from .forms import CommentForm, PostForm, SearchForm
+from .models import Follow, Post, Group, Comment, profile_of
+from .paginator import CursorPaginator
+from .search import SearchPaginator, search_posts
+from .thumbnails import schedule_thumbnails
+from .timeline import TimelinePaginator
+from .uploads import bounded_uploads
+from .write_queue import write
 
 User = get_user_model()
 
+# Показывать по 10 записей на странице.
+POSTS_PER_PAGE = 10
+# Комментарии под постом выводятся и подгружаются по 20.
+COMMENTS_PER_PAGE = 20
 
+
+def index_feeds(request):
+    return [('index', '')]
+
+
+def group_feeds(request, slug):
+    pk = Group.objects.filter(slug=slug).values_list('pk', flat=True).first()
+    return None if pk is None else [('group', pk)]
+
+
+def author_feeds(request, username, **kwargs):
+    """Лента автора: на ней же отражаются изменения его постов,
+    комментариев к ним и его подписок"""
+    pk = User.objects.filter(
+        username=username).values_list('pk', flat=True).first()
+    return None if pk is None else [('profile', pk)]
+
+
+@feed_condition(index_feeds)
 def index(request):
     """"Представление главной страницы постов"""
-    post_list = Post.objects.order_by('-pub_date')
-    # Если порядок сортировки определен в классе Meta модели,
-    # запрос будет выглядить так:
-    # post_list = Post.objects.all()
-    # Показывать по 10 записей на странице.
-    paginator = Paginator(post_list, 10)
-    # Из URL извлекаем номер запрошенной страницы - это значение параметра page
-    page_number = request.GET.get('page')
-    # Получаем набор записей для страницы с запрошенным номером
-    page = paginator.get_page(page_number)
-    return render(request, 'index.html', {'page': page})
+    validators = feed_validators(request, index_feeds(request))
+    # Страница выбирается по курсору из параметров after/before,
+    # старые ссылки ?page=N тоже продолжают работать
+    paginator = CursorPaginator(Post.objects.for_feed(), POSTS_PER_PAGE)
+    page = paginator.get_page(request.GET)
+    context = {'page': page, **feed_cache_context(request, 'index')}
+    return set_validators(
+        render(request, 'index.html', context), validators)
 
 
+@feed_condition(group_feeds)
 def group_posts(request, slug):
     """"Представление страницы сообщества"""
     group = get_object_or_404(Group, slug=slug)
-    paginator = Paginator(
-        Post.objects.filter(group=group).order_by('-pub_date'), 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
-    return render(request, "group.html", {
-        "group": group, "page": page})
+    validators = feed_validators(request, [('group', group.pk)])
+    paginator = CursorPaginator(
+        Post.objects.for_feed().filter(group=group), POSTS_PER_PAGE,
+        count=group.post_count)
+    page = paginator.get_page(request.GET)
+    response = render(request, "group.html", {
+        "group": group, "page": page,
+        **feed_cache_context(request, 'group', group.pk)})
+    return set_validators(response, validators)
+
+
+def search(request):
+    """Представление страницы поиска по тексту постов"""
+    form = SearchForm(request.GET or None)
+    page = None
+    if form.is_valid():
+        posts = search_posts(
+            form.cleaned_data['q'], Post.objects.for_feed())
+        if form.cleaned_data['group']:
+            posts = posts.filter(group=form.cleaned_data['group'])
+        if form.cleaned_data['author']:
+            posts = posts.filter(
+                author__username=form.cleaned_data['author'])
+        page = SearchPaginator(posts, POSTS_PER_PAGE).get_page(request.GET)
+    return render(request, 'search.html', {'form': form, 'page': page})
 
 
 @login_required
+def follow_index(request):
+    """Представление ленты постов авторов, на которых подписан
+    пользователь"""
+    paginator = TimelinePaginator(request.user, POSTS_PER_PAGE)
+    page = paginator.get_page(request.GET)
+    return render(request, 'follow.html', {'page': page})
+
+
+@login_required
+@require_POST
+def profile_follow(request, username):
+    """Подписка на автора"""
+    author = get_object_or_404(User, username=username)
+    if author != request.user:
+        Follow.objects.get_or_create(user=request.user, author=author)
+    return redirect('profile', username=username)
+
+
+@login_required
+@require_POST
+def profile_unfollow(request, username):
+    """Отписка от автора"""
+    Follow.objects.filter(
+        user=request.user, author__username=username).delete()
+    return redirect('profile', username=username)
+
+
+@login_required
+@bounded_uploads
 def new_post(request):
     """Представление формы новой записи"""
     form = PostForm()
@@ -44,35 +123,48 @@ def new_post(request):
         if form.is_valid():
             post = form.save(commit=False)
             post.author = request.user
-            form.save()
+            write(form.save)
+            schedule_thumbnails(post)
             return redirect("index")
     return render(request, "post_new.html", {'form': form})
 
 
+@feed_condition(author_feeds)
 def profile(request, username):
     """"Представление страницы профайла"""
-    user = get_object_or_404(User, username=username)
-    posts = Post.objects.filter(author=user)
-    paginator = Paginator(posts.order_by('-pub_date'), 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
-    number_of_posts = posts.count()
+    user = get_object_or_404(
+        User.objects.select_related('profile'), username=username)
+    validators = feed_validators(request, [('profile', user.pk)])
+    # Число постов берём из счётчика профиля, а не запросом COUNT
+    number_of_posts = profile_of(user).post_count
+    paginator = CursorPaginator(
+        Post.objects.for_feed().filter(author=user), POSTS_PER_PAGE,
+        count=number_of_posts)
+    page = paginator.get_page(request.GET)
+    following = None
+    if request.user.is_authenticated and request.user != user:
+        following = Follow.objects.filter(
+            user=request.user, author=user).exists()
     context = {
         'author': user,
         'number_of_posts': number_of_posts,
         'page': page,
+        'following': following,
+        **feed_cache_context(request, 'profile', user.pk),
     }
-    return render(request, 'profile.html', context)
+    return set_validators(
+        render(request, 'profile.html', context), validators)
 
 
+@feed_condition(author_feeds)
 def post_view(request, username, post_id):
     """"Представление страницы отдельного поста"""
-    post = get_object_or_404(Post, pk=post_id, author__username=username)
-    post_list = Post.objects.filter(author=post.author)
+    post = get_object_or_404(
+        Post.objects.for_feed(), pk=post_id, author__username=username)
+    validators = feed_validators(request, [('profile', post.author_id)])
     form = CommentForm(request.POST or None)
-    comments = post.comments.select_related('author').all()
-    # breakpoint()
-    return render(
+    comments = comment_page(request, post)
+    response = render(
         request,
         'post.html',
         {'form': form,
@@ -80,14 +172,53 @@ def post_view(request, username, post_id):
          'author': post.author,
          'comments': comments,
          })
+    return set_validators(response, validators)
+
+
+def comment_page(request, post):
+    """Страница комментариев поста по курсору на (created, id),
+    от новых к старым"""
+    paginator = CursorPaginator(
+        post.comments.select_related('author'), COMMENTS_PER_PAGE,
+        fields=('created', 'id'), count=post.comment_count)
+    return paginator.get_page(request.GET)
+
+
+def post_comments(request, username, post_id):
+    """Фрагмент со следующей страницей комментариев поста.
+
+    По умолчанию отдаёт HTML для вставки на страницу поста, с заголовком
+    ``Accept: application/json`` - комментарии и адрес следующей
+    порции в JSON."""
+    post = get_object_or_404(
+        Post.objects.select_related('author'),
+        pk=post_id, author__username=username)
+    comments = comment_page(request, post)
+    if 'application/json' not in request.META.get('HTTP_ACCEPT', ''):
+        return render(request, 'include/comment_list.html',
+                      {'post': post, 'comments': comments})
+    url = reverse('post_comments', args=(username, post_id))
+    return JsonResponse({
+        'count': post.comment_count,
+        'comments': [
+            {'id': comment.id,
+             'author': comment.author.username,
+             'text': comment.text,
+             'created': comment.created.isoformat()}
+            for comment in comments
+        ],
+        'next': url + comments.next_link if comments.next_link else None,
+    })
 
 
 @login_required
+@bounded_uploads
 def post_edit(request, username, post_id):
     """"Представление страницы редактирования поста"""
-    profile = get_object_or_404(User, username=username)
-    post = get_object_or_404(Post, pk=post_id, author=profile)
-    if request.user != profile:
+    post = get_object_or_404(
+        Post.objects.select_related('author'),
+        pk=post_id, author__username=username)
+    if request.user != post.author:
         return redirect('post', username=username, post_id=post_id)
     # добавим в form свойство files
     form = PostForm(request.POST or None, files=request.FILES or None, instance=post)
@@ -95,6 +226,8 @@ def post_edit(request, username, post_id):
     if request.method == 'POST':
         if form.is_valid():
             form.save()
+            if 'image' in form.changed_data:
+                schedule_thumbnails(post)
             return redirect("post", username=request.user.username, post_id=post_id)
     return render(
         request, 'post_new.html', {'form': form, 'post': post},
@@ -125,5 +258,5 @@ def add_comment(request, username, post_id):
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
-        comment.save()
+        write(comment.save)
     return redirect('post', username=username, post_id=post_id)
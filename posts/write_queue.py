@@ -0,0 +1,155 @@
+"""Групповая фиксация записей (group commit).
+
+Когда WRITE_QUEUE включён, write() не выполняет запись сама, а отдаёт
+её единственному потоку-писателю. Писатель собирает записи, пришедшие
+за WRITE_QUEUE_WINDOW секунд (но не больше WRITE_QUEUE_MAX_BATCH),
+выполняет их в одной транзакции - каждую в своей точке сохранения,
+чтобы ошибка одной не отменила остальные, - и после фиксации отдаёт
+каждому вызывающему его результат или исключение.
+
+SQLite пропускает одного пишущего за раз: вместо десятков транзакций,
+которые по очереди ждут блокировку базы, получается одна. Без
+WRITE_QUEUE, а также внутри уже открытой транзакции запись
+выполняется сразу в вызывающем потоке.
+
+Вызывающий ждёт результата WRITE_QUEUE_TIMEOUT секунд. Запись, которую
+писатель ещё не начал, за это время отменяется, и ошибка по таймауту
+правдива. Начатую запись отменить нельзя - её результат дожидаются."""
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError
+from functools import wraps
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+
+from yatube.routers import pin_primary
+
+logger = logging.getLogger(__name__)
+
+# Включает очередь записи; False - каждая запись своей транзакцией
+WRITE_QUEUE = getattr(settings, 'WRITE_QUEUE', False)
+# Сколько секунд писатель ждёт попутные записи после первой
+WRITE_QUEUE_WINDOW = getattr(settings, 'WRITE_QUEUE_WINDOW', 0.005)
+# Сколько записей самое большее попадает в одну транзакцию
+WRITE_QUEUE_MAX_BATCH = getattr(settings, 'WRITE_QUEUE_MAX_BATCH', 200)
+# Сколько секунд вызывающий ждёт результата записи
+WRITE_QUEUE_TIMEOUT = getattr(settings, 'WRITE_QUEUE_TIMEOUT', 30)
+
+
+class WriteQueue:
+    def __init__(self, window=WRITE_QUEUE_WINDOW,
+                 max_batch=WRITE_QUEUE_MAX_BATCH):
+        self.window = window
+        self.max_batch = max_batch
+        self.queue = queue.Queue()
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def submit(self, func, *args, **kwargs):
+        """Ставит запись в очередь и возвращает Future с её результатом"""
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(
+                    target=self.run, name='write-queue', daemon=True)
+                self.thread.start()
+        future = Future()
+        self.queue.put((future, func, args, kwargs))
+        return future
+
+    def run(self):
+        # Писатель сам читает то, что только что записал
+        pin_primary()
+        while True:
+            batch = self.collect()
+            try:
+                self.commit(batch)
+            except Exception:
+                logger.exception('Писатель очереди записи упал')
+
+    def collect(self):
+        batch = [self.queue.get()]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def commit(self, batch):
+        # Записи, отменённые по таймауту, не выполняются; остальные
+        # с этого момента отменить уже нельзя
+        batch = [item for item in batch
+                 if item[0].set_running_or_notify_cancel()]
+        if not batch:
+            return
+        close_old_connections()
+        results = []
+        try:
+            with transaction.atomic():
+                for future, func, args, kwargs in batch:
+                    try:
+                        with transaction.atomic():
+                            results.append(
+                                (future, func(*args, **kwargs), None))
+                    except Exception as error:
+                        results.append((future, None, error))
+                guard_commit_hooks()
+        except Exception as error:
+            # Не удалась сама фиксация: не записано ничего
+            for future, *_ in batch:
+                future.set_exception(error)
+            return
+        for future, result, error in results:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+
+def guard_commit_hooks():
+    """Хуки on_commit записей (например, publish_post) выполняются уже
+    после фиксации, при выходе из транзакции. Их ошибка только пишется
+    в журнал: иначе она выдала бы записанную пачку за незаписанную
+    и оборвала бы хуки остальных записей"""
+    hooks = connection.run_on_commit
+    for i, (sids, hook, *rest) in enumerate(hooks):
+        hooks[i] = (sids, logged_hook(hook), *rest)
+
+
+def logged_hook(hook):
+    @wraps(hook)
+    def wrapper():
+        try:
+            hook()
+        except Exception:
+            logger.exception('Хук после фиксации записи упал')
+    return wrapper
+
+
+write_queue = WriteQueue()
+
+
+def write(func, *args, **kwargs):
+    """Выполняет запись func(*args, **kwargs) и возвращает её результат:
+    через очередь записи, если она включена, иначе сразу"""
+    if not WRITE_QUEUE or connection.in_atomic_block:
+        return func(*args, **kwargs)
+    future = write_queue.submit(func, *args, **kwargs)
+    try:
+        result = future.result(timeout=WRITE_QUEUE_TIMEOUT)
+    except TimeoutError:
+        if future.cancel():
+            raise
+        # Писатель уже выполняет запись: ответить ошибкой значило бы
+        # соврать, если она всё-таки зафиксируется
+        result = future.result()
+    # Запись сделал другой поток, а свежие данные нужны этому запросу
+    pin_primary()
+    return result
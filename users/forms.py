@@ -1,5 +1,7 @@
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.urls import resolve, reverse
 
 
 User = get_user_model()
@@ -13,3 +15,14 @@ class CreationForm(UserCreationForm):
         model = User
         # укажем, какие поля должны быть видны в форме и в каком порядке
         fields = ("first_name", "last_name", "username", "email")
+
+    def clean_username(self):
+        """Профиль и посты живут по адресам /<username>/...: имя вроде
+        search или group совпало бы с адресом сайта, и страницы
+        пользователя стали бы недоступны"""
+        username = self.cleaned_data['username']
+        for name, kwargs in (('profile', {}), ('post', {'post_id': 1})):
+            url = reverse(name, kwargs={'username': username, **kwargs})
+            if resolve(url).url_name != name:
+                raise ValidationError('Это имя занято адресом сайта')
+        return username
@@ -0,0 +1,23 @@
+from django.test import TestCase
+
+from .forms import CreationForm
+
+
+class CreationFormTests(TestCase):
+    def form(self, username):
+        return CreationForm({
+            'username': username, 'first_name': 'Имя', 'last_name': '',
+            'email': '', 'password1': 'Vx7-secret-pass',
+            'password2': 'Vx7-secret-pass',
+        })
+
+    def test_site_paths_are_reserved(self):
+        """Имя, совпадающее с адресом сайта, занять нельзя"""
+        for username in ('search', 'follow', 'new', 'admin', 'group', 'media'):
+            with self.subTest(username=username):
+                form = self.form(username)
+                self.assertFalse(form.is_valid())
+                self.assertIn('username', form.errors)
+
+    def test_ordinary_name(self):
+        self.assertTrue(self.form('masha').is_valid())
@@ -0,0 +1,177 @@
+"""Раздача загруженных файлов (MEDIA_ROOT) в боевом режиме.
+
+Поддерживаются условные запросы (сильный ETag, If-None-Match,
+If-Modified-Since), запросы диапазона (Range, If-Range) и передача
+файла без копирования: FileResponse отдаёт серверу объект файла через
+wsgi.file_wrapper, и gunicorn шлёт его системным вызовом sendfile.
+Диапазоны идут обычным итератором: file_wrapper шлёт файл до конца.
+
+MEDIA_SENDFILE = 'x-accel-redirect' или 'x-sendfile' передаёт
+саму отправку фронтовому прокси (nginx или Apache/lighttpd), Django
+тогда только проверяет путь и условные заголовки."""
+import mimetypes
+import os
+import re
+import stat
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.http import require_safe
+
+# Режим отдачи: None - сам Django, 'x-accel-redirect' - nginx,
+# 'x-sendfile' - Apache/lighttpd
+MEDIA_SENDFILE = getattr(settings, 'MEDIA_SENDFILE', None)
+# Внутренний префикс location в nginx для X-Accel-Redirect
+MEDIA_ACCEL_PREFIX = getattr(
+    settings, 'MEDIA_ACCEL_PREFIX', '/protected-media/')
+MEDIA_CACHE_MAX_AGE = getattr(settings, 'MEDIA_CACHE_MAX_AGE', 60 * 60 * 24)
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class RangeFileResponse(FileResponse):
+    """FileResponse, который отдаёт length байт с текущей позиции файла.
+
+    wsgi.file_wrapper отправляет файл до конца, не глядя
+    на Content-Length, поэтому серверу диапазон передаётся только
+    ограниченным итератором, без file_to_stream."""
+
+    def __init__(self, file, *args, length, **kwargs):
+        self.length = length
+        super().__init__(file, *args, **kwargs)
+
+    def _set_streaming_content(self, value):
+        super()._set_streaming_content(value)
+        if self.file_to_stream is not None:
+            self._iterator = self.read_range(self.file_to_stream)
+            self['Content-Length'] = self.length
+            # Файл по-прежнему закроется вместе с ответом
+            self.file_to_stream = None
+
+    def read_range(self, filelike):
+        left = self.length
+        while left > 0:
+            chunk = filelike.read(min(self.block_size, left))
+            if not chunk:
+                break
+            left -= len(chunk)
+            yield chunk
+
+
+def file_etag(stat_result):
+    """Сильный ETag из inode, размера и времени изменения в наносекундах:
+    любая перезапись файла меняет хотя бы одно из них"""
+    return '"{:x}-{:x}-{:x}"'.format(
+        stat_result.st_ino, stat_result.st_size, stat_result.st_mtime_ns)
+
+
+def parse_range(header, size):
+    """(начало, конец включительно) из заголовка Range или None, если
+    заголовок не понят. Несколько диапазонов не поддерживаются: на них,
+    как разрешает RFC 7233, отдаётся весь файл. Для невыполнимого
+    диапазона возвращает (size, size)."""
+    match = RANGE_RE.match(header.replace(' ', ''))
+    if not match or match.groups() == ('', ''):
+        return None
+    start, end = match.groups()
+    if start == '':
+        # bytes=-500: последние 500 байт
+        suffix = int(end)
+        if suffix == 0:
+            return size, size
+        return max(size - suffix, 0), size - 1
+    start = int(start)
+    end = size - 1 if end == '' else min(int(end), size - 1)
+    if start > end:
+        return size, size
+    return start, end
+
+
+def if_range_passes(request, etag, last_modified):
+    """If-Range: диапазон отдаётся, только если файл не изменился.
+    Для ETag сравнение сильное, дата должна совпасть точно."""
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range:
+        return True
+    if if_range.startswith('"'):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == last_modified
+
+
+@require_safe
+def serve(request, path):
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+        stat_result = os.stat(full_path)
+    except (SuspiciousFileOperation, OSError, ValueError):
+        raise Http404('Файл не найден')
+    if not stat.S_ISREG(stat_result.st_mode):
+        raise Http404('Файл не найден')
+
+    etag = file_etag(stat_result)
+    last_modified = int(stat_result.st_mtime)
+    headers = HttpResponse()
+    headers['ETag'] = etag
+    headers['Last-Modified'] = http_date(last_modified)
+    headers['Accept-Ranges'] = 'bytes'
+    patch_cache_control(headers, public=True, max_age=MEDIA_CACHE_MAX_AGE)
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified, response=headers)
+    if response is not headers:
+        return response
+
+    content_type = mimetypes.guess_type(full_path)[0]
+    content_type = content_type or 'application/octet-stream'
+    if MEDIA_SENDFILE:
+        response = sendfile_response(path, full_path, content_type)
+    elif request.method == 'HEAD':
+        response = HttpResponse(content_type=content_type)
+        response['Content-Length'] = stat_result.st_size
+    else:
+        response = file_response(
+            request, full_path, content_type, stat_result.st_size,
+            etag, last_modified)
+    for header in ('ETag', 'Last-Modified', 'Accept-Ranges',
+                   'Cache-Control'):
+        response.setdefault(header, headers[header])
+    return response
+
+
+def file_response(request, full_path, content_type, size, etag,
+                  last_modified):
+    byte_range = None
+    if 'HTTP_RANGE' in request.META and if_range_passes(
+            request, etag, last_modified):
+        byte_range = parse_range(request.META['HTTP_RANGE'], size)
+    if byte_range is None:
+        return FileResponse(open(full_path, 'rb'), content_type=content_type)
+
+    start, end = byte_range
+    if start >= size:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+    file = open(full_path, 'rb')
+    file.seek(start)
+    response = RangeFileResponse(
+        file, length=end - start + 1, status=206, content_type=content_type)
+    response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    return response
+
+
+def sendfile_response(path, full_path, content_type):
+    """Пустой ответ, тело которого отправит фронтовой прокси.
+    Range для такого ответа прокси обрабатывает сам."""
+    response = HttpResponse(content_type=content_type)
+    if MEDIA_SENDFILE == 'x-accel-redirect':
+        response['X-Accel-Redirect'] = MEDIA_ACCEL_PREFIX + quote(path)
+    elif MEDIA_SENDFILE == 'x-sendfile':
+        response['X-Sendfile'] = full_path
+    else:
+        raise ValueError(f'Неизвестный режим MEDIA_SENDFILE: {MEDIA_SENDFILE}')
+    return response
@@ -0,0 +1,416 @@
+"""Метрики запросов в текстовом формате Prometheus на /metrics.
+
+MetricsMiddleware для каждого запроса записывает по имени адреса
+(view_name из urls.py) число ответов, гистограммы задержки и размера
+ответа, число и время SQL-запросов, время отрисовки шаблонов,
+попадания в кэш и в кэш страниц (заголовок X-Cache). Шаблоны меряет
+движок DjangoTemplates этого модуля, обращения к кэшу - LocMemCache
+с CacheMetricsMixin; оба подключаются в настройках.
+
+Каждый поток пишет только в свои словари, поэтому блокировок нет:
+показ метрик копирует словари всех потоков процесса и складывает.
+Копия dict в CPython делается целиком под GIL. Чтобы метрики всех
+воркеров gunicorn были видны в одном ответе, процесс не чаще раза
+в METRICS_FLUSH_SECONDS секунд записывает свою сводку в файл
+в общем каталоге METRICS_DIR, а /metrics складывает все файлы
+каталога. Файлы завершившихся процессов остаются: счётчики Prometheus
+не уменьшаются. Каталог стоит очищать при перезапуске сервера.
+
+Задержка потокового ответа (SSE, файлы) меряется до начала отправки."""
+import atexit
+import glob
+import hmac
+import json
+import os
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.contrib.auth.views import redirect_to_login
+from django.core.cache.backends import locmem
+from django.db import connections
+from django.http import HttpResponse
+from django.template import TemplateDoesNotExist
+from django.template.backends import django as django_backend
+from django.urls import Resolver404, resolve, reverse
+
+# Общий каталог сводок процессов; None - только метрики своего процесса
+METRICS_DIR = getattr(settings, 'METRICS_DIR', None)
+# Как часто процесс обновляет свою сводку в METRICS_DIR, секунды
+METRICS_FLUSH_SECONDS = getattr(settings, 'METRICS_FLUSH_SECONDS', 5)
+# Токен для Authorization: Bearer, с которым /metrics читает сборщик;
+# без него метрики видны только сотрудникам
+METRICS_TOKEN = getattr(settings, 'METRICS_TOKEN', None)
+
+INF = float('inf')
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+                   INF)
+SIZE_BUCKETS = tuple(1024 * 4 ** power for power in range(8)) + (INF,)
+
+# Имя: (тип, описание, границы корзин гистограммы)
+METRICS = {
+    'yatube_http_requests_total': (
+        'counter', 'Ответы по имени адреса, методу и коду', None),
+    'yatube_http_request_duration_seconds': (
+        'histogram', 'Время обработки запроса', LATENCY_BUCKETS),
+    'yatube_http_response_size_bytes': (
+        'histogram', 'Размер тела ответа', SIZE_BUCKETS),
+    'yatube_db_queries_total': (
+        'counter', 'SQL-запросы при обработке запросов', None),
+    'yatube_db_query_seconds_total': (
+        'counter', 'Время выполнения SQL-запросов', None),
+    'yatube_template_render_seconds_total': (
+        'counter', 'Время отрисовки шаблонов', None),
+    'yatube_cache_gets_total': (
+        'counter', 'Чтения из кэша: hit - значение нашлось, miss - нет',
+        None),
+    'yatube_page_cache_total': (
+        'counter', 'Ответы кэша страниц по заголовку X-Cache', None),
+}
+
+
+class Store:
+    """Метрики одного потока. Ключ - (имя, метки) с метками
+    в виде кортежа пар (метка, значение)"""
+
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+
+    def inc(self, name, labels, value=1):
+        key = (name, labels)
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, labels, value):
+        buckets = METRICS[name][2]
+        key = (name, labels)
+        row = self.histograms.get(key)
+        if row is None:
+            # Число попаданий в каждую корзину и сумма наблюдений
+            row = self.histograms[key] = [0] * (len(buckets) + 1)
+        row[bisect_left(buckets, value)] += 1
+        row[-1] += value
+
+
+# Хранилища потоков по идентификатору. Поток с идентификатором
+# завершившегося потока продолжает его хранилище, так что их число
+# не больше числа одновременно живших потоков
+_stores = {}
+_local = threading.local()
+_last_flush = 0
+
+
+def _process_file_name():
+    """Имя файла сводки процесса. Файлы завершившихся процессов
+    остаются, а их pid достаётся новым воркерам, поэтому к pid
+    добавляется случайная часть"""
+    return f'{os.getpid()}-{uuid.uuid4().hex}.json'
+
+
+_file_name = _process_file_name()
+
+
+def _after_fork():
+    # Дочерний процесс не должен повторно сообщать счётчики родителя
+    # и затирать его файл сводки
+    global _local, _file_name
+    _stores.clear()
+    _local = threading.local()
+    _file_name = _process_file_name()
+
+
+os.register_at_fork(after_in_child=_after_fork)
+
+
+def thread_store():
+    store = getattr(_local, 'store', None)
+    if store is None:
+        store = _local.store = _stores.setdefault(
+            threading.get_ident(), Store())
+    return store
+
+
+def snapshot():
+    """Счётчики и гистограммы процесса, сложенные по всем потокам"""
+    counters, histograms = {}, {}
+    for store in list(_stores.values()):
+        for key, value in store.counters.copy().items():
+            counters[key] = counters.get(key, 0) + value
+        for key, row in store.histograms.copy().items():
+            merge_row(histograms, key, row)
+    return counters, histograms
+
+
+def merge_row(histograms, key, row):
+    total = histograms.get(key)
+    if total is None:
+        histograms[key] = list(row)
+    else:
+        histograms[key] = [a + b for a, b in zip(total, row)]
+
+
+class RequestMetrics:
+    """Счётчики одного запроса. Вызывается как execute_wrapper
+    соединений с базой"""
+
+    def __init__(self):
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.template_seconds = 0.0
+        self.template_depth = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.query_seconds += time.perf_counter() - started
+
+
+def current_request():
+    return getattr(_local, 'request', None)
+
+
+class MetricsMiddleware:
+    """Записывает метрики запроса. Стоит первым в MIDDLEWARE,
+    чтобы задержка включала остальные middleware"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = _local.request = RequestMetrics()
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(metrics))
+                response = self.get_response(request)
+        finally:
+            _local.request = None
+        self.record(request, response, metrics,
+                    time.perf_counter() - started)
+        maybe_flush()
+        return response
+
+    def record(self, request, response, metrics, duration):
+        view = (('view', view_name(request)),)
+        store = thread_store()
+        store.inc('yatube_http_requests_total', view + (
+            ('method', request.method),
+            ('status', str(response.status_code))))
+        store.observe('yatube_http_request_duration_seconds',
+                      view + (('method', request.method),), duration)
+        size = response_size(response)
+        if size is not None:
+            store.observe('yatube_http_response_size_bytes', view, size)
+        store.inc('yatube_db_queries_total', view, metrics.queries)
+        store.inc('yatube_db_query_seconds_total', view,
+                  metrics.query_seconds)
+        store.inc('yatube_template_render_seconds_total', view,
+                  metrics.template_seconds)
+        for result, count in (('hit', metrics.cache_hits),
+                              ('miss', metrics.cache_misses)):
+            if count:
+                store.inc('yatube_cache_gets_total',
+                          view + (('result', result),), count)
+        if response.has_header('X-Cache'):
+            store.inc('yatube_page_cache_total', view + (
+                ('result', response['X-Cache'].lower()),))
+
+
+def view_name(request):
+    """Имя адреса из urls.py. Ответ из кэша страниц отдаётся
+    до разбора адреса, тогда адрес разбирается здесь"""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return 'unmatched'
+    return match.view_name
+
+
+def response_size(response):
+    if not response.streaming:
+        return len(response.content)
+    if response.has_header('Content-Length'):
+        return int(response['Content-Length'])
+    return None
+
+
+class Template(django_backend.Template):
+    """Шаблон, который прибавляет время отрисовки к метрикам запроса.
+    Вложенные отрисовки (render_to_string из тега) не считаются дважды"""
+
+    def render(self, context=None, request=None):
+        metrics = current_request()
+        if metrics is None:
+            return super().render(context, request)
+        metrics.template_depth += 1
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics.template_depth -= 1
+            if not metrics.template_depth:
+                metrics.template_seconds += time.perf_counter() - started
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+    """Стандартный движок шаблонов Django с замером времени отрисовки"""
+
+    def from_string(self, template_code):
+        return Template(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return Template(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            django_backend.reraise(exc, self)
+
+
+_missing = object()
+
+
+class CacheMetricsMixin:
+    """Считает попадания и промахи get() в метриках запроса.
+    get_many и get_or_set базового класса проходят через get()"""
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, _missing, version)
+        metrics = current_request()
+        if metrics is not None:
+            if value is _missing:
+                metrics.cache_misses += 1
+            else:
+                metrics.cache_hits += 1
+        return default if value is _missing else value
+
+
+class LocMemCache(CacheMetricsMixin, locmem.LocMemCache):
+    pass
+
+
+def dump(counters, histograms):
+    return {
+        'counters': [[name, labels, value]
+                     for (name, labels), value in counters.items()],
+        'histograms': [[name, labels, row]
+                       for (name, labels), row in histograms.items()],
+    }
+
+
+def flush():
+    """Записывает сводку процесса в METRICS_DIR. Файл подменяется
+    атомарно: читатель видит старую или новую сводку целиком"""
+    global _last_flush
+    _last_flush = time.monotonic()
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    path = os.path.join(METRICS_DIR, _file_name)
+    temporary = f'{path}.{threading.get_ident()}.tmp'
+    with open(temporary, 'w') as file:
+        json.dump(dump(*snapshot()), file)
+    os.replace(temporary, path)
+
+
+def maybe_flush():
+    if METRICS_DIR and time.monotonic() - _last_flush >= METRICS_FLUSH_SECONDS:
+        flush()
+
+
+@atexit.register
+def flush_on_exit():
+    if METRICS_DIR and _stores:
+        flush()
+
+
+def collect():
+    """Метрики всех процессов из METRICS_DIR или одного этого"""
+    if not METRICS_DIR:
+        return snapshot()
+    flush()
+    counters, histograms = {}, {}
+    for path in glob.glob(os.path.join(METRICS_DIR, '*.json')):
+        try:
+            with open(path) as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            continue
+        for name, labels, value in data['counters']:
+            key = (name, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, row in data['histograms']:
+            merge_row(histograms, (name, tuple(map(tuple, labels))), row)
+    return counters, histograms
+
+
+def label_text(labels):
+    if not labels:
+        return ''
+    pairs = ','.join(
+        '{}="{}"'.format(name, value.replace('\\', r'\\')
+                         .replace('"', r'\"').replace('\n', r'\n'))
+        for name, value in labels)
+    return '{' + pairs + '}'
+
+
+def number_text(value):
+    if value == INF:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render(counters, histograms):
+    """Текстовый формат Prometheus 0.0.4"""
+    lines = []
+    for name, (kind, description, buckets) in METRICS.items():
+        if kind == 'histogram':
+            samples = sorted(
+                (labels, row) for (metric, labels), row in histograms.items()
+                if metric == name)
+        else:
+            samples = sorted(
+                (labels, value) for (metric, labels), value in counters.items()
+                if metric == name)
+        if not samples:
+            continue
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} {kind}')
+        for labels, value in samples:
+            if kind != 'histogram':
+                lines.append(f'{name}{label_text(labels)} '
+                             f'{number_text(value)}')
+                continue
+            cumulative = 0
+            for bound, count in zip(buckets, value):
+                cumulative += count
+                le = labels + (('le', number_text(bound)),)
+                lines.append(f'{name}_bucket{label_text(le)} {cumulative}')
+            lines.append(f'{name}_sum{label_text(labels)} '
+                         f'{number_text(value[-1])}')
+            lines.append(f'{name}_count{label_text(labels)} {cumulative}')
+    return '\n'.join(lines) + '\n'
+
+
+def has_token(request):
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    return bool(METRICS_TOKEN) and hmac.compare_digest(
+        header, f'Bearer {METRICS_TOKEN}')
+
+
+def metrics_view(request):
+    """Метрики для сборщика с токеном или для сотрудника сайта.
+    Остальных, как и admin, отправляет на вход в админку"""
+    user = request.user
+    if not (has_token(request) or user.is_active and user.is_staff):
+        return redirect_to_login(
+            request.get_full_path(), reverse('admin:login'))
+    return HttpResponse(
+        render(*collect()), content_type='text/plain; version=0.0.4')
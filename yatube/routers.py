@@ -0,0 +1,79 @@
+"""Чтение с реплик, запись в основную базу.
+
+Запросы на чтение расходятся по случайным репликам из
+REPLICA_DATABASES, запись и всё, что выполняется внутри транзакции
+основной базы, идёт в 'default'. Без реплик всё читается из 'default'.
+
+Реплики отстают от основной базы. Чтобы пользователь сразу видел
+свой пост, комментарий или подписку, запись закрепляет его за основной
+базой: до конца запроса и ещё на REPLICA_PIN_SECONDS секунд
+через cookie, которую ставит PinPrimaryMiddleware."""
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA_DATABASES = tuple(getattr(settings, 'REPLICA_DATABASES', ()))
+REPLICA_PIN_SECONDS = getattr(settings, 'REPLICA_PIN_SECONDS', 10)
+PIN_COOKIE = 'pin_primary'
+
+_state = threading.local()
+
+
+def pin_primary():
+    """Дальше в этом потоке читать только из основной базы"""
+    _state.wrote = True
+
+
+def is_pinned():
+    return getattr(_state, 'pinned', False) or getattr(_state, 'wrote', False)
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if (not REPLICA_DATABASES or is_pinned()
+                or connections[DEFAULT_DB_ALIAS].in_atomic_block):
+            return DEFAULT_DB_ALIAS
+        return random.choice(REPLICA_DATABASES)
+
+    def db_for_write(self, model, **hints):
+        pin_primary()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # На всех базах одни и те же данные
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Реплики получают схему вместе с данными из основной базы
+        return db == DEFAULT_DB_ALIAS
+
+
+class PinPrimaryMiddleware:
+    """Закрепляет пользователя за основной базой после записи.
+
+    Стоит первым, чтобы сессия и пользователь тоже читались
+    из основной базы, если запрос закреплён."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            pinned_until = float(request.COOKIES.get(PIN_COOKIE, 0))
+        except ValueError:
+            pinned_until = 0
+        _state.pinned = pinned_until > time.time()
+        _state.wrote = False
+        try:
+            response = self.get_response(request)
+        finally:
+            wrote = _state.wrote
+            _state.pinned = _state.wrote = False
+        if wrote and REPLICA_DATABASES:
+            response.set_cookie(
+                PIN_COOKIE, str(time.time() + REPLICA_PIN_SECONDS),
+                max_age=REPLICA_PIN_SECONDS, httponly=True, samesite='Lax')
+        return response
@@ -1,4 +1,5 @@
 import os
+import sys
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -29,19 +30,23 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
-    'posts',
+    'posts.apps.PostsConfig',
     'users',
     'about',
+    'api',
     'sorl.thumbnail',
 ]
 
 MIDDLEWARE = [
+    'yatube.metrics.MetricsMiddleware',
+    'yatube.routers.PinPrimaryMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'posts.middleware.AnonymousPageCacheMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
@@ -50,7 +55,8 @@ ROOT_URLCONF = 'yatube.urls'
 TEMPLATES_DIR = os.path.join(BASE_DIR, "templates")
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates с замером времени отрисовки, см. yatube/metrics.py
+        'BACKEND': 'yatube.metrics.DjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -75,9 +81,47 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # Соединение живёт между запросами, PRAGMA не повторяются
+        'CONN_MAX_AGE': 60,
     }
 }
 
+# PRAGMA каждого нового соединения с SQLite, см. yatube/sqlite.py:
+# WAL, чтобы чтение и запись не блокировали друг друга; synchronous
+# NORMAL - в режиме WAL база не портится при сбое, теряются разве что
+# последние транзакции; отображение файла в память (байты), кэш
+# страниц (минус - в КиБ), ожидание блокировки (мс) вместо ошибки
+# «database is locked» и временные таблицы в памяти
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,
+    'busy_timeout': 20 * 1000,
+    'temp_store': 'memory',
+}
+
+# Реплики только для чтения, см. yatube/routers.py. Для проверки на
+# одной машине YATUBE_REPLICAS=N подключает N файлов SQLite рядом
+# с основной базой; копии основной базы в них кладёт команда
+# sync_replicas. В тестах реплики смотрят в тестовую основную базу.
+REPLICA_DATABASES = []
+for number in range(1, int(os.environ.get('YATUBE_REPLICAS', 0)) + 1):
+    alias = f'replica{number}'
+    DATABASES[alias] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, f'db.{alias}.sqlite3'),
+        'CONN_MAX_AGE': 60,
+        'TEST': {'MIRROR': 'default'},
+    }
+    REPLICA_DATABASES.append(alias)
+
+DATABASE_ROUTERS = ['yatube.routers.PrimaryReplicaRouter']
+
+# Сколько секунд после записи пользователь читает только из основной
+# базы, чтобы сразу видеть своё, пока реплики догоняют
+REPLICA_PIN_SECONDS = 10
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -124,6 +168,12 @@ STATIC_ROOT = os.path.join(BASE_DIR, "static")
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media') 
+# Кто отправляет тело медиафайла: None - сам Django через sendfile,
+# 'x-accel-redirect' - nginx (location MEDIA_ACCEL_PREFIX с internal),
+# 'x-sendfile' - Apache или lighttpd
+MEDIA_SENDFILE = None
+MEDIA_ACCEL_PREFIX = '/protected-media/'
+MEDIA_CACHE_MAX_AGE = 60 * 60 * 24
 
 # Login
 LOGIN_URL = "/auth/login/"
@@ -137,6 +187,75 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, "sent_emails")
 
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        # LocMemCache, который считает попадания для /metrics
+        'BACKEND': 'yatube.metrics.LocMemCache',
     }
 }
+
+# Сколько секунд хранить фрагменты лент. Фрагменты сбрасываются
+# сигналами при изменении постов и комментариев, поэтому срок может
+# быть долгим. Версии лент лежат в том же кэше: при нескольких
+# процессах нужен общий кэш (memcached, redis), а не LocMemCache.
+FEED_CACHE_TIMEOUT = 60 * 5
+
+# Кэш целых страниц для неавторизованных посетителей: сколько секунд
+# хранить страницу и для каких адресов (имена из posts/urls.py)
+PAGE_CACHE_TIMEOUT = 60 * 5
+PAGE_CACHE_URL_NAMES = ('index', 'group_posts', 'profile', 'post')
+
+# Сколько фоновых потоков готовят миниатюры картинок после загрузки;
+# 0 - готовить сразу после сохранения поста, а промахи при показе
+# не готовить вовсе. Тесты идут без потоков: те писали бы в базу
+# поверх транзакции TestCase
+TESTING = sys.argv[1:2] == ['test'] or 'pytest' in sys.modules
+POST_THUMBNAIL_WORKERS = 0 if TESTING else 2
+
+# Сколько процессов готовят WebP и JPEG варианты картинок для srcset;
+# 0 - готовить в потоке миниатюр
+POST_IMAGE_VARIANT_PROCESSES = 2
+
+# Ограничения на картинку поста: размер файла и число пикселей
+POST_IMAGE_MAX_BYTES = 10 * 1024 * 1024
+POST_IMAGE_MAX_PIXELS = 25 * 1000 * 1000
+
+# Сколько секунд не удалять картинку, которая досталась повторной
+# загрузке тех же байт: пост с ней за это время успеет записаться
+POST_IMAGE_CLAIM_SECONDS = 60 * 60
+
+# Служебные файлы хранилища картинок: блокировка и отметки повторных
+# загрузок. Вне MEDIA_ROOT, иначе /media/ отдаст их наружу
+POST_IMAGE_STATE_DIR = os.path.join(BASE_DIR, 'media_state')
+
+# Лента подписок: с какого числа подписчиков посты автора подмешиваются
+# при чтении ленты, а не раскладываются по лентам подписчиков,
+# и сколько последних постов автора попадает в ленту при подписке
+TIMELINE_CELEBRITY_FOLLOWERS = 1000
+TIMELINE_BACKFILL = 50
+
+# Поток новых постов /api/v1/stream/: каталог unix-сокетов, через
+# который события доходят до потоков в других процессах (None - только
+# в своём процессе), пинг в тишине, срок жизни одного потока в секундах,
+# сколько пропущенных постов дочитывается по Last-Event-ID и на сколько
+# id пост может опоздать за более новым и всё равно прийти в поток
+EVENTS_SOCKET_DIR = None
+STREAM_HEARTBEAT = 15
+STREAM_MAX_SECONDS = 5 * 60
+STREAM_BACKLOG = 100
+STREAM_REORDER_WINDOW = 20
+
+# Очередь записи постов и комментариев с групповой фиксацией, см.
+# posts/write_queue.py: включена ли, сколько секунд собирать попутные
+# записи, сколько их самое большее в одной транзакции и сколько
+# секунд ждать результата
+WRITE_QUEUE = False
+WRITE_QUEUE_WINDOW = 0.005
+WRITE_QUEUE_MAX_BATCH = 200
+WRITE_QUEUE_TIMEOUT = 30
+
+# Метрики запросов /metrics, см. yatube/metrics.py: общий каталог,
+# через который складываются метрики всех процессов (None - только
+# своего), как часто процесс обновляет в нём свою сводку (секунды)
+# и токен сборщика для заголовка Authorization: Bearer
+METRICS_DIR = None
+METRICS_FLUSH_SECONDS = 5
+METRICS_TOKEN = os.environ.get('YATUBE_METRICS_TOKEN')
@@ -0,0 +1,25 @@
+"""Настройка каждого нового соединения с SQLite.
+
+PRAGMA из SQLITE_PRAGMAS выполняются при открытии соединения, до
+первого запроса. Основное из них - журнал WAL: читатели не ждут
+пишущего и не мешают ему, а запись не блокирует базу целиком.
+busy_timeout заставляет соединение подождать освобождения блокировки,
+вместо того чтобы сразу падать с «database is locked».
+
+Соединения переживают запрос благодаря CONN_MAX_AGE в DATABASES,
+так что PRAGMA выполняются не на каждый запрос, а на каждое
+новое соединение."""
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+SQLITE_PRAGMAS = getattr(settings, 'SQLITE_PRAGMAS', {})
+
+
+@receiver(connection_created)
+def apply_pragmas(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
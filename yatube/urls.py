@@ -1,10 +1,13 @@
+import re
+
 from django.contrib import admin
-from django.urls import include, path
+from django.urls import include, path, re_path
 from django.conf.urls import handler404, handler500
 from django.conf import settings
 from django.conf.urls.static import static
 
 from posts import views
+from yatube import media, metrics
 
 
 handler404 = "posts.views.page_not_found"  # noqa
@@ -16,6 +19,13 @@ urlpatterns = [
     path('404/', views.page_not_found, name='404'),
     path('500/', views.server_error, name='500'),
     path("admin/", admin.site.urls),
+    # загруженные файлы раздаются и в боевом режиме, см. yatube/media.py
+    re_path(
+        r'^{}(?P<path>.+)$'.format(re.escape(settings.MEDIA_URL.lstrip('/'))),
+        media.serve, name='media'),
+    # без косой черты в конце, как по умолчанию ждёт Prometheus
+    path("metrics", metrics.metrics_view, name='metrics'),
+    path("api/", include('api.urls', namespace='api')),
     path("", include('posts.urls')),
     path("auth/", include("users.urls")),
     path("auth/", include("django.contrib.auth.urls")),
@@ -23,5 +33,4 @@ urlpatterns = [
 ]
 
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
     urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)